@@ -1,27 +1,66 @@
 import logging
+import threading
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import batched, chain
 from pathlib import Path
 from typing import Literal, cast
 
 from synchrotron.configuration.comparaison import (
     AllComparaison,
+    CacheDisabledComparaison,
     DateTimeSizeCacheComparaison,
+    DateTimeSizeDisabledCacheComparaison,
 )
 from synchrotron.configuration.comparaison.actions import (
+    CacheDisabledDateTimeSizeComparaisonState,
+    CacheDisabledState,
     CacheEnabledDateTimeSizeComparaisonState,
 )
+from synchrotron.configuration.comparaison.cache_engines import (
+    DatabaseCacheEngine,
+    SnapshotCacheEngine,
+)
 from synchrotron.configuration.storage import Storage
+from synchrotron.database.cache_index import StorageFileIndex
+from synchrotron.database.content_hash import ContentHashCache
 from synchrotron.database.models.storage_file import StorageFile
 from synchrotron.database.utils import session_manager
+from synchrotron.directory_digest import DirectoryDigestSvc
+from synchrotron.hashing import (
+    LocalHashingSvc,
+    compare_file_contents,
+    hash_file,
+    is_local_filesystem,
+)
+from synchrotron.incremental_scan import IncrementalScanSvc
+from synchrotron.journal import RunJournal
+from synchrotron.schema.molecules.cached_storage_file import CachedStorageFile
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
 from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+from synchrotron.snapshot_cache import SnapshotReader, snapshot_path
+from synchrotron.utils.concurrent_file_info import FileInfoFetcher
 from synchrotron.utils.file_info import get_modifed_time
 from synchrotron.utils.github_issue import prefilled_issue_link
+from synchrotron.utils.merge_join import merge_join
 
 logger = logging.getLogger(__name__)
 
+ComparaisonState = (
+    CacheEnabledDateTimeSizeComparaisonState
+    | CacheDisabledDateTimeSizeComparaisonState
+    | CacheDisabledState
+)
+
 
 class ComparaisonSvc:
     def __init__(
-        self, config: AllComparaison, storage_left: Storage, storage_right: Storage
+        self,
+        config: AllComparaison,
+        storage_left: Storage,
+        storage_right: Storage,
+        journal: RunJournal | None = None,
     ) -> None:
         self.config = config
         self.storage_left = storage_left
@@ -29,20 +68,104 @@ class ComparaisonSvc:
         self.storage_right = storage_right
         self.fs_right = storage_right.fs
 
+        self.journal = journal
+        """journal of the run, notified of the files that are not compared"""
+
+        self.cache_indexes: dict[int, StorageFileIndex] = {}
+        self.cache_lock = threading.Lock()
+        """guards the indexes and readers, files can be compared from several threads"""
+        self.snapshot_readers: dict[int, SnapshotReader] = {}
+
+        self.directory_digest_svc: DirectoryDigestSvc | None = None
+        if (
+            isinstance(config, DateTimeSizeCacheComparaison)
+            and config.skip_unchanged_directories
+        ):
+            if isinstance(config.cache_engine, DatabaseCacheEngine):
+                self.directory_digest_svc = DirectoryDigestSvc(
+                    config.cache_engine, storage_left, storage_right
+                )
+            else:
+                logger.warning(
+                    "skip_unchanged_directories requires a database cache engine, "
+                    "it is ignored."
+                )
+
+        self.incremental_scan_svc: IncrementalScanSvc | None = None
+        if (
+            isinstance(config, DateTimeSizeCacheComparaison)
+            and config.incremental_scan is not None
+        ):
+            if config.engine != "merge_join":
+                logger.warning(
+                    "incremental_scan requires the merge_join engine, it is ignored."
+                )
+            elif isinstance(config.cache_engine, DatabaseCacheEngine):
+                self.incremental_scan_svc = IncrementalScanSvc(
+                    config.cache_engine,
+                    config.incremental_scan,
+                    storage_left,
+                    storage_right,
+                )
+            else:
+                logger.warning(
+                    "incremental_scan requires a database cache engine, it is ignored."
+                )
+
+        self.hash_cache: ContentHashCache | None = None
+        if isinstance(config, CacheDisabledComparaison) and config.hash_cache:
+            self.hash_cache = ContentHashCache(config.hash_cache, config.hash_algorithm)
+        # digests computed ahead of the comparaison, keyed by (storage id, path)
+        self.hashed_digests: dict[tuple[int, str], str] = {}
+
     def compare(
-        self, path_left: Path, path_right: Path, storage_id: int
-    ) -> CacheEnabledDateTimeSizeComparaisonState | None:
+        self, left: FileSnapshot | Path, right: FileSnapshot | Path
+    ) -> ComparaisonState | None:
         """
         Compare the two files content according to the configuration provided.
+
+        Files given as snapshots reuse the details of the listing they come from.
+        Files given as paths (relative to the storage base path) get their
+        details fetched from the storage.
         """
+        left_snapshot = take_snapshot(self.storage_left, left)
+        right_snapshot = take_snapshot(self.storage_right, right)
+
         left_file_db = None
         right_file_db = None
         if self.config.cache == "enabled":
-            left_file_db = self.get_file_from_db(storage_id, path_left)
-            right_file_db = self.get_file_from_db(storage_id, path_right)
+            left_file_db = self.get_cached_file(
+                self.storage_left.id, left_snapshot.relative_path
+            )
+            right_file_db = self.get_cached_file(
+                self.storage_right.id, right_snapshot.relative_path
+            )
+
+        left_file_info = left_snapshot.info
+        right_file_info = right_snapshot.info
 
-        left_file_info = get_file_info(self.storage_left, path_left)
-        right_file_info = get_file_info(self.storage_right, path_right)
+        if isinstance(self.config, DateTimeSizeDisabledCacheComparaison):
+            if left_file_info is not None and right_file_info is None:
+                return "only_exist_left"
+            elif left_file_info is None and right_file_info is not None:
+                return "only_exist_right"
+            elif left_file_info is not None and right_file_info is not None:
+                return compare_modified_times(left_file_info, right_file_info)
+
+            return None
+
+        if isinstance(self.config, CacheDisabledComparaison):
+            if left_file_info is not None and right_file_info is None:
+                return "only_exist_left"
+            elif left_file_info is None and right_file_info is not None:
+                return "only_exist_right"
+            elif left_file_info is not None and right_file_info is not None:
+                if left_file_info["size"] != right_file_info["size"]:
+                    return "file_is_different"
+                if self.config.type == "content":
+                    return self.compare_contents(left_snapshot, right_snapshot)
+
+            return None
 
         if self.config.cache == "enabled" and isinstance(
             self.config, DateTimeSizeCacheComparaison
@@ -66,19 +189,13 @@ class ComparaisonSvc:
                 return None
 
             if left_file_info is not None and right_file_info is not None:
-                left_right_time_dif = get_modifed_time(
-                    left_file_info
-                ) - get_modifed_time(right_file_info)
-                if left_right_time_dif.seconds < 0:
-                    return "more_recent_right"
-                elif left_right_time_dif.seconds > 0:
-                    return "more_recent_left"
-                else:
+                state = compare_modified_times(left_file_info, right_file_info)
+                if state is None:
                     logger.warning(
                         "One of the file (at source or destination) was touched, "
                         "but both source and destination have the same timestamp."
                     )
-                    return None
+                return state
 
             error_msg = (
                 f"Unexpected behaviour. Got {left_file_state=} and {right_file_state=}."
@@ -90,12 +207,371 @@ class ComparaisonSvc:
 
             return None
 
-    def get_file_from_db(self, storage_id: int, path: Path) -> StorageFile | None:
-        with session_manager() as session:
+    def compare_contents(
+        self, left_snapshot: FileSnapshot, right_snapshot: FileSnapshot
+    ) -> Literal["file_is_different"] | None:
+        """
+        Compare the content of two files of the same size.
+
+        Digests persisted for the current size and modification time of a file
+        are reused. When neither side has one, both files are read side by side
+        and the comparaison stops at the first differing chunk. Otherwise, only
+        the side without digest is hashed.
+        """
+        assert isinstance(self.config, CacheDisabledComparaison)
+        assert left_snapshot.info is not None and right_snapshot.info is not None
+        algorithm = self.config.hash_algorithm
+        chunk_size = int(self.config.chunk_size)
+
+        path_left = self.storage_left.joinpath(left_snapshot.relative_path)
+        path_right = self.storage_right.joinpath(right_snapshot.relative_path)
+
+        left_digest = self.get_content_hash(self.storage_left, left_snapshot)
+        right_digest = self.get_content_hash(self.storage_right, right_snapshot)
+
+        if left_digest is None and right_digest is None:
+            digest = compare_file_contents(
+                self.fs_left,
+                path_left,
+                self.fs_right,
+                path_right,
+                algorithm,
+                chunk_size,
+            )
+            if digest is None:
+                return "file_is_different"
+            left_digest = right_digest = digest
+            self.set_content_hash(self.storage_left, left_snapshot, digest)
+            self.set_content_hash(self.storage_right, right_snapshot, digest)
+        elif left_digest is None:
+            left_digest = hash_file(self.fs_left, path_left, algorithm, chunk_size)
+            self.set_content_hash(self.storage_left, left_snapshot, left_digest)
+        elif right_digest is None:
+            right_digest = hash_file(self.fs_right, path_right, algorithm, chunk_size)
+            self.set_content_hash(self.storage_right, right_snapshot, right_digest)
+
+        if left_digest != right_digest:
+            return "file_is_different"
+        return None
+
+    def flush(self) -> None:
+        """Write back the digests computed by the comparaisons."""
+        if self.hash_cache is not None:
+            self.hash_cache.flush()
+
+    def forget_cached_files(self) -> None:
+        """
+        Drop the cached records loaded so far, so that the next comparaisons
+        read the ones written since, e.g. between the batches of the watch mode.
+        """
+        with self.cache_lock:
+            self.cache_indexes.clear()
+            for reader in self.snapshot_readers.values():
+                reader.close()
+            self.snapshot_readers.clear()
+
+    def get_content_hash(self, storage: Storage, snapshot: FileSnapshot) -> str | None:
+        digest = self.hashed_digests.pop((storage.id, snapshot.relative_path), None)
+        if digest is not None:
+            return digest
+
+        if self.hash_cache is None or snapshot.info is None:
+            return None
+        if snapshot.info["size"] is None:
+            return None
+
+        try:
+            modified_time = get_modifed_time(snapshot.info)
+        except KeyError:
+            return None
+
+        return self.hash_cache.get(
+            storage.id, snapshot.relative_path, snapshot.info["size"], modified_time
+        )
+
+    def set_content_hash(
+        self, storage: Storage, snapshot: FileSnapshot, digest: str
+    ) -> None:
+        if self.hash_cache is None or snapshot.info is None:
+            return
+        if snapshot.info["size"] is None:
+            return
+
+        try:
+            modified_time = get_modifed_time(snapshot.info)
+        except KeyError:
+            # without modification time, the digest could not be trusted later on
+            return
+
+        self.hash_cache.set(
+            storage,
+            snapshot.relative_path,
+            snapshot.info["size"],
+            modified_time,
+            digest,
+        )
+
+    def hash_ahead(
+        self,
+        hashing_svc: LocalHashingSvc,
+        pairs: Sequence[tuple[FileSnapshot, FileSnapshot]],
+    ) -> None:
+        """
+        Hash the files of a batch whose content will be compared, all at once in
+        the processes of `hashing_svc`, for `compare_contents` to pick up.
+        """
+        assert isinstance(self.config, CacheDisabledComparaison)
+        to_hash: list[tuple[Storage, FileSnapshot]] = []
+        for left_snapshot, right_snapshot in pairs:
+            if left_snapshot.info is None or right_snapshot.info is None:
+                continue
+            if left_snapshot.info["size"] != right_snapshot.info["size"]:
+                continue
+
+            for storage, snapshot in (
+                (self.storage_left, left_snapshot),
+                (self.storage_right, right_snapshot),
+            ):
+                digest = self.get_content_hash(storage, snapshot)
+                if digest is None:
+                    to_hash.append((storage, snapshot))
+                else:
+                    self.hashed_digests[(storage.id, snapshot.relative_path)] = digest
+
+        digests = hashing_svc.hash_files(
+            [storage.joinpath(snapshot.relative_path) for storage, snapshot in to_hash],
+            self.config.hash_algorithm,
+            int(self.config.chunk_size),
+        )
+        for (storage, snapshot), digest in zip(to_hash, digests, strict=True):
+            self.hashed_digests[(storage.id, snapshot.relative_path)] = digest
+            self.set_content_hash(storage, snapshot, digest)
+
+    def compare_many(
+        self, left_snapshots: Iterable[FileSnapshot], batch_size: int = 256
+    ) -> Iterator[tuple[FileSnapshot, FileSnapshot, ComparaisonState | None]]:
+        """
+        Compare left files with their right counterpart, fetching the details of
+        the right files concurrently by batches.
+
+        At most `max_concurrent_requests` requests (see the right storage
+        configuration) are in flight at the same time. When contents are compared
+        between two local storages, the files of each batch are hashed in a pool
+        of processes beforehand.
+
+        Yields
+        ------
+        tuple[FileSnapshot, FileSnapshot, ComparaisonState | None]
+            left and right snapshots of a file, with the result of the comparaison.
+        """
+        hashing_svc = None
+        if (
+            isinstance(self.config, CacheDisabledComparaison)
+            and self.config.type == "content"
+            and is_local_filesystem(self.fs_left)
+            and is_local_filesystem(self.fs_right)
+        ):
+            hashing_svc = LocalHashingSvc(self.config.hash_workers)
+
+        with (
+            FileInfoFetcher(
+                self.fs_right, self.storage_right.max_concurrent_requests
+            ) as fetcher,
+            hashing_svc or nullcontext(),
+        ):
+            for batch in batched(left_snapshots, batch_size):
+                right_infos = fetcher.fetch(
+                    [self.storage_right.joinpath(snap.relative_path) for snap in batch]
+                )
+                pairs = [
+                    (left_snapshot, FileSnapshot(left_snapshot.relative_path, info))
+                    for left_snapshot, info in zip(batch, right_infos, strict=True)
+                ]
+                if hashing_svc is not None:
+                    self.hash_ahead(hashing_svc, pairs)
+
+                for left_snapshot, right_snapshot in pairs:
+                    state = self.compare(left_snapshot, right_snapshot)
+                    yield left_snapshot, right_snapshot, state
+
+    def compare_listings(
+        self,
+        left_snapshots: Iterable[FileSnapshot],
+        right_snapshots: Iterable[FileSnapshot],
+        presorted: bool = False,
+    ) -> Iterator[tuple[FileSnapshot, FileSnapshot, ComparaisonState | None]]:
+        """
+        Compare two listings by merge-joining them on the relative path.
+
+        Unlike `compare` called with a path, the right side is not stat-ed file by
+        file: a file missing from a listing is considered as not existing in its
+        storage. Files only present on one side come out of the same linear pass.
+
+        With `skip_unchanged_directories`, the files of the directories that did
+        not change on both sides since they were last found in sync are not
+        compared, and the digests of the directories in sync are stored once the
+        listings are entirely compared. With `incremental_scan`, only the files
+        that changed since the last run are compared, see `IncrementalScanSvc`.
+
+        Parameters
+        ----------
+        left_snapshots : Iterable[FileSnapshot]
+            listing of the left storage.
+        right_snapshots : Iterable[FileSnapshot]
+            listing of the right storage.
+        presorted : bool, optional
+            set to True if both listings are already sorted by relative path, by
+            default False.
+
+        Yields
+        ------
+        tuple[FileSnapshot, FileSnapshot, ComparaisonState | None]
+            left and right snapshots of a file, with the result of the comparaison.
+        """
+        for left_snapshot, right_snapshot in self.join_listings(
+            left_snapshots, right_snapshots, presorted
+        ):
+            state = self.compare(left_snapshot, right_snapshot)
+            self.observe(left_snapshot, right_snapshot, state)
+            yield left_snapshot, right_snapshot, state
+
+        self.save_observations()
+
+    def join_listings(
+        self,
+        left_snapshots: Iterable[FileSnapshot],
+        right_snapshots: Iterable[FileSnapshot],
+        presorted: bool = False,
+    ) -> Iterator[tuple[FileSnapshot, FileSnapshot]]:
+        """
+        Pair the files of two listings by relative path, leaving out the files
+        that do not need to be compared. A file missing from a listing is paired
+        with a snapshot of a file that does not exist.
+        """
+        if not presorted:
+            left_snapshots = sort_snapshots(left_snapshots)
+            right_snapshots = sort_snapshots(right_snapshots)
+
+        skips_files = (
+            self.directory_digest_svc is not None
+            or self.incremental_scan_svc is not None
+        )
+        if skips_files:
+            left_snapshots, right_snapshots = (
+                list(left_snapshots),
+                list(right_snapshots),
+            )
+        listed_snapshots = [left_snapshots, right_snapshots]
+
+        if self.directory_digest_svc is not None:
+            left_snapshots, right_snapshots = self.directory_digest_svc.skip_unchanged(
+                list(left_snapshots), list(right_snapshots)
+            )
+        if self.incremental_scan_svc is not None:
+            left_snapshots, right_snapshots = self.incremental_scan_svc.select(
+                list(left_snapshots), list(right_snapshots)
+            )
+        if self.journal is not None and skips_files:
+            # files that are not compared are finished for the journal
+            compared_paths = {
+                snap.relative_path for snap in chain(left_snapshots, right_snapshots)
+            }
+            for snap in chain.from_iterable(listed_snapshots):
+                if snap.relative_path not in compared_paths:
+                    self.journal.finish(snap.relative_path)
+
+        pairs = merge_join(
+            left_snapshots, right_snapshots, key=lambda snap: snap.relative_path
+        )
+        for left_snapshot, right_snapshot in pairs:
+            if left_snapshot is None:
+                assert right_snapshot is not None
+                left_snapshot = FileSnapshot(right_snapshot.relative_path, None)
+            elif right_snapshot is None:
+                right_snapshot = FileSnapshot(left_snapshot.relative_path, None)
+
+            yield left_snapshot, right_snapshot
+
+    def compare_pair(
+        self, pair: tuple[FileSnapshot, FileSnapshot | Path]
+    ) -> tuple[FileSnapshot, FileSnapshot, ComparaisonState | None]:
+        """Compare a left file with its right counterpart, fetching its details if needed."""
+        left_snapshot, right = pair
+        right_snapshot = take_snapshot(self.storage_right, right)
+        return (
+            left_snapshot,
+            right_snapshot,
+            self.compare(left_snapshot, right_snapshot),
+        )
+
+    def observe(
+        self,
+        left_snapshot: FileSnapshot,
+        right_snapshot: FileSnapshot,
+        state: ComparaisonState | None,
+    ) -> None:
+        """Keep track of the files found out of sync in joined listings."""
+        if self.directory_digest_svc is not None:
+            self.directory_digest_svc.observe(left_snapshot.relative_path, state)
+        if self.incremental_scan_svc is not None:
+            self.incremental_scan_svc.observe(left_snapshot, right_snapshot, state)
+
+    def save_observations(self) -> None:
+        """Store what was learnt once joined listings are entirely compared."""
+        if self.directory_digest_svc is not None:
+            self.directory_digest_svc.save()
+
+    def get_cached_file(
+        self, storage_id: int, relative_path: str
+    ) -> StorageFile | CachedStorageFile | None:
+        """
+        Get the cached record of a file, either from the in-memory index or with
+        a dedicated query, depending on the cache engine lookup mode. Snapshot
+        cache engines are looked up in the memory-mapped snapshot of the storage.
+        """
+        if not isinstance(self.config, DateTimeSizeCacheComparaison):
+            return None
+
+        if isinstance(self.config.cache_engine, SnapshotCacheEngine):
+            with self.cache_lock:
+                if storage_id not in self.snapshot_readers:
+                    self.snapshot_readers[storage_id] = SnapshotReader(
+                        snapshot_path(self.config.cache_engine, storage_id)
+                    )
+            return self.snapshot_readers[storage_id].get(relative_path)
+
+        if self.config.cache_engine.lookup == "per_file":
+            return self.get_file_from_db(storage_id, relative_path)
+
+        with self.cache_lock:
+            if storage_id not in self.cache_indexes:
+                index = StorageFileIndex(self.config.cache_engine, storage_id)
+                index.load()
+                self.cache_indexes[storage_id] = index
+            index = self.cache_indexes[storage_id]
+            if index.covers(relative_path):
+                return index.get(relative_path)
+
+        # the range query runs outside the lock, so that the files in memory
+        # are looked up by the other threads meanwhile
+        rows = index.query_window(relative_path)
+        with self.cache_lock:
+            index.set_window(relative_path, rows)
+            return index.get(relative_path)
+
+    def get_file_from_db(
+        self, storage_id: int, relative_path: str
+    ) -> StorageFile | None:
+        if not isinstance(self.config, DateTimeSizeCacheComparaison):
+            return None
+        if isinstance(self.config.cache_engine, SnapshotCacheEngine):
+            return None
+
+        with session_manager(self.config.cache_engine) as session:
             storage_file = (
                 session.query(StorageFile)
                 .filter(
-                    StorageFile.relative_path == path,
+                    StorageFile.relative_path == relative_path,
                     StorageFile.storage_id == storage_id,
                 )
                 .one_or_none()
@@ -103,6 +579,20 @@ class ComparaisonSvc:
             return storage_file
 
 
+def take_snapshot(storage: Storage, file: FileSnapshot | Path) -> FileSnapshot:
+    """Return the snapshot as is, or build it by fetching the details of the file."""
+    if isinstance(file, FileSnapshot):
+        return file
+
+    return FileSnapshot(file.as_posix(), get_file_info(storage, file))
+
+
+def sort_snapshots(snapshots: Iterable[FileSnapshot]) -> list[FileSnapshot]:
+    """Sort snapshots by relative path, dropping the duplicated paths."""
+    unique_snapshots = {snap.relative_path: snap for snap in snapshots}
+    return [unique_snapshots[path] for path in sorted(unique_snapshots)]
+
+
 def get_file_info(storage: Storage, file_path: Path) -> FileInfo | None:
     try:
         return cast(FileInfo, storage.fs.info(storage.joinpath(file_path)))
@@ -110,8 +600,22 @@ def get_file_info(storage: Storage, file_path: Path) -> FileInfo | None:
         return None
 
 
+def compare_modified_times(
+    left_file_info: FileInfo, right_file_info: FileInfo
+) -> Literal["more_recent_left", "more_recent_right"] | None:
+    """Tell which side was modified last, or None if they have the same timestamp."""
+    left_right_time_dif = get_modifed_time(left_file_info) - get_modifed_time(
+        right_file_info
+    )
+    if left_right_time_dif < timedelta(0):
+        return "more_recent_right"
+    elif left_right_time_dif > timedelta(0):
+        return "more_recent_left"
+    return None
+
+
 def get_file_state_datetime_comparison(
-    file_info: FileInfo | None, file_db: StorageFile | None
+    file_info: FileInfo | None, file_db: StorageFile | CachedStorageFile | None
 ) -> Literal["UPDATED", "CREATED", "DELETED", "UNTOUCHED", "NOT_EXISTING"]:
     """Compare the file info with their cache counterparts.
 
@@ -1,20 +1,35 @@
 from abc import ABC
 from typing import Annotated, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ByteSize, Field, PositiveInt
 
 from .actions import (
     CacheDisabledActions,
     CacheDisabledDateTimeSizeComparaisonActions,
-    CacheEnabledActions,
+    CacheEnabledDateTimeSizeComparaisonActions,
 )
-from .cache_engines import DatabaseCacheEngine
+from .cache_engines import DatabaseCacheEngine, SnapshotCacheEngine
+from .incremental_scan import IncrementalScan
 
 
 class CacheDisabledComparaison(BaseModel):
     type: Literal["content", "size"]
     cache: Literal["disabled"]
     actions: CacheDisabledActions
+    chunk_size: ByteSize = ByteSize(1024 * 1024)
+    """Size of the chunks read at once when comparing file contents."""
+    hash_algorithm: Literal["sha256", "sha1", "md5", "blake2b", "blake2s"] = "sha256"
+    hash_cache: DatabaseCacheEngine | None = None
+    """
+    Database where the digests of the file contents are persisted, along with the
+    size and modification time of the files. Unchanged files are not read again to
+    compare their content. If not set, contents are compared on each run.
+    """
+    hash_workers: PositiveInt | None = None
+    """
+    Number of processes hashing files when both storages are local. By default,
+    as many as there are CPUs.
+    """
 
 
 class DateTimeSizeComparaisonABC(BaseModel, ABC):
@@ -23,6 +38,11 @@ class DateTimeSizeComparaisonABC(BaseModel, ABC):
         pattern=r"^[-+]\d{2}:\d{2}$",
         description="Time zone shift in format -HH:MM or +HH:MM use for synchronization between a FAT system (that uses local time) and a NTFS filesystem (that uses UTC).",
     )
+    engine: Literal["per_file", "merge_join"] = "per_file"
+    """
+    `per_file` fetches the details of the right counterpart of each left file.
+    `merge_join` lists both storages and joins the two listings by relative path.
+    """
 
 
 class DateTimeSizeDisabledCacheComparaison(DateTimeSizeComparaisonABC):
@@ -30,7 +50,7 @@ class DateTimeSizeDisabledCacheComparaison(DateTimeSizeComparaisonABC):
     actions: CacheDisabledDateTimeSizeComparaisonActions
 
 
-AllCacheComparaison = DatabaseCacheEngine
+AllCacheComparaison = DatabaseCacheEngine | SnapshotCacheEngine
 AllCacheComparaisonDiscriminator = Annotated[
     AllCacheComparaison, Field(discriminator="cache_engine")
 ]
@@ -39,7 +59,20 @@ AllCacheComparaisonDiscriminator = Annotated[
 class DateTimeSizeCacheComparaison(DateTimeSizeComparaisonABC):
     cache: Literal["enabled"]
     cache_engine: AllCacheComparaisonDiscriminator
-    actions: CacheEnabledActions
+    actions: CacheEnabledDateTimeSizeComparaisonActions
+    skip_unchanged_directories: bool = False
+    """
+    Store a digest of each directory found in sync, and skip the comparaison of
+    the files of the directories whose digests did not change on both sides.
+    Requires the `merge_join` engine and a `database` cache engine.
+    """
+    incremental_scan: IncrementalScan | None = None
+    """
+    Compare only the files modified after the newest modification time seen in the
+    last run, and the files of the directories whose cached number of files or
+    total size no longer match the listing, e.g. after a deletion. Requires the
+    `merge_join` engine and a `database` cache engine.
+    """
 
 
 AllDateTimeSizeComparaison = (
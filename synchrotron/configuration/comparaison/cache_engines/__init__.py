@@ -1,9 +1,36 @@
+from pathlib import Path
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PositiveInt
 
 
 class DatabaseCacheEngine(BaseModel):
     cache_engine: Literal["database"] = "database"
     engine_url: str
     engine_options: dict[str, str] = {}
+    lookup: Literal["per_file", "preload"] = "per_file"
+    """
+    How cached records are looked up during the comparaison. `per_file` runs one
+    query for each compared file. `preload` streams all the records of a storage
+    once at startup into an in-memory index.
+    """
+    preload_max_records: PositiveInt = 2_000_000
+    """
+    Maximum number of records of a single storage that can be held in memory with
+    the `preload` lookup. Bigger storages fall back to chunked range queries.
+    """
+    range_query_size: PositiveInt = 10_000
+    """Number of records fetched by each range query when a storage is too big to be preloaded."""
+    write_batch_size: PositiveInt = 10_000
+    """Number of changed records written to the database in a single transaction."""
+
+
+class SnapshotCacheEngine(BaseModel):
+    """
+    Keeps the state of each storage in a memory-mapped file, without database.
+    Suited to a single host synchronising local or network attached storages.
+    """
+
+    cache_engine: Literal["snapshot"] = "snapshot"
+    directory: Path
+    """Directory where the snapshot of each storage is written."""
@@ -0,0 +1,15 @@
+from datetime import timedelta
+
+from pydantic import BaseModel
+
+from synchrotron.utils.pydantic_extra_types import Duration
+
+
+class IncrementalScan(BaseModel):
+    """
+    Only compare the files modified since the last run, and the files of the
+    directories whose number of files or total size changed since then.
+    """
+
+    full_scan_every: Duration = timedelta(days=7)
+    """All the files are compared again when the last full scan is older than this."""
@@ -1,6 +1,15 @@
+import re
 from pathlib import Path
+from typing import Literal
 
-from pydantic import BaseModel, ByteSize, PastDate, field_validator, model_validator
+from pydantic import (
+    BaseModel,
+    ByteSize,
+    PastDate,
+    PositiveInt,
+    field_validator,
+    model_validator,
+)
 
 from synchrotron.schema.filter_properties import (
     DateTimeProperty,
@@ -24,7 +33,11 @@ class Filter(BaseModel):
     path_prefix: Path | None = None
     """Path prefix to filter files by their path. If not set, all paths are considered."""
     paths: list[Path] = []
-    regex_paths: list[Path] = []
+    regex_paths: list[str] = []
+    """
+    Regex patterns that must match the whole path of the files, relative to the
+    storage base path and the path prefix.
+    """
 
     def used_filters(self) -> list[NumericalInequalityProperty | DateTimeProperty]:
         """translate the config into a list of properties that can be used by the filter engine."""
@@ -87,6 +100,17 @@ class Filter(BaseModel):
             return [ext.lstrip(".") for ext in v]
         return v
 
+    @field_validator("regex_paths", mode="after")
+    @classmethod
+    def regex_paths_field_validator(cls, v: list[str]) -> list[str]:
+        """Ensure that the regex patterns compile."""
+        for pattern in v:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regex path {pattern!r}: {e}") from e
+        return v
+
     @model_validator(mode="after")
     def validate_paths(self):
         if self.paths == [] and self.regex_paths == []:
@@ -98,3 +122,33 @@ class Filter(BaseModel):
 class Filters(BaseModel):
     exclude: list[Filter] | None = None
     include: list[Filter]
+    traversal: Literal["listing", "pruning"] = "listing"
+    """
+    `listing` recursively lists every include and exclude path, then filters the
+    files. `pruning` walks the storage directory by directory, without listing the
+    directories that cannot hold included files or that are entirely excluded.
+    """
+    streaming_expansion: bool = False
+    """
+    With the `listing` traversal, expand the paths directory by directory instead
+    of listing each of them at once, so that files are yielded as they are found.
+    Set `listing_cache_size` and `dedup_max_paths` as well to bound the memory
+    used.
+    """
+    listing_cache_size: PositiveInt | None = None
+    """
+    Maximum number of directory listings shared between the filters of a run. By
+    default, all of them are kept so that each directory is listed once.
+    """
+    dedup_max_paths: PositiveInt | None = None
+    """
+    Maximum number of paths remembered to yield once the files matching several
+    include filters, the least recently seen being forgotten first. By default,
+    all of them are kept so that each file is yielded once. A file can be yielded
+    again when more files than that are walked between two of its matches.
+    """
+    batch_size: PositiveInt | None = None
+    """
+    If set, files are evaluated against the filters by batches of this size with
+    vectorized operations. It requires NumPy (`pip install synchrotron[vectorized]`).
+    """
@@ -0,0 +1,30 @@
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, ByteSize, PositiveInt
+
+
+class Fleet(BaseModel):
+    """Synchronisations of several pairs of storages, run at the same time."""
+
+    max_concurrent_synchronisations: PositiveInt = 8
+    """Maximum number of pairs of storages synchronised at the same time."""
+    max_concurrent_transfers: PositiveInt = 64
+    """
+    Maximum number of files transferred at the same time by all the
+    synchronisations, on top of the limits of each storage.
+    """
+    max_bandwidth: ByteSize | None = None
+    """
+    Maximum number of bytes per second copied by all the synchronisations. Copies
+    made by the server of a filesystem, within itself, are not counted.
+    """
+    priority: Literal["staleness", "changes", "duration"] = "duration"
+    """
+    Order in which the synchronisations are started, from their last run:
+    the oldest successful one first (`staleness`), the most bytes transferred
+    first (`changes`), or the longest first (`duration`), which gets the fleet
+    done soonest. Pairs never run before go first.
+    """
+    state_path: Path | None = None
+    """File keeping the outcome of the last run of each pair, to prioritise them."""
@@ -2,7 +2,7 @@ from functools import cached_property
 from pathlib import Path
 
 from fsspec import AbstractFileSystem, filesystem
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PositiveInt
 
 
 class StorageParameters(BaseModel):
@@ -23,6 +23,10 @@ class Storage(BaseModel):
     Unique identifier for the storage. It is used for the cache DB to identify
     to which storage the record belonged to.
     """
+    max_concurrent_requests: PositiveInt = 16
+    """Maximum number of metadata requests sent at the same time to the storage."""
+    max_concurrent_transfers: PositiveInt = 4
+    """Maximum number of files copied to, from or removed in the storage at the same time."""
 
     @cached_property
     def fs(self) -> AbstractFileSystem:
@@ -32,3 +36,14 @@ class Storage(BaseModel):
     def joinpath(self, path: str | Path) -> str:
         base_path = self.base_path or ""
         return str(base_path) + self.fs.sep + str(path)
+
+    def relative_path(self, path: str) -> str:
+        """Strip the base path from a path of the filesystem. Inverse of `joinpath`."""
+        if self.base_path is None:
+            return path.lstrip(self.fs.sep)
+
+        base_path = self.fs._strip_protocol(str(self.base_path)).rstrip(self.fs.sep)
+        if not path.startswith(base_path + self.fs.sep):
+            raise ValueError(f"Path {path} is not under the base path {base_path}.")
+
+        return path[len(base_path) + len(self.fs.sep) :]
@@ -1,14 +1,37 @@
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ByteSize
 
 from .conflict import ForceResolveConflict, VersionedConflict
+from .delta_transfer import DeltaTransfer
+from .journal import Journal
+from .pipeline import Pipeline
+from .trigger import Trigger
 
 
 class Synchronisation(BaseModel):
+    trigger: Trigger = Trigger()
     conflict_handling: (
         VersionedConflict
         | ForceResolveConflict
         | Literal["warn"]
         | Literal["cancel_synchronisation"]
     ) = "warn"
+    transfer_chunk_size: ByteSize = ByteSize(8 * 1024 * 1024)
+    """Size of the chunks read from the source and written to the target at once."""
+    delta_transfer: DeltaTransfer | None = None
+    """
+    Update large files by writing only their changed blocks. Only applies to local
+    targets, other targets get the whole file copied.
+    """
+    journal: Journal | None = None
+    """
+    Checkpoint the progress of the run, so that a run that stopped midway resumes
+    where it was. Resuming skips the subtrees already walked only with the
+    `pruning` traversal, the actions already done are skipped in all cases.
+    """
+    pipeline: Pipeline | None = None
+    """
+    Run the listing, the comparaisons and the transfers as stages connected by
+    bounded queues, each with its own threads, instead of one file at a time.
+    """
@@ -0,0 +1,15 @@
+from pydantic import BaseModel, ByteSize
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+
+
+class DeltaTransfer(BaseModel):
+    block_size: ByteSize = ByteSize(128 * 1024)
+    """Size of the blocks compared between the source and the target."""
+    min_file_size: ByteSize = ByteSize(16 * 1024 * 1024)
+    """Files smaller than this are entirely copied."""
+    signature_cache: DatabaseCacheEngine | None = None
+    """
+    Database where the block checksums of the updated files are persisted, so that
+    the target file does not have to be read again on the next update.
+    """
@@ -0,0 +1,13 @@
+from datetime import timedelta
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from synchrotron.utils.pydantic_extra_types import Duration
+
+
+class Journal(BaseModel):
+    path: Path
+    """File where the progress of the run is checkpointed."""
+    checkpoint_every: Duration = timedelta(minutes=1)
+    """Time between two checkpoints of the progress of the run."""
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from pydantic import BaseModel, PositiveInt
+
+from synchrotron.utils.pydantic_extra_types import Duration
+
+
+class Pipeline(BaseModel):
+    """
+    Stages of a pipelined run. The listing runs in a thread of its own, and the
+    transfers in a pool sized by `max_concurrent_transfers` of the storages.
+    """
+
+    comparaison_workers: PositiveInt = 8
+    """Threads fetching the details of the right files, looking up the cache and comparing the files."""
+    comparaison_queue_size: PositiveInt = 1_000
+    """Listed files waiting to be compared. When it is full, the listing waits."""
+    transfer_queue_size: PositiveInt = 1_000
+    """Compared files waiting to be transferred. When it is full, the comparaisons wait."""
+    report_every: Duration = timedelta(minutes=1)
+    """Time between two reports of the utilisation of each stage in the logs."""
@@ -0,0 +1,18 @@
+from datetime import timedelta
+from typing import Literal
+
+from pydantic import BaseModel
+
+from synchrotron.utils.pydantic_extra_types import Duration
+
+
+class Trigger(BaseModel):
+    on: Literal["running", "watch"] = "running"
+    """
+    `running` synchronises once, and lets another job do the scheduling. `watch`
+    keeps running and synchronises the files as they change in local storages.
+    """
+    debounce: Duration = timedelta(seconds=2)
+    """In watch mode, changes are synchronised once no new change came for this long."""
+    max_delay: Duration = timedelta(seconds=30)
+    """In watch mode, longest time a change waits before being synchronised."""
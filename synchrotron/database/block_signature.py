@@ -0,0 +1,116 @@
+"""
+Block checksums of files, persisted in `StorageFileSignature`.
+
+Like content digests, signatures are only valid for the size and modification time
+the file had when its blocks were checksummed.
+
+Signatures are written back by batches of `write_batch_size`, in a single
+statement per batch. They are read one file at a time: only the large files
+updated by delta transfers need theirs, and they hold a digest per block, too
+heavy to be preloaded for a whole storage.
+"""
+
+import threading
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+
+from .models.storage_file_signature import StorageFileSignature
+from .utils import as_naive, ensure_storage, session_manager
+from .writer import upsert_records
+
+UPSERTED_COLUMNS = ("modified_datetime", "size", "block_size", "signature")
+
+
+class BlockSignatureCache:
+    def __init__(self, cache_engine: DatabaseCacheEngine) -> None:
+        self.cache_engine = cache_engine
+
+        self.storages: dict[int, StorageConfig] = {}
+        self._upserts: dict[tuple[int, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        """guards the buffer, files are transferred from several threads"""
+
+    def get(
+        self,
+        storage_id: int,
+        relative_path: str,
+        size: int,
+        modified_datetime: datetime,
+        block_size: int,
+    ) -> bytes | None:
+        """Signature of the file, if it was computed for its current state."""
+        with self._lock:
+            record = self._upserts.get((storage_id, relative_path))
+        if record is None:
+            with session_manager(self.cache_engine) as session:
+                row = session.execute(
+                    select(
+                        StorageFileSignature.size,
+                        StorageFileSignature.modified_datetime,
+                        StorageFileSignature.block_size,
+                        StorageFileSignature.signature,
+                    ).where(
+                        StorageFileSignature.storage_id == storage_id,
+                        StorageFileSignature.relative_path == relative_path,
+                    )
+                ).first()
+            if row is None:
+                return None
+            record = row._asdict()
+
+        if record["block_size"] != block_size:
+            return None
+        if record["size"] != size or record["modified_datetime"] != as_naive(
+            modified_datetime
+        ):
+            return None
+        return record["signature"]
+
+    def set(
+        self,
+        storage: StorageConfig,
+        relative_path: str,
+        size: int,
+        modified_datetime: datetime,
+        block_size: int,
+        signature: bytes,
+    ) -> None:
+        """Record the signature of a file. Flushes when the buffer is full."""
+        with self._lock:
+            self.storages[storage.id] = storage
+            self._upserts[(storage.id, relative_path)] = {
+                "storage_id": storage.id,
+                "relative_path": relative_path,
+                "modified_datetime": as_naive(modified_datetime),
+                "size": size,
+                "block_size": block_size,
+                "signature": signature,
+            }
+            if len(self._upserts) >= self.cache_engine.write_batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        """Write the buffered signatures in a single transaction."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._upserts:
+            return
+
+        with session_manager(self.cache_engine, autocommit=True) as session:
+            for storage in self.storages.values():
+                ensure_storage(session, storage)
+            upsert_records(
+                session,
+                StorageFileSignature,
+                list(self._upserts.values()),
+                UPSERTED_COLUMNS,
+            )
+        self.storages.clear()
+        self._upserts.clear()
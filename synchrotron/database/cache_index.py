@@ -0,0 +1,188 @@
+"""
+In-memory index over the cached records of a storage.
+
+Instead of running one query per compared file, the records of a storage are
+streamed once into a dict keyed by relative path. When a storage holds more
+records than allowed in memory, the index only keeps a window of records loaded
+with a range query ordered by path. As files are walked in path order, one range
+query then serves many consecutive lookups.
+
+`iter_cached_files` also streams the records under a directory in path order, to
+be consumed alongside a listing of the same subtree.
+"""
+
+import logging
+from collections.abc import Iterator
+
+from sqlalchemy import Row, func, select
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.schema.molecules.cached_storage_file import CachedStorageFile
+
+from .models.storage_file import StorageFile
+from .utils import session_manager
+
+logger = logging.getLogger(__name__)
+
+
+CACHED_COLUMNS = (
+    StorageFile.relative_path,
+    StorageFile.modified_datetime,
+    StorageFile.size,
+    StorageFile.content_hash,
+)
+
+
+class StorageFileIndex:
+    """Index of the cached records of one storage, keyed by relative path."""
+
+    def __init__(self, cache_engine: DatabaseCacheEngine, storage_id: int) -> None:
+        self.cache_engine = cache_engine
+        self.storage_id = storage_id
+
+        self.preloaded = False
+        self._records: dict[str, CachedStorageFile] = {}
+        self._window_start: str | None = None
+        self._window_end: str | None = None
+        self._window_exhausted = False
+
+    def load(self) -> None:
+        """Stream all the records of the storage into memory if they fit in the cap."""
+        with session_manager(self.cache_engine) as session:
+            n_records = session.scalar(
+                select(func.count())
+                .select_from(StorageFile)
+                .where(StorageFile.storage_id == self.storage_id)
+            )
+            if (
+                n_records is not None
+                and n_records > self.cache_engine.preload_max_records
+            ):
+                logger.info(
+                    f"Storage {self.storage_id} has {n_records} cached records, "
+                    f"more than the {self.cache_engine.preload_max_records} allowed "
+                    "in memory. Falling back to range queries."
+                )
+                return
+
+            rows = session.execute(
+                select(*CACHED_COLUMNS)
+                .where(StorageFile.storage_id == self.storage_id)
+                .execution_options(yield_per=self.cache_engine.range_query_size)
+            )
+            self._records = {
+                row.relative_path: CachedStorageFile(
+                    row.modified_datetime, row.size, row.content_hash
+                )
+                for row in rows
+            }
+
+        self.preloaded = True
+
+    def get(self, relative_path: str) -> CachedStorageFile | None:
+        """Get the cached record of a file, or None if the file is not in cache."""
+        if not self.covers(relative_path):
+            self.set_window(relative_path, self.query_window(relative_path))
+
+        return self._records.get(relative_path)
+
+    def update(self, relative_path: str, record: CachedStorageFile) -> None:
+        """Update the record of a file written back, if it is in memory."""
+        if self.covers(relative_path):
+            self._records[relative_path] = record
+
+    def covers(self, relative_path: str) -> bool:
+        """Whether the record of a file, if any, is in memory."""
+        if self.preloaded:
+            return True
+        if self._window_start is None or self._window_end is None:
+            return False
+        if relative_path < self._window_start:
+            return False
+        return self._window_exhausted or relative_path <= self._window_end
+
+    def query_window(self, start: str) -> list[Row]:
+        """Query the records starting at `start` in path order, without keeping them."""
+        with session_manager(self.cache_engine) as session:
+            return list(
+                session.execute(
+                    select(*CACHED_COLUMNS)
+                    .where(
+                        StorageFile.storage_id == self.storage_id,
+                        StorageFile.relative_path >= start,
+                    )
+                    .order_by(StorageFile.relative_path)
+                    .limit(self.cache_engine.range_query_size)
+                ).all()
+            )
+
+    def set_window(self, start: str, rows: list[Row]) -> None:
+        """Replace the records in memory by the ones queried from `start`."""
+        self._records = {
+            row.relative_path: CachedStorageFile(
+                row.modified_datetime, row.size, row.content_hash
+            )
+            for row in rows
+        }
+        self._window_start = start
+        self._window_end = rows[-1].relative_path if rows else start
+        self._window_exhausted = len(rows) < self.cache_engine.range_query_size
+
+
+def iter_cached_files(
+    cache_engine: DatabaseCacheEngine, storage_id: int, directory: str = ""
+) -> Iterator[tuple[str, CachedStorageFile]]:
+    """Stream the cached records of the files under a directory, in path order.
+
+    Records are fetched by pages of `range_query_size` through the unique index on
+    (storage_id, relative_path), each page starting after the last path of the
+    previous one.
+
+    Parameters
+    ----------
+    cache_engine : DatabaseCacheEngine
+        database holding the records.
+    storage_id : int
+        storage the files belong to.
+    directory : str, optional
+        relative path of the directory, by default the whole storage.
+
+    Yields
+    ------
+    tuple[str, CachedStorageFile]
+        relative path of each file with its cached record.
+    """
+    conditions = [StorageFile.storage_id == storage_id]
+    directory = directory.strip("/")
+    if directory:
+        # "0" is the character right after "/", so the range holds all the paths
+        # starting with "directory/"
+        conditions += [
+            StorageFile.relative_path > directory + "/",
+            StorageFile.relative_path < directory + "0",
+        ]
+
+    limit = cache_engine.range_query_size
+    last_path: str | None = None
+    while True:
+        page_conditions = list(conditions)
+        if last_path is not None:
+            page_conditions.append(StorageFile.relative_path > last_path)
+
+        with session_manager(cache_engine) as session:
+            rows = session.execute(
+                select(*CACHED_COLUMNS)
+                .where(*page_conditions)
+                .order_by(StorageFile.relative_path)
+                .limit(limit)
+            ).all()
+
+        for row in rows:
+            yield (
+                row.relative_path,
+                CachedStorageFile(row.modified_datetime, row.size, row.content_hash),
+            )
+
+        if len(rows) < limit:
+            return
+        last_path = rows[-1].relative_path
@@ -0,0 +1,100 @@
+"""
+Digests of file contents, persisted in the `content_hash` column of `StorageFile`.
+
+A digest is only valid for the size and modification time the file had when it
+was hashed, so that unchanged files are never hashed again.
+
+Digests are looked up in an index of the records of each storage, preloaded or
+loaded by windows of records as `StorageFileIndex` does, and written back by
+batches through a `StorageFileWriter`.
+"""
+
+import threading
+from datetime import datetime
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+from synchrotron.schema.molecules.cached_storage_file import CachedStorageFile
+
+from .cache_index import StorageFileIndex
+from .utils import as_naive
+from .writer import StorageFileWriter
+
+
+class ContentHashCache:
+    def __init__(self, cache_engine: DatabaseCacheEngine, algorithm: str) -> None:
+        self.cache_engine = cache_engine
+        self.algorithm = algorithm
+
+        self.indexes: dict[int, StorageFileIndex] = {}
+        self.writer = StorageFileWriter(cache_engine)
+        self._lock = threading.Lock()
+        """guards the indexes and the writer, files are hashed from several threads"""
+
+    def get(
+        self,
+        storage_id: int,
+        relative_path: str,
+        size: int,
+        modified_datetime: datetime,
+    ) -> str | None:
+        """Digest of the file, if it was hashed with the same size and modification time."""
+        with self._lock:
+            pending = self.writer.pending(storage_id, relative_path)
+            index = self.get_index(storage_id)
+            covered = index.covers(relative_path)
+            record = index.get(relative_path) if covered else None
+        if pending is not None:
+            record = CachedStorageFile(
+                pending["modified_datetime"], pending["size"], pending["content_hash"]
+            )
+        elif not covered:
+            # the range query runs outside the lock, as for the comparaison
+            rows = index.query_window(relative_path)
+            with self._lock:
+                index.set_window(relative_path, rows)
+                record = index.get(relative_path)
+
+        if record is None or record.content_hash is None:
+            return None
+        if record.size != size or record.modified_datetime != as_naive(
+            modified_datetime
+        ):
+            return None
+
+        algorithm, _, digest = record.content_hash.partition(":")
+        if algorithm != self.algorithm:
+            return None
+        return digest
+
+    def set(
+        self,
+        storage: StorageConfig,
+        relative_path: str,
+        size: int,
+        modified_datetime: datetime,
+        digest: str,
+    ) -> None:
+        """Record the digest of a file. It is written with the next batch."""
+        content_hash = f"{self.algorithm}:{digest}"
+        with self._lock:
+            self.writer.upsert(
+                storage, relative_path, modified_datetime, size, content_hash
+            )
+            self.get_index(storage.id).update(
+                relative_path,
+                CachedStorageFile(as_naive(modified_datetime), size, content_hash),
+            )
+
+    def flush(self) -> None:
+        """Write the digests recorded since the last batch."""
+        with self._lock:
+            self.writer.flush()
+
+    def get_index(self, storage_id: int) -> StorageFileIndex:
+        if storage_id not in self.indexes:
+            index = StorageFileIndex(self.cache_engine, storage_id)
+            if self.cache_engine.lookup == "preload":
+                index.load()
+            self.indexes[storage_id] = index
+        return self.indexes[storage_id]
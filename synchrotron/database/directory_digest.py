@@ -0,0 +1,53 @@
+"""
+Digests of directories, persisted in `StorageDirectory`.
+"""
+
+from sqlalchemy import bindparam, delete, insert, select
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+
+from .models import StorageDirectory
+from .utils import ensure_storage, session_manager
+
+
+def load_directory_digests(
+    cache_engine: DatabaseCacheEngine, storage_id: int
+) -> dict[str, str]:
+    """Digests of the directories of a storage, keyed by relative path."""
+    with session_manager(cache_engine) as session:
+        rows = session.execute(
+            select(StorageDirectory.relative_path, StorageDirectory.digest)
+            .where(StorageDirectory.storage_id == storage_id)
+            .execution_options(yield_per=cache_engine.range_query_size)
+        )
+        return {row.relative_path: row.digest for row in rows}
+
+
+def save_directory_digests(
+    cache_engine: DatabaseCacheEngine, storage: StorageConfig, digests: dict[str, str]
+) -> None:
+    """Replace the digests of the given directories, in a single transaction."""
+    if not digests:
+        return
+
+    with session_manager(cache_engine, autocommit=True) as session:
+        ensure_storage(session, storage)
+        session.connection().execute(
+            delete(StorageDirectory).where(
+                StorageDirectory.storage_id == storage.id,
+                StorageDirectory.relative_path == bindparam("b_relative_path"),
+            ),
+            [{"b_relative_path": relative_path} for relative_path in digests],
+        )
+        session.execute(
+            insert(StorageDirectory),
+            [
+                {
+                    "storage_id": storage.id,
+                    "relative_path": relative_path,
+                    "digest": digest,
+                }
+                for relative_path, digest in digests.items()
+            ],
+        )
@@ -0,0 +1,93 @@
+"""
+Upgrade the schema of databases created by previous versions.
+
+`create_all` only creates missing tables, so changes to existing tables are applied
+here. Each migration checks whether it is needed, so they can run at each start.
+"""
+
+import logging
+
+from sqlalchemy import Engine, Index, delete, func, inspect, select, text
+
+from .models.storage import Storage
+from .models.storage_file import STORAGE_FILE_UNIQUE_INDEX, StorageFile
+from .models.storage_file_signature import (
+    STORAGE_FILE_SIGNATURE_UNIQUE_INDEX,
+    StorageFileSignature,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(engine: Engine) -> None:
+    add_unique_path_index(engine, StorageFile, STORAGE_FILE_UNIQUE_INDEX)
+    add_unique_path_index(
+        engine, StorageFileSignature, STORAGE_FILE_SIGNATURE_UNIQUE_INDEX
+    )
+    add_storage_scan_columns(engine)
+
+
+def add_unique_path_index(
+    engine: Engine,
+    model: type[StorageFile] | type[StorageFileSignature],
+    unique_index: Index,
+) -> None:
+    """
+    Make (storage_id, relative_path) unique in the table of a model. Duplicated
+    records are removed first, keeping the most recent one.
+    """
+    table_name = model.__tablename__
+    inspector = inspect(engine)
+    unique_columns = [
+        index["column_names"]
+        for index in inspector.get_indexes(table_name)
+        if index["unique"]
+    ] + [
+        constraint["column_names"]
+        for constraint in inspector.get_unique_constraints(table_name)
+    ]
+    if ["storage_id", "relative_path"] in unique_columns:
+        return
+
+    logger.info(f"Adding a unique index on {table_name} (storage_id, relative_path).")
+    with engine.begin() as connection:
+        kept_ids = (
+            select(func.max(model.id))
+            .group_by(model.storage_id, model.relative_path)
+            .scalar_subquery()
+        )
+        deleted = connection.execute(delete(model).where(model.id.not_in(kept_ids)))
+        if deleted.rowcount:
+            logger.warning(
+                f"Removed {deleted.rowcount} duplicated records from {table_name}."
+            )
+
+        unique_index.create(connection)
+
+
+def add_storage_scan_columns(engine: Engine) -> None:
+    """Add the columns of `storage` used by incremental scans."""
+    existing_columns = {
+        column["name"] for column in inspect(engine).get_columns(Storage.__tablename__)
+    }
+    missing_columns = [
+        column
+        for column in (
+            Storage.__table__.c.watermark,
+            Storage.__table__.c.last_full_scan,
+        )
+        if column.name not in existing_columns
+    ]
+    if not missing_columns:
+        return
+
+    logger.info("Adding the incremental scan columns to storage.")
+    with engine.begin() as connection:
+        for column in missing_columns:
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(
+                text(
+                    f"ALTER TABLE {Storage.__tablename__} "
+                    f"ADD COLUMN {column.name} {column_type}"
+                )
+            )
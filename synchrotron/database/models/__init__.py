@@ -0,0 +1,6 @@
+from .storage import Storage
+from .storage_directory import StorageDirectory
+from .storage_file import StorageFile
+from .storage_file_signature import StorageFileSignature
+
+__all__ = ["Storage", "StorageDirectory", "StorageFile", "StorageFileSignature"]
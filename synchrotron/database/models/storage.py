@@ -13,3 +13,6 @@ class Storage(PersistentBase):
     type: Mapped[str]
     base_path: Mapped[str]
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    watermark: Mapped[datetime | None] = mapped_column(nullable=True, default=None)
+    """newest modification time up to which the files were found in sync"""
+    last_full_scan: Mapped[datetime | None] = mapped_column(nullable=True, default=None)
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import PersistentBase
+
+
+class StorageDirectory(PersistentBase):
+    """Digest of the content of a directory, when it was last found in sync."""
+
+    __tablename__ = "storage_directory"
+
+    id: Mapped[int] = mapped_column(nullable=False, primary_key=True)
+    storage_id: Mapped[int] = mapped_column(ForeignKey("storage.id"))
+    relative_path: Mapped[str]
+
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    digest: Mapped[str]
+
+
+Index(
+    "ix_storage_directory_storage_id_relative_path",
+    StorageDirectory.storage_id,
+    StorageDirectory.relative_path,
+    unique=True,
+)
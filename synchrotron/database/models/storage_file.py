@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import PersistentBase
@@ -16,5 +16,13 @@ class StorageFile(PersistentBase):
     updated_at: Mapped[datetime] = mapped_column(server_default=func.now())
 
     modified_datetime: Mapped[datetime] = mapped_column(nullable=True)
-    size: Mapped[datetime] = mapped_column(nullable=True)
+    size: Mapped[int] = mapped_column(nullable=True)
     content_hash: Mapped[str] = mapped_column(nullable=True)
+
+
+STORAGE_FILE_UNIQUE_INDEX = Index(
+    "ix_storage_file_storage_id_relative_path",
+    StorageFile.storage_id,
+    StorageFile.relative_path,
+    unique=True,
+)
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Index, LargeBinary, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import PersistentBase
+
+
+class StorageFileSignature(PersistentBase):
+    """Checksums of the blocks of a file, used to transfer only the changed blocks."""
+
+    __tablename__ = "storage_file_signature"
+
+    id: Mapped[int] = mapped_column(nullable=False, primary_key=True)
+    storage_id: Mapped[int] = mapped_column(ForeignKey("storage.id"))
+    relative_path: Mapped[str] = mapped_column(index=True)
+
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    modified_datetime: Mapped[datetime]
+    size: Mapped[int]
+    block_size: Mapped[int]
+    signature: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+STORAGE_FILE_SIGNATURE_UNIQUE_INDEX = Index(
+    "ix_storage_file_signature_storage_id_relative_path",
+    StorageFileSignature.storage_id,
+    StorageFileSignature.relative_path,
+    unique=True,
+)
@@ -0,0 +1,106 @@
+"""
+State of the incremental scans of a storage, persisted in `Storage`, and
+aggregates of its cached records by directory.
+"""
+
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+
+from .models.storage import Storage
+from .models.storage_file import StorageFile
+from .utils import ensure_storage, session_manager
+
+
+class ScanState(NamedTuple):
+    watermark: datetime | None
+    """newest modification time up to which the files were found in sync"""
+    last_full_scan: datetime | None
+
+
+class DirectoryAggregate(NamedTuple):
+    n_files: int
+    total_size: int
+
+
+def load_scan_state(cache_engine: DatabaseCacheEngine, storage_id: int) -> ScanState:
+    with session_manager(cache_engine) as session:
+        row = session.execute(
+            select(Storage.watermark, Storage.last_full_scan).where(
+                Storage.id == storage_id
+            )
+        ).one_or_none()
+
+    if row is None:
+        return ScanState(None, None)
+    return ScanState(row.watermark, row.last_full_scan)
+
+
+def save_scan_state(
+    cache_engine: DatabaseCacheEngine, storage: StorageConfig, state: ScanState
+) -> None:
+    with session_manager(cache_engine, autocommit=True) as session:
+        ensure_storage(session, storage)
+        session.execute(
+            update(Storage)
+            .where(Storage.id == storage.id)
+            .values(watermark=state.watermark, last_full_scan=state.last_full_scan)
+        )
+
+
+def load_directory_aggregates(
+    cache_engine: DatabaseCacheEngine, storage_id: int
+) -> dict[str, DirectoryAggregate]:
+    """Number of cached files and their total size, for each directory of a storage.
+
+    Only the files directly in a directory are counted. SQLite and PostgreSQL
+    group the records by parent directory in the query, other dialects stream
+    the paths and sizes of the records to group them.
+    """
+    with session_manager(cache_engine) as session:
+        if session.get_bind().dialect.name in ("sqlite", "postgresql"):
+            return group_directory_aggregates(session, storage_id)
+
+        aggregates: dict[str, DirectoryAggregate] = {}
+        rows = session.execute(
+            select(StorageFile.relative_path, StorageFile.size)
+            .where(StorageFile.storage_id == storage_id)
+            .execution_options(yield_per=cache_engine.range_query_size)
+        )
+        for row in rows:
+            directory = row.relative_path.rpartition("/")[0]
+            n_files, total_size = aggregates.get(directory, (0, 0))
+            aggregates[directory] = DirectoryAggregate(
+                n_files + 1, total_size + (row.size or 0)
+            )
+
+    return aggregates
+
+
+def group_directory_aggregates(
+    session: Session, storage_id: int
+) -> dict[str, DirectoryAggregate]:
+    """`load_directory_aggregates` with a GROUP BY, for SQLite and PostgreSQL."""
+    # trimming every character but "/" from the end of a path leaves its parent
+    # directory, followed by a "/" unless it is the root
+    parent = func.rtrim(
+        StorageFile.relative_path, func.replace(StorageFile.relative_path, "/", "")
+    ).label("parent")
+    rows = session.execute(
+        select(
+            parent,
+            func.count(),
+            func.coalesce(func.sum(StorageFile.size), 0),
+        )
+        .where(StorageFile.storage_id == storage_id)
+        .group_by(parent)
+    )
+    return {
+        directory.rstrip("/"): DirectoryAggregate(n_files, total_size)
+        for directory, n_files, total_size in rows
+    }
@@ -1,26 +1,34 @@
+import threading
 from contextlib import contextmanager
+from datetime import datetime
 from functools import cache
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, select
 from sqlalchemy.orm import Session
 
-from src.configurations import SQLAlchemyDBConfig
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+
+_engines_lock = threading.Lock()
+
+
+def get_engine(engine_url: str, **engine_options: str):
+    # files compared from several threads would otherwise create the tables twice
+    with _engines_lock:
+        return _get_engine(engine_url, **engine_options)
 
 
 @cache
-def get_engine():
-    db_config = SQLAlchemyDBConfig.get()
-    engine = create_engine(
-        str(db_config.engine_url), **db_config.engine_options.model_dump()
-    )
+def _get_engine(engine_url: str, **engine_options: str):
+    engine = create_engine(engine_url, **engine_options)
     # ensure tables are created
     create_db(engine)
     return engine
 
 
 @contextmanager
-def session_manager(*, autocommit: bool = False):
-    engine = get_engine()
+def session_manager(cache_engine: DatabaseCacheEngine, *, autocommit: bool = False):
+    engine = get_engine(cache_engine.engine_url, **cache_engine.engine_options)
 
     with Session(engine, expire_on_commit=False) as session:
         yield session
@@ -30,7 +38,29 @@ def session_manager(*, autocommit: bool = False):
 
 
 def create_db(engine):
-    """Create the database tables."""
+    """Create the database tables, and upgrade the existing ones."""
+    # importing the models registers their tables
+    from .migrations import migrate
+    from .models import Storage  # noqa: F401
     from .models.base import PersistentBase
 
     PersistentBase.metadata.create_all(engine)
+    migrate(engine)
+
+
+def as_naive(value: datetime) -> datetime:
+    """The database drops time zones, so datetimes are compared without them."""
+    return value.replace(tzinfo=None)
+
+
+def ensure_storage(session: Session, storage: StorageConfig) -> None:
+    """Create the record of the storage if it does not exist yet."""
+    from .models.storage import Storage
+
+    exists = session.scalar(select(Storage.id).where(Storage.id == storage.id))
+    if exists is None:
+        session.execute(
+            insert(Storage).values(
+                id=storage.id, type=storage.name, base_path=str(storage.base_path or "")
+            )
+        )
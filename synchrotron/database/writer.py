@@ -0,0 +1,229 @@
+"""
+Buffered write-back of the `StorageFile` records.
+
+Upserts and deletions are collected in memory and flushed by batches, each batch
+in a single transaction and with a single statement per kind of change. SQLite and
+PostgreSQL get a native `INSERT ... ON CONFLICT DO UPDATE`, other dialects an
+`UPDATE` followed by an `INSERT` of the missing records.
+
+Records are only rewritten when the size or the modification time of their file
+changed, or when a digest of its content is given. Files found in sync on each
+run do not rewrite their records, and keep the digest stored for them.
+
+`upsert_records` is shared with the other tables keyed by storage and path, e.g.
+the block signatures.
+"""
+
+import logging
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import Any, Self
+
+from sqlalchemy import (
+    ColumnElement,
+    bindparam,
+    delete,
+    insert,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+
+from .models.storage_file import StorageFile
+from .models.storage_file_signature import StorageFileSignature
+from .utils import as_naive, ensure_storage, session_manager
+
+logger = logging.getLogger(__name__)
+
+UPSERTED_COLUMNS = ("modified_datetime", "size", "content_hash")
+MAX_KEYS_PER_QUERY = 500
+"""keeps the number of bound parameters under the limits of the dialects"""
+
+
+class StorageFileWriter:
+    def __init__(
+        self, cache_engine: DatabaseCacheEngine, batch_size: int | None = None
+    ) -> None:
+        self.cache_engine = cache_engine
+        self.batch_size = batch_size or cache_engine.write_batch_size
+
+        self.storages: dict[int, StorageConfig] = {}
+        self._upserts: dict[tuple[int, str], dict[str, Any]] = {}
+        self._deletions: set[tuple[int, str]] = set()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.flush()
+
+    def upsert(
+        self,
+        storage: StorageConfig,
+        relative_path: str,
+        modified_datetime: datetime,
+        size: int | None,
+        content_hash: str | None = None,
+    ) -> None:
+        """Record the current state of a file. Flushes when the buffer is full."""
+        key = (storage.id, relative_path)
+        self.storages[storage.id] = storage
+        self._deletions.discard(key)
+        self._upserts[key] = {
+            "storage_id": storage.id,
+            "relative_path": relative_path,
+            "modified_datetime": as_naive(modified_datetime),
+            "size": size,
+            "content_hash": content_hash,
+        }
+        self._flush_if_full()
+
+    def delete(self, storage: StorageConfig, relative_path: str) -> None:
+        """Forget a file. Flushes when the buffer is full."""
+        key = (storage.id, relative_path)
+        self._upserts.pop(key, None)
+        self._deletions.add(key)
+        self._flush_if_full()
+
+    def pending(self, storage_id: int, relative_path: str) -> dict[str, Any] | None:
+        """State of a file recorded but not written yet, if any."""
+        return self._upserts.get((storage_id, relative_path))
+
+    def _flush_if_full(self) -> None:
+        if len(self._upserts) + len(self._deletions) >= self.batch_size:
+            self.flush()
+
+    def checkpoint(self) -> None:
+        """Make the buffered changes durable, see `SnapshotCacheWriter.checkpoint`."""
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered changes in a single transaction."""
+        if not self._upserts and not self._deletions:
+            return
+
+        with session_manager(self.cache_engine, autocommit=True) as session:
+            for storage in self.storages.values():
+                ensure_storage(session, storage)
+            if self._deletions:
+                self._delete(session, list(self._deletions))
+            if self._upserts:
+                upsert_records(
+                    session,
+                    StorageFile,
+                    list(self._upserts.values()),
+                    UPSERTED_COLUMNS,
+                    is_changed,
+                )
+
+        logger.debug(
+            f"Flushed {len(self._upserts)} upserts and {len(self._deletions)} "
+            "deletions of cached records."
+        )
+        self.storages.clear()
+        self._upserts.clear()
+        self._deletions.clear()
+
+    def _delete(self, session: Session, keys: list[tuple[int, str]]) -> None:
+        session.connection().execute(
+            delete(StorageFile).where(
+                StorageFile.storage_id == bindparam("b_storage_id"),
+                StorageFile.relative_path == bindparam("b_relative_path"),
+            ),
+            [
+                {"b_storage_id": storage_id, "b_relative_path": relative_path}
+                for storage_id, relative_path in keys
+            ],
+        )
+
+
+def upsert_records(
+    session: Session,
+    model: type[StorageFile] | type[StorageFileSignature],
+    records: list[dict[str, Any]],
+    columns: Sequence[str],
+    is_changed: Callable[[dict[str, ColumnElement[Any]]], ColumnElement[bool]]
+    | None = None,
+) -> None:
+    """Insert records, or update the columns of the ones stored for the same files.
+
+    With `is_changed`, only the stored records that it tells apart from their new
+    values are updated.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = dialect_insert(model)
+        new_values: dict[str, ColumnElement[Any]] = {
+            column: statement.excluded[column] for column in columns
+        }
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[model.storage_id, model.relative_path],
+                set_=new_values,
+                where=is_changed(new_values) if is_changed is not None else None,
+            ),
+            records,
+        )
+        return
+
+    keys = [(record["storage_id"], record["relative_path"]) for record in records]
+    existing_keys: set[tuple[int, str]] = set()
+    for start in range(0, len(keys), MAX_KEYS_PER_QUERY):
+        rows = session.execute(
+            select(model.storage_id, model.relative_path).where(
+                tuple_(model.storage_id, model.relative_path).in_(
+                    keys[start : start + MAX_KEYS_PER_QUERY]
+                )
+            )
+        )
+        existing_keys.update((storage_id, path) for storage_id, path in rows)
+    updated = [
+        {f"b_{key}": value for key, value in record.items()}
+        for record in records
+        if (record["storage_id"], record["relative_path"]) in existing_keys
+    ]
+    inserted = [
+        record
+        for record in records
+        if (record["storage_id"], record["relative_path"]) not in existing_keys
+    ]
+
+    if updated:
+        conditions = [
+            model.storage_id == bindparam("b_storage_id"),
+            model.relative_path == bindparam("b_relative_path"),
+        ]
+        if is_changed is not None:
+            conditions.append(
+                is_changed({column: bindparam(f"b_{column}") for column in columns})
+            )
+        session.connection().execute(
+            update(model)
+            .where(*conditions)
+            .values({column: bindparam(f"b_{column}") for column in columns}),
+            updated,
+        )
+    if inserted:
+        session.execute(insert(model), inserted)
+
+
+def is_changed(new_values: dict[str, ColumnElement[Any]]) -> ColumnElement[bool]:
+    """
+    Whether a record differs from its new values. A record whose file did not
+    change keeps its digest when no new one is given, the digest of a changed
+    file is replaced even by None, as it no longer matches the content.
+    """
+    return or_(
+        StorageFile.size.is_distinct_from(new_values["size"]),
+        StorageFile.modified_datetime.is_distinct_from(new_values["modified_datetime"]),
+        new_values["content_hash"].is_not(None)
+        & StorageFile.content_hash.is_distinct_from(new_values["content_hash"]),
+    )
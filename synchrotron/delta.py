@@ -0,0 +1,90 @@
+"""
+Block-level delta transfer, to update large files edited in place.
+
+The target file is cut into fixed-size blocks, each summarised by a blake2b
+digest: its signature. The source is then read block by block, and only the blocks
+whose digests differ from the ones at the same offset in the target are written.
+Blocks are only compared at the same offset, so a weak rolling checksum would not
+save any digest. This requires random writes in the target, so it is only used for
+local targets.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from fsspec import AbstractFileSystem
+
+BLOCK_SIGNATURE_SIZE = 16
+"""size of the blake2b digest of a block"""
+
+
+def block_signature(block: bytes) -> bytes:
+    return hashlib.blake2b(block, digest_size=BLOCK_SIGNATURE_SIZE).digest()
+
+
+def compute_signature(file: BinaryIO, block_size: int) -> bytes:
+    """Concatenated signatures of the blocks of a file."""
+    signature = bytearray()
+    while block := file.read(block_size):
+        signature += block_signature(block)
+    return bytes(signature)
+
+
+@dataclass(frozen=True, slots=True)
+class DeltaResult:
+    bytes_written: int
+    signature: bytes
+    """signature of the target, once updated"""
+
+
+def delta_copy(
+    source_fs: AbstractFileSystem,
+    source_path: str,
+    target_path: str,
+    block_size: int,
+    target_signature: bytes | None = None,
+) -> DeltaResult:
+    """Update a local file with the blocks of the source that differ from it.
+
+    Parameters
+    ----------
+    source_fs : AbstractFileSystem
+        filesystem of the source file.
+    source_path : str
+        path of the source file.
+    target_path : str
+        local path of the file to update.
+    block_size : int
+        size of the compared blocks.
+    target_signature : bytes | None, optional
+        signature of the target computed with the same block size, e.g. cached
+        from a previous transfer. By default, it is computed by reading the target.
+
+    Returns
+    -------
+    DeltaResult
+        number of bytes written in the target, and its new signature.
+    """
+    with open(target_path, "r+b") as target:
+        if target_signature is None:
+            target_signature = compute_signature(target, block_size)
+
+        bytes_written = 0
+        new_signature = bytearray()
+        offset = 0
+        with source_fs.open(source_path, "rb") as source:
+            while block := source.read(block_size):
+                signature = block_signature(block)
+                new_signature += signature
+
+                i = len(new_signature) - BLOCK_SIGNATURE_SIZE
+                if target_signature[i : i + BLOCK_SIGNATURE_SIZE] != signature:
+                    target.seek(offset)
+                    target.write(block)
+                    bytes_written += len(block)
+                offset += len(block)
+
+        target.truncate(offset)
+
+    return DeltaResult(bytes_written, bytes(new_signature))
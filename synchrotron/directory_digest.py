@@ -0,0 +1,167 @@
+"""
+Merkle digests of directories, to skip the comparaison of unchanged subtrees.
+
+The digest of a directory covers the name, size and modification time of its
+files, and the name and digest of its subdirectories. It is computed bottom-up in
+a single pass over a listing sorted by path, e.g. one recursive listing of the
+subtree on object storages where listings are flat.
+
+Digests are stored for the directories whose files were all found in sync. On the
+next run, a directory whose digests did not change on both sides holds the same
+files as when it was in sync: its files are not compared at all.
+"""
+
+import hashlib
+import logging
+from collections.abc import Iterable, Sequence
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.directory_digest import (
+    load_directory_digests,
+    save_directory_digests,
+)
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.utils.file_info import get_modifed_time
+
+logger = logging.getLogger(__name__)
+
+
+def compute_directory_digests(snapshots: Iterable[FileSnapshot]) -> dict[str, str]:
+    """Digest of each directory holding files, from snapshots sorted by path.
+
+    Returns
+    -------
+    dict[str, str]
+        digest of each directory, keyed by relative path. The root of the storage
+        is the empty path.
+    """
+    digests: dict[str, str] = {}
+    # hashers of the directories of the last file, from the root
+    open_directories: list[tuple[str, hashlib._Hash]] = [("", hashlib.sha256())]
+
+    def close_last_directory() -> None:
+        path, hasher = open_directories.pop()
+        digests[path] = hasher.hexdigest()
+        name = path.rpartition("/")[2]
+        open_directories[-1][1].update(f"D {name} {digests[path]}\n".encode())
+
+    for snapshot in snapshots:
+        if snapshot.info is None:
+            continue
+        parts = snapshot.relative_path.split("/")
+        directories = parts[:-1]
+
+        common_depth = 0
+        while (
+            common_depth < len(directories)
+            and common_depth + 1 < len(open_directories)
+            and open_directories[common_depth + 1][0]
+            == "/".join(directories[: common_depth + 1])
+        ):
+            common_depth += 1
+        while len(open_directories) > common_depth + 1:
+            close_last_directory()
+        for depth in range(common_depth, len(directories)):
+            open_directories.append(
+                ("/".join(directories[: depth + 1]), hashlib.sha256())
+            )
+
+        try:
+            modified = get_modifed_time(snapshot.info).timestamp()
+        except KeyError:
+            modified = None
+        entry = f"F {parts[-1]} {snapshot.info['size']} {modified}\n"
+        open_directories[-1][1].update(entry.encode())
+
+    while len(open_directories) > 1:
+        close_last_directory()
+    digests[""] = open_directories[0][1].hexdigest()
+    return digests
+
+
+def is_under(relative_path: str, directories: set[str]) -> bool:
+    """Whether the path is in one of the directories, at any depth."""
+    if "" in directories:
+        return True
+    parts = relative_path.split("/")
+    return any("/".join(parts[:depth]) in directories for depth in range(1, len(parts)))
+
+
+class DirectoryDigestSvc:
+    def __init__(
+        self,
+        cache_engine: DatabaseCacheEngine,
+        storage_left: Storage,
+        storage_right: Storage,
+    ) -> None:
+        self.cache_engine = cache_engine
+        self.storage_left = storage_left
+        self.storage_right = storage_right
+
+        self.left_digests: dict[str, str] = {}
+        self.right_digests: dict[str, str] = {}
+        self.changed_directories: set[str] = set()
+
+    def skip_unchanged(
+        self,
+        left_snapshots: Sequence[FileSnapshot],
+        right_snapshots: Sequence[FileSnapshot],
+    ) -> tuple[list[FileSnapshot], list[FileSnapshot]]:
+        """Drop the files of the directories unchanged on both sides since in sync.
+
+        Both listings must be sorted by relative path.
+        """
+        self.left_digests = compute_directory_digests(left_snapshots)
+        self.right_digests = compute_directory_digests(right_snapshots)
+        stored_left = load_directory_digests(self.cache_engine, self.storage_left.id)
+        stored_right = load_directory_digests(self.cache_engine, self.storage_right.id)
+
+        unchanged = {
+            path
+            for path, digest in self.left_digests.items()
+            if stored_left.get(path) == digest
+            and stored_right.get(path) == self.right_digests.get(path)
+            and path in stored_right
+        }
+        if unchanged:
+            logger.info(f"{len(unchanged)} directories did not change since in sync.")
+
+        return (
+            [
+                snap
+                for snap in left_snapshots
+                if not is_under(snap.relative_path, unchanged)
+            ],
+            [
+                snap
+                for snap in right_snapshots
+                if not is_under(snap.relative_path, unchanged)
+            ],
+        )
+
+    def observe(self, relative_path: str, state: str | None) -> None:
+        """Mark the directories of a file as changed, unless it is in sync."""
+        if state is None:
+            return
+        parts = relative_path.split("/")
+        for depth in range(len(parts)):
+            self.changed_directories.add("/".join(parts[:depth]))
+
+    def save(self) -> None:
+        """Store the digests of the directories found in sync on both sides."""
+        in_sync = {
+            path
+            for path in self.left_digests.keys() & self.right_digests.keys()
+            if path not in self.changed_directories
+        }
+        save_directory_digests(
+            self.cache_engine,
+            self.storage_left,
+            {path: self.left_digests[path] for path in in_sync},
+        )
+        save_directory_digests(
+            self.cache_engine,
+            self.storage_right,
+            {path: self.right_digests[path] for path in in_sync},
+        )
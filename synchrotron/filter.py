@@ -4,19 +4,36 @@ For each storage, we walk in the filesystems to find all elements that match the
 It builds up a collection of file details for each filesystem.
 """
 
-from collections.abc import Iterator
-from datetime import datetime, timedelta
+import posixpath
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from itertools import chain
 from pathlib import Path
 from typing import Any, Generator, Literal, cast, overload
 
 from synchrotron.configuration.filter import Filter, Filters
 from synchrotron.configuration.storage import Storage
+from synchrotron.journal import CursorTracker, RunJournal
+from synchrotron.listing_cache import ListingCache
 from synchrotron.schema.filter_properties import (
     DateTimeProperty,
     NumericalInequalityProperty,
 )
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
 from synchrotron.schema.molecules.fsspec_file_info import FileInfo
-from synchrotron.utils.paths_fsspec import expand_paths
+from synchrotron.utils.file_info import to_timestamp
+from synchrotron.utils.paths_fsspec import (
+    GlobPattern,
+    expand_paths,
+    stream_expand_paths,
+    walk_directories,
+)
+from synchrotron.utils.regex_paths import RegexPaths
+
+type CompiledPaths = list[tuple[GlobPattern | RegexPaths, CompiledFilter]]
+"""paths of filters, each with the criteria of its filter"""
 
 
 class FilterSvc:
@@ -24,29 +41,301 @@ class FilterSvc:
         self,
         filters: Filters,
         file_storage: Storage,
+        run_start: datetime | None = None,
+        listing_cache: ListingCache | None = None,
+        journal: RunJournal | None = None,
     ):
         self.filters = filters
 
         self.storage = file_storage
         self.fs = file_storage.fs
 
+        self.listing_cache = listing_cache or ListingCache(
+            max_directories=filters.listing_cache_size
+        )
+        """listings shared by all the filters, it can also be shared between services"""
+
+        self.run_start = run_start or datetime.now()
+        """time against which the relative durations of the filters are resolved"""
+
+        self.journal = journal
+        """journal of the run, the pruning walk resumes from its cursors"""
+
     def backend_check(self):
         """check if backends support the operations needed by the filters"""
         ...
 
-    def walk(self):
-        """Walk through storage and yields file paths for matching files."""
+    def walk(self) -> Iterator[tuple[str, FileInfo]]:
+        """
+        Walk through storage and yields file paths for matching files. A file
+        matching several include filters is yielded once.
+
+        With `dedup_max_paths`, only that many paths are remembered to drop the
+        files already yielded, the least recently seen being forgotten first.
+        """
+        if self.yields_sorted_paths():
+            # a single walk yields each file once
+            yield from self._walk()
+            return
+
+        max_paths = self.filters.dedup_max_paths
+        seen_paths: OrderedDict[str, None] = OrderedDict()
+        for file_path, file_details in self._walk():
+            if file_path in seen_paths:
+                seen_paths.move_to_end(file_path)
+                continue
+            seen_paths[file_path] = None
+            if max_paths is not None and len(seen_paths) > max_paths:
+                seen_paths.popitem(last=False)
+            yield file_path, file_details
+
+    def _walk(self) -> Iterator[tuple[str, FileInfo]]:
+        if self.filters.traversal == "pruning":
+            yield from self.walk_pruning()
+            return
+
         included_files = self.include_files()
 
         if self.filters.exclude is None:
-            return included_files
+            yield from included_files
+            return
 
         excluded_paths = set(self.exclude_files())
 
         for included_file_path, included_file_details in included_files:
-            if included_file_path in excluded_paths:
+            if included_file_path not in excluded_paths:
                 yield included_file_path, included_file_details
 
+    def walk_pruning(self) -> Iterator[tuple[str, FileInfo]]:
+        """
+        Walk through storage directory by directory and yields file paths for
+        matching files.
+
+        Directories that cannot hold files matching an include path, or that are
+        entirely covered by an exclude filter with no other criteria, are not
+        listed. The exclude filters are evaluated on the walked files, so they do
+        not need a listing of their own.
+
+        With a journal, the walk of each include path starts after its cursor, and
+        the walked files are tracked until they are finished.
+        """
+        excludes = self.compiled_excludes()
+        pruning_excludes = [
+            pattern
+            for pattern, compiled_filter in excludes
+            if isinstance(pattern, GlobPattern)
+            and compiled_filter.bounds == []
+            and compiled_filter.extensions is None
+        ]
+
+        def is_excluded(file_path: str, file_info: FileInfo) -> bool:
+            return any(
+                exclude.covers(file_path) and exclude_filter(file_info)
+                for exclude, exclude_filter in excludes
+            )
+
+        tracked_paths: set[str] = set()
+        for filter_index, filter_ in enumerate(self.filters.include):
+            compiled_filter = compile_filter(filter_, self.run_start)
+            for path in assemble_filter_paths(self.storage.base_path, filter_):
+                include = GlobPattern(self.fs._strip_protocol(path.as_posix()))
+
+                walk_key = (
+                    f"{filter_index}:{self.storage.relative_path(include.pattern)}"
+                )
+                cursor: str | None = None
+                tracker: CursorTracker | None = None
+                if self.journal is not None:
+                    if walk_key in self.journal.walked:
+                        continue
+                    cursor = self.journal.cursors.get(walk_key)
+                    tracker = self.journal.tracker(walk_key, self.storage.id)
+
+                def prune(
+                    directory: str,
+                    include: GlobPattern = include,
+                    cursor: str | None = cursor,
+                ) -> bool:
+                    # "0" is the character right after "/", the subtree of the
+                    # directory is entirely before the cursor
+                    if (
+                        cursor is not None
+                        and self.storage.relative_path(directory) + "0" <= cursor
+                    ):
+                        return True
+                    return not include.may_contain(directory) or any(
+                        exclude.covers(directory) for exclude in pruning_excludes
+                    )
+
+                for file_path, file_info in walk_directories(
+                    self.fs,
+                    include.root,
+                    prune=prune,
+                    ls=partial(self.listing_cache.ls, self.storage),
+                ):
+                    if not include.covers(file_path) or not compiled_filter(file_info):
+                        continue
+                    if is_excluded(file_path, file_info):
+                        continue
+                    if self.journal is not None and tracker is not None:
+                        relative_path = self.storage.relative_path(file_path)
+                        if cursor is not None and relative_path <= cursor:
+                            continue
+                        # a file is only tracked by the first walk yielding it
+                        if file_path in tracked_paths:
+                            continue
+                        tracked_paths.add(file_path)
+                        self.journal.start(tracker, relative_path)
+                    yield file_path, file_info
+
+                if tracker is not None:
+                    tracker.exhausted = True
+
+            for file_path, file_info in self.expand_regex_paths(filter_):
+                if compiled_filter(file_info) and not is_excluded(file_path, file_info):
+                    yield file_path, file_info
+
+    def compiled_includes(self) -> CompiledPaths:
+        """Paths of the include filters, each with the criteria of its filter."""
+        return self._compile_filters(self.filters.include)
+
+    def compiled_excludes(self) -> CompiledPaths:
+        """Paths of the exclude filters, each with the criteria of its filter."""
+        return self._compile_filters(self.filters.exclude or [])
+
+    def _compile_filters(self, filters: list[Filter]) -> CompiledPaths:
+        compiled: CompiledPaths = []
+        for filter_ in filters:
+            compiled_filter = compile_filter(filter_, self.run_start)
+            for path in assemble_filter_paths(self.storage.base_path, filter_):
+                pattern = GlobPattern(self.fs._strip_protocol(path.as_posix()))
+                compiled.append((pattern, compiled_filter))
+            if filter_.regex_paths:
+                compiled.append((self.regex_paths(filter_), compiled_filter))
+        return compiled
+
+    def matches(self, file_path: str, file_info: FileInfo | None) -> bool:
+        """
+        Whether a single file meets the filters, without listing anything. A
+        removed file (without details) matches when its path is included, as its
+        criteria can no longer be evaluated.
+        """
+        return self.matcher()(file_path, file_info)
+
+    def matcher(self) -> Callable[[str, FileInfo | None], bool]:
+        """`matches`, with the filters compiled once for all the files it is given."""
+        includes = self.compiled_includes()
+        excludes = self.compiled_excludes()
+
+        def meets(
+            compiled: CompiledPaths, file_path: str, file_info: FileInfo | None
+        ) -> bool:
+            return any(
+                pattern.covers(file_path)
+                and (file_info is None or compiled_filter(file_info))
+                for pattern, compiled_filter in compiled
+            )
+
+        def matches(file_path: str, file_info: FileInfo | None) -> bool:
+            if not meets(includes, file_path, file_info):
+                return False
+            if file_info is None:
+                return True
+            return not meets(excludes, file_path, file_info)
+
+        return matches
+
+    def watched_roots(self) -> list[str]:
+        """Directories holding all the files that can be included."""
+        roots: list[str] = []
+        for pattern, _ in self.compiled_includes():
+            if isinstance(pattern, GlobPattern):
+                roots.append(pattern.root)
+            else:
+                roots.extend(pattern.listing_roots)
+        return roots
+
+    def expand_paths(self, paths: Iterator[str]) -> Iterator[tuple[str, FileInfo]]:
+        """Finds all the files under the paths, that can contain glob patterns."""
+        if self.filters.streaming_expansion:
+            return stream_expand_paths(
+                self.fs,
+                paths,
+                recursive=True,
+                ls=partial(self.listing_cache.ls, self.storage),
+            )
+
+        return expand_paths(
+            self.fs,
+            paths,
+            recursive=True,
+            maxdepth=None,
+            detail=True,
+            withdirs=False,
+            find=self.listing_cache.finder(self.storage),
+            glob=self.listing_cache.globber(self.storage),
+        )
+
+    def regex_paths(self, filter_: Filter) -> RegexPaths:
+        """Combined regex patterns of a filter, relative to its path prefix."""
+        root = assemble_paths(self.storage.base_path, filter_.path_prefix)
+        root_path = self.fs._strip_protocol(root.as_posix()) if root else ""
+        return RegexPaths(root_path, filter_.regex_paths)
+
+    def expand_regex_paths(self, filter_: Filter) -> Iterator[tuple[str, FileInfo]]:
+        """
+        Finds the files matching the regex paths of a filter. Only the literal
+        directory prefixes of the patterns are listed, and each file is matched
+        once against the combined patterns.
+        """
+        if not filter_.regex_paths:
+            return
+
+        regex_paths = self.regex_paths(filter_)
+        for listing_root in regex_paths.listing_roots:
+            files: Iterable[tuple[str, FileInfo]]
+            if self.filters.traversal == "pruning":
+                files = walk_directories(
+                    self.fs,
+                    listing_root,
+                    ls=partial(self.listing_cache.ls, self.storage),
+                )
+            else:
+                try:
+                    files = self.listing_cache.find(self.storage, listing_root).items()
+                except FileNotFoundError:
+                    continue
+
+            for file_path, file_info in files:
+                if regex_paths.covers(file_path):
+                    yield file_path, file_info
+
+    def snapshots(self) -> Iterator[FileSnapshot]:
+        """
+        Walk through storage and yields a snapshot of each matching file. The
+        snapshots carry the details given by the listing, so that they do not
+        need to be fetched again.
+        """
+        for file_path, file_details in self.walk():
+            yield FileSnapshot(self.storage.relative_path(file_path), file_details)
+
+    def yields_sorted_paths(self) -> bool:
+        """
+        Whether `walk` yields the files in path order, so that its listing can be
+        merge-joined without being sorted in memory first. Only the pruning walk
+        of a single include path does.
+        """
+        if self.filters.traversal != "pruning":
+            return False
+        if any(filter_.regex_paths for filter_ in self.filters.include):
+            return False
+        include_paths = [
+            path
+            for filter_ in self.filters.include
+            for path in assemble_filter_paths(self.storage.base_path, filter_)
+        ]
+        return len(include_paths) == 1
+
     def include_files(self) -> Iterator[tuple[str, FileInfo]]:
         """
         Finds all files that must be included.
@@ -85,21 +374,31 @@ class FilterSvc:
         base_path = self.storage.base_path
 
         for filter_ in filters:
+            compiled_filter = compile_filter(filter_, self.run_start)
             path_gen = assemble_filter_paths(base_path, filter_)
-            paths_expanded_details = expand_paths(
-                self.fs,
-                (path.as_posix() for path in path_gen),
-                recursive=True,
-                maxdepth=None,
-                detail=True,
-                withdirs=False,
+            paths_expanded_details = chain(
+                self.expand_paths(path.as_posix() for path in path_gen),
+                self.expand_regex_paths(filter_),
             )
-            for file_path, file_info in paths_expanded_details:
-                if meet_filter(file_info, filter_):
-                    if include_file_details:
-                        yield file_path, file_info
-                    else:
-                        yield file_path
+            matching_files: Iterator[tuple[str, FileInfo]]
+            if self.filters.batch_size is None:
+                matching_files = (
+                    (file_path, file_info)
+                    for file_path, file_info in paths_expanded_details
+                    if compiled_filter(file_info)
+                )
+            else:
+                from synchrotron.vectorized_filter import filter_batches
+
+                matching_files = filter_batches(
+                    compiled_filter, paths_expanded_details, self.filters.batch_size
+                )
+
+            for file_path, file_info in matching_files:
+                if include_file_details:
+                    yield file_path, file_info
+                else:
+                    yield file_path
 
 
 def assemble_filter_paths(
@@ -141,31 +440,126 @@ def assemble_paths(*components: Path | None) -> Path | None:
 MAP_PROPERTY_NAME_TO_DETAIL_ATTRIBUTES: dict[str, list[str]] = {
     "size": ["size"],
     "created": ["created"],
-    "modified": ["mtime"],
+    "modified": ["mtime", "LastModified"],
 }
 """map property names to the possible attributes in the file details dict"""
 
 
-def meet_filter(file_details: FileInfo, filter_: Filter) -> bool:
-    """Check if the file details meet the filter criteria."""
-    filter_properties = filter_.used_filters()
-    filter_result = True
+class PropertyBounds:
+    """Inclusive numerical bounds applied to one property of the file details."""
+
+    __slots__ = ("lower", "name", "upper")
 
-    for prop in filter_properties:
-        if isinstance(prop, NumericalInequalityProperty):
-            filter_result = filter_result & compare_numerical(prop, file_details)
-        elif isinstance(prop, DateTimeProperty):
-            filter_result = filter_result & compare_datetime(prop, file_details)
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lower: float | None = None
+        self.upper: float | None = None
 
-        if filter_result is False:
+    def contains(self, value: float) -> bool:
+        if self.lower is not None and value < self.lower:
             return False
+        return self.upper is None or value <= self.upper
+
+
+class CompiledFilter:
+    """
+    Predicate built once from a `Filter`. The bounds of the filter are resolved
+    into raw numbers, so that evaluating a file only compares its `size` and
+    timestamps, without building any intermediate object.
+    """
+
+    __slots__ = ("bounds", "extensions")
+
+    def __init__(
+        self, bounds: list[PropertyBounds], extensions: frozenset[str] | None
+    ) -> None:
+        self.bounds = bounds
+        self.extensions = extensions
+
+    def __call__(self, file_details: FileInfo) -> bool:
+        for bound in self.bounds:
+            value = to_timestamp(find_prop_in_detail(bound.name, file_details))
+            if not bound.contains(value):
+                return False
+
+        return (
+            self.extensions is None
+            or get_extension(file_details["name"]) in self.extensions
+        )
 
+
+def compile_filter(filter_: Filter, now: datetime) -> CompiledFilter:
+    """Translate a filter into a predicate.
+
+    Parameters
+    ----------
+    filter_ : Filter
+        filter to compile.
+    now : datetime
+        time against which the relative durations of the filter are resolved,
+        e.g. `modified_after: 1d` keeps files modified after `now - 1d`.
+
+    Returns
+    -------
+    CompiledFilter
+        predicate telling whether the details of a file meet the filter.
+    """
+    bounds: dict[str, PropertyBounds] = {}
+
+    for prop in filter_.used_filters():
+        bound = bounds.setdefault(prop.name, PropertyBounds(prop.name))
+
+        value: float
+        if isinstance(prop, DateTimeProperty):
+            value = resolve_datetime_value(prop.value, now).timestamp()
+        else:
+            value = prop.value
+
+        if prop.inequality_direction == "greater_than":
+            bound.lower = value
+        else:
+            bound.upper = value
+
+    extensions = None
     if filter_.extensions is not None:
-        path = Path(file_details["name"])
-        if path.suffix.lstrip(".") not in filter_.extensions:
+        extensions = frozenset(filter_.extensions)
+
+    return CompiledFilter(list(bounds.values()), extensions)
+
+
+def resolve_datetime_value(value: timedelta | date, now: datetime) -> datetime:
+    """Turn the value of a datetime property into an absolute datetime."""
+    if isinstance(value, timedelta):
+        return now - value
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, time())
+
+
+def get_extension(path: str) -> str:
+    """Extension of a file, without the leading period. See pathlib.Path.suffix."""
+    return posixpath.splitext(path)[1].lstrip(".")
+
+
+def meet_filter(
+    file_details: FileInfo, filter_: Filter, now: datetime | None = None
+) -> bool:
+    """Check if the file details meet the filter criteria.
+
+    The properties are evaluated one by one, which suits one-off checks. When
+    evaluating many files, compile the filter once with `compile_filter`.
+    """
+    for prop in filter_.used_filters():
+        if isinstance(prop, DateTimeProperty):
+            if not compare_datetime(prop, file_details, now):
+                return False
+        elif not compare_numerical(prop, file_details):
             return False
 
-    return True
+    return (
+        filter_.extensions is None
+        or get_extension(file_details["name"]) in filter_.extensions
+    )
 
 
 def compare_numerical(
@@ -174,31 +568,19 @@ def compare_numerical(
     """Compare numerical properties in the file details."""
     value: float = find_prop_in_detail(prop.name, file_details)
     if prop.inequality_direction == "greater_than":
-        if value < prop.value:
-            return False
-    elif prop.inequality_direction == "less_than":
-        if value > prop.value:
-            return False
-
-    return True
+        return value >= prop.value
+    return value <= prop.value
 
 
-def compare_datetime(prop: DateTimeProperty, file_details: FileInfo) -> bool:
+def compare_datetime(
+    prop: DateTimeProperty, file_details: FileInfo, now: datetime | None = None
+) -> bool:
     """Compare datetime properties in the file details."""
-    value: float = find_prop_in_detail(prop.name, file_details)
-    dt_value = datetime.fromtimestamp(value)
+    value = to_timestamp(find_prop_in_detail(prop.name, file_details))
+    bound = resolve_datetime_value(prop.value, now or datetime.now()).timestamp()
     if prop.inequality_direction == "greater_than":
-        if isinstance(prop.value, timedelta) and dt_value - datetime.now() > prop.value:
-            return False
-        if isinstance(prop.value, datetime) and dt_value < prop.value:
-            return False
-    elif prop.inequality_direction == "less_than":
-        if isinstance(prop.value, timedelta) and dt_value - datetime.now() < prop.value:
-            return False
-        if isinstance(prop.value, datetime) and dt_value > prop.value:
-            return False
-
-    return True
+        return value >= bound
+    return value <= bound
 
 
 def find_prop_in_detail(prop_name: str, file_details: FileInfo) -> Any:
@@ -0,0 +1,157 @@
+"""
+Synchronise several pairs of storages at the same time, under a shared budget.
+
+Each pair runs its own synchronisation in a thread of a bounded pool. All the
+transfers share a limit of concurrent transfers and of bandwidth, on top of the
+limits of their storages, so that running more pairs does not overload the
+network or the disks. Cache databases at the same URL share their engine, and
+storages of the same asynchronous backend (e.g. s3, gcs) share their filesystem
+instance, as fsspec caches those for the whole process. Instances of synchronous
+backends (e.g. sftp) are not safe to share between threads, each pair keeps its
+own.
+
+Pairs are started in an order computed from their last run. Starting the longest
+ones first keeps the fleet from waiting on a long pair started last, so that it
+takes about as long as its slowest pair.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+from synchrotron.configuration import OneConfig
+from synchrotron.configuration.fleet import Fleet
+from synchrotron.synchronisation import SynchronisationReport, synchronise
+from synchrotron.transfer import TransferBudget
+from synchrotron.utils.atomic_write import write_json_atomically
+from synchrotron.utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PairState:
+    """Outcome of the last run of a pair of storages."""
+
+    last_success: str | None = None
+    """ISO time at which the last run without errors started"""
+    duration: float = 0.0
+    """duration of the last run, in seconds"""
+    bytes_transferred: int = 0
+    """bytes transferred by the last run"""
+
+
+def pair_key(config: OneConfig) -> str:
+    """Identifier of a pair of storages, stable when the rest of the config changes."""
+    return f"{config.left.id}-{config.right.id}"
+
+
+def load_states(path: Path | None) -> dict[str, PairState]:
+    if path is None:
+        return {}
+    try:
+        data = json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    return {key: PairState(**state) for key, state in data.items()}
+
+
+class FleetSvc:
+    def __init__(self, configs: Sequence[OneConfig], config: Fleet) -> None:
+        self.configs = configs
+        self.config = config
+
+        bandwidth = None
+        if config.max_bandwidth is not None:
+            bandwidth = TokenBucket(int(config.max_bandwidth))
+        self.budget = TransferBudget(
+            threading.BoundedSemaphore(config.max_concurrent_transfers), bandwidth
+        )
+        self.states = load_states(config.state_path)
+        self._lock = threading.Lock()
+
+    def order(self) -> list[OneConfig]:
+        """Configs in the order they are started, pairs never run before first."""
+
+        def priority(config: OneConfig) -> tuple[bool, float]:
+            state = self.states.get(pair_key(config))
+            if state is None:
+                return (False, 0.0)
+            if self.config.priority == "staleness":
+                if state.last_success is None:
+                    return (True, 0.0)
+                return (True, datetime.fromisoformat(state.last_success).timestamp())
+            if self.config.priority == "changes":
+                return (True, -state.bytes_transferred)
+            return (True, -state.duration)
+
+        return sorted(self.configs, key=priority)
+
+    def run(self) -> dict[str, SynchronisationReport | None]:
+        """Synchronise all the pairs.
+
+        A pair that fails does not stop the others.
+
+        Returns
+        -------
+        dict[str, SynchronisationReport | None]
+            report of the run of each pair, None for the pairs that failed.
+        """
+        configs = []
+        for config in self.order():
+            if config.synchronisation.trigger.on == "watch":
+                logger.warning(
+                    f"The pair {pair_key(config)} is watched, it is not run with "
+                    "the fleet."
+                )
+                continue
+            configs.append(config)
+
+        with ThreadPoolExecutor(
+            max_workers=self.config.max_concurrent_synchronisations,
+            thread_name_prefix="fleet",
+        ) as executor:
+            futures = {
+                pair_key(config): executor.submit(self.synchronise, config)
+                for config in configs
+            }
+        return {key: future.result() for key, future in futures.items()}
+
+    def synchronise(self, config: OneConfig) -> SynchronisationReport | None:
+        """Synchronise a pair within the budget of the fleet, and record its outcome."""
+        key = pair_key(config)
+        started_at = datetime.now().isoformat()
+        start = time.perf_counter()
+        try:
+            report = synchronise(config, self.budget)
+        except Exception:
+            logger.exception(f"The synchronisation of the pair {key} failed.")
+            return None
+        duration = time.perf_counter() - start
+
+        logger.info(
+            f"Pair {key} synchronised in {duration:.1f}s: {report.n_transfers} "
+            f"transfers, {report.n_errors} errors, {report.bytes_transferred} bytes."
+        )
+        with self._lock:
+            state = self.states.setdefault(key, PairState())
+            if report.n_errors == 0:
+                state.last_success = started_at
+            state.duration = duration
+            state.bytes_transferred = report.bytes_transferred
+            self.save()
+        return report
+
+    def save(self) -> None:
+        if self.config.state_path is None:
+            return
+        write_json_atomically(
+            self.config.state_path,
+            {key: asdict(state) for key, state in self.states.items()},
+        )
@@ -0,0 +1,112 @@
+"""
+Hash and compare the content of files, reading them by fixed-size chunks.
+
+Files of local storages can also be hashed in a pool of processes, so that
+hashing scales with the number of cores. They are then memory-mapped and fed to
+the hash function by `memoryview` slices, without copying them into bytes.
+"""
+
+import hashlib
+import mmap
+import multiprocessing
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Self
+
+from fsspec import AbstractFileSystem
+from fsspec.implementations.local import LocalFileSystem
+
+
+def hash_file(
+    fs: AbstractFileSystem, path: str, algorithm: str, chunk_size: int
+) -> str:
+    """Digest of the content of a file, read chunk by chunk."""
+    hasher = hashlib.new(algorithm)
+    with fs.open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def compare_file_contents(
+    fs_left: AbstractFileSystem,
+    path_left: str,
+    fs_right: AbstractFileSystem,
+    path_right: str,
+    algorithm: str,
+    chunk_size: int,
+) -> str | None:
+    """Read two files side by side, stopping at the first chunk that differs.
+
+    Returns
+    -------
+    str | None
+        digest of the content if the files are identical, None otherwise.
+    """
+    hasher = hashlib.new(algorithm)
+    with (
+        fs_left.open(path_left, "rb") as left,
+        fs_right.open(path_right, "rb") as right,
+    ):
+        while True:
+            left_chunk = left.read(chunk_size)
+            right_chunk = right.read(chunk_size)
+            if left_chunk != right_chunk:
+                return None
+            if not left_chunk:
+                return hasher.hexdigest()
+            hasher.update(left_chunk)
+
+
+def hash_local_file(path: str, algorithm: str, chunk_size: int) -> str:
+    """Digest of the content of a local file, read through a memory map."""
+    hasher = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        try:
+            mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return hasher.hexdigest()
+
+        with mapped_file, memoryview(mapped_file) as view:
+            for start in range(0, len(view), chunk_size):
+                hasher.update(view[start : start + chunk_size])
+    return hasher.hexdigest()
+
+
+class LocalHashingSvc:
+    """Hash local files in a pool of processes."""
+
+    def __init__(self, max_workers: int | None = None) -> None:
+        # workers start once the thread pools of the run exist, forking the
+        # process would copy the locks those threads hold
+        start_method = "spawn"
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            start_method = "forkserver"
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context(start_method),
+        )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def hash_files(
+        self, paths: Sequence[str], algorithm: str, chunk_size: int
+    ) -> Iterator[str]:
+        """Digests of the files, in the same order as the paths."""
+        return self._executor.map(
+            partial(hash_local_file, algorithm=algorithm, chunk_size=chunk_size),
+            paths,
+        )
+
+
+def is_local_filesystem(fs: AbstractFileSystem) -> bool:
+    return isinstance(fs, LocalFileSystem)
@@ -0,0 +1,226 @@
+"""
+Incremental scans, to only compare the files that changed since the last run.
+
+Each storage keeps a watermark: the newest modification time up to which its
+files were found in sync. A file modified after the watermark of its storage is
+compared again. Deletions, and files moved in with an old modification time, do
+not move the watermark: they are caught by comparing the number of files and the
+total size of each directory in the listing with the cached records.
+
+As modification times can be wrong (e.g. a file restored with its original
+time), all the files are compared on a regular basis.
+"""
+
+import logging
+from collections.abc import Iterable, Sequence
+from datetime import UTC, datetime
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.comparaison.incremental_scan import IncrementalScan
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.scan_state import (
+    DirectoryAggregate,
+    ScanState,
+    load_directory_aggregates,
+    load_scan_state,
+    save_scan_state,
+)
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.utils.file_info import get_modifed_time
+
+logger = logging.getLogger(__name__)
+
+
+def get_directory_aggregates(
+    snapshots: Iterable[FileSnapshot],
+) -> dict[str, DirectoryAggregate]:
+    """Number of files and their total size, for each directory of a listing."""
+    aggregates: dict[str, DirectoryAggregate] = {}
+    for snapshot in snapshots:
+        if snapshot.info is None:
+            continue
+        directory = snapshot.relative_path.rpartition("/")[0]
+        n_files, total_size = aggregates.get(directory, (0, 0))
+        aggregates[directory] = DirectoryAggregate(
+            n_files + 1, total_size + (snapshot.info.get("size") or 0)
+        )
+    return aggregates
+
+
+def get_modified_naive(snapshot: FileSnapshot) -> datetime | None:
+    """Modification time of a file without time zone, as stored in the database."""
+    if snapshot.info is None:
+        return None
+    try:
+        return get_modifed_time(snapshot.info).replace(tzinfo=None)
+    except KeyError:
+        return None
+
+
+def get_watermark(
+    snapshots: Iterable[FileSnapshot], started_at: datetime
+) -> datetime | None:
+    """Newest modification time of a listing, capped to the start of the run.
+
+    Files modified while the run was listing them may have a modification time
+    older than the newest one of the listing, but not older than the start.
+
+    Parameters
+    ----------
+    snapshots : Iterable[FileSnapshot]
+        listing of a storage.
+    started_at : datetime
+        time zone aware start of the run.
+    """
+    newest: datetime | None = None
+    for snapshot in snapshots:
+        if snapshot.info is None:
+            continue
+        try:
+            modified = get_modifed_time(snapshot.info)
+        except KeyError:
+            continue
+        if newest is None or modified > newest:
+            newest = modified
+
+    if newest is None:
+        return None
+    # local file systems give naive local times, object storages aware UTC times
+    if newest.tzinfo is None:
+        start = started_at.astimezone().replace(tzinfo=None)
+    else:
+        start = started_at.astimezone(newest.tzinfo)
+    return min(newest, start).replace(tzinfo=None)
+
+
+class IncrementalScanSvc:
+    def __init__(
+        self,
+        cache_engine: DatabaseCacheEngine,
+        config: IncrementalScan,
+        storage_left: Storage,
+        storage_right: Storage,
+    ) -> None:
+        self.cache_engine = cache_engine
+        self.config = config
+        self.storage_left = storage_left
+        self.storage_right = storage_right
+
+        self.started_at = datetime.now(UTC)
+        self.full_scan = True
+        self.previous_states: dict[int, ScanState] = {}
+        self.watermarks: dict[int, datetime | None] = {}
+        # files not in sync, with their snapshot on each side
+        self.unresolved: dict[str, tuple[FileSnapshot, FileSnapshot]] = {}
+
+    def select(
+        self,
+        left_snapshots: Sequence[FileSnapshot],
+        right_snapshots: Sequence[FileSnapshot],
+    ) -> tuple[list[FileSnapshot], list[FileSnapshot]]:
+        """Keep the files that changed on either side since the last run.
+
+        A file is kept on both sides if it was modified after the watermark of
+        one side, or if its directory does not hold the same number of files or
+        total size as cached on one side. All the files are kept when a full scan
+        is due.
+        """
+        self.started_at = datetime.now(UTC)
+        for storage, snapshots in (
+            (self.storage_left, left_snapshots),
+            (self.storage_right, right_snapshots),
+        ):
+            self.previous_states[storage.id] = load_scan_state(
+                self.cache_engine, storage.id
+            )
+            self.watermarks[storage.id] = get_watermark(snapshots, self.started_at)
+
+        self.full_scan = any(
+            self.is_full_scan_due(state) for state in self.previous_states.values()
+        )
+        if self.full_scan:
+            logger.info("Running a full scan.")
+            return list(left_snapshots), list(right_snapshots)
+
+        changed_paths: set[str] = set()
+        changed_directories: set[str] = set()
+        for storage, snapshots in (
+            (self.storage_left, left_snapshots),
+            (self.storage_right, right_snapshots),
+        ):
+            watermark = self.previous_states[storage.id].watermark
+            for snapshot in snapshots:
+                modified = get_modified_naive(snapshot)
+                if modified is None or watermark is None or modified >= watermark:
+                    changed_paths.add(snapshot.relative_path)
+
+            listed = get_directory_aggregates(snapshots)
+            cached = load_directory_aggregates(self.cache_engine, storage.id)
+            changed_directories |= {
+                directory
+                for directory in listed.keys() | cached.keys()
+                if listed.get(directory) != cached.get(directory)
+            }
+
+        def is_changed(snapshot: FileSnapshot) -> bool:
+            return (
+                snapshot.relative_path in changed_paths
+                or snapshot.relative_path.rpartition("/")[0] in changed_directories
+            )
+
+        left_changed = [snap for snap in left_snapshots if is_changed(snap)]
+        right_changed = [snap for snap in right_snapshots if is_changed(snap)]
+        logger.info(
+            f"{len(left_changed)} of {len(left_snapshots)} left files and "
+            f"{len(right_changed)} of {len(right_snapshots)} right files changed "
+            f"since the last run, in {len(changed_directories)} changed directories."
+        )
+        return left_changed, right_changed
+
+    def is_full_scan_due(self, state: ScanState) -> bool:
+        if state.watermark is None or state.last_full_scan is None:
+            return True
+        return datetime.now() - state.last_full_scan >= self.config.full_scan_every
+
+    def observe(
+        self, left_snapshot: FileSnapshot, right_snapshot: FileSnapshot, state: object
+    ) -> None:
+        """Remember the files that are not in sync, until they are transferred."""
+        if state is not None:
+            self.unresolved[left_snapshot.relative_path] = (
+                left_snapshot,
+                right_snapshot,
+            )
+
+    def resolve(self, relative_path: str) -> None:
+        """Mark a file as in sync, once it was transferred."""
+        self.unresolved.pop(relative_path, None)
+
+    def save(self) -> None:
+        """Store the watermarks of both storages.
+
+        The watermark of a storage does not go past the files that are still not
+        in sync, so that they are compared again on the next run.
+        """
+        if not self.previous_states:
+            # no listing went through the scan
+            return
+
+        for storage, side in ((self.storage_left, 0), (self.storage_right, 1)):
+            previous_state = self.previous_states.get(storage.id, ScanState(None, None))
+            watermark = self.watermarks.get(storage.id) or previous_state.watermark
+            unresolved_times = [
+                modified
+                for snapshots in self.unresolved.values()
+                if (modified := get_modified_naive(snapshots[side])) is not None
+            ]
+            if watermark is not None and unresolved_times:
+                watermark = min(watermark, *unresolved_times)
+
+            last_full_scan = previous_state.last_full_scan
+            if self.full_scan:
+                last_full_scan = self.started_at.astimezone().replace(tzinfo=None)
+
+            save_scan_state(
+                self.cache_engine, storage, ScanState(watermark, last_full_scan)
+            )
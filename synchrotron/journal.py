@@ -0,0 +1,200 @@
+"""
+Journal of a synchronisation run, to resume it where it stopped.
+
+The pruning walk of each include path yields files in path order. For each of
+these walks, a cursor tracks the last path up to which all the walked files are
+finished, i.e. found in sync or transferred. The files transferred past the
+cursors are also recorded. Checkpoints write both to a file, atomically, once the
+cache records of the finished files are written.
+
+A run restarted with the same configuration does not walk again the subtrees
+before the cursors, and skips the actions already done, so that its cost is
+proportional to the remaining work rather than to the size of the tree.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from datetime import timedelta
+from pathlib import Path
+
+from synchrotron.configuration import OneConfig
+from synchrotron.utils.atomic_write import write_json_atomically
+
+logger = logging.getLogger(__name__)
+
+
+def config_fingerprint(config: OneConfig) -> str:
+    """Digest of a configuration, a journal only resumes the run of the same one."""
+    return hashlib.sha256(config.model_dump_json().encode()).hexdigest()
+
+
+class CursorTracker:
+    """Last path up to which all the files yielded by a walk are finished.
+
+    Files must be started in path order, they can be finished in any order.
+    """
+
+    def __init__(self, cursor: str | None = None) -> None:
+        self.cursor = cursor
+        self.pending: deque[str] = deque()
+        self.finished: set[str] = set()
+        self.exhausted = False
+        """whether the walk yielded all its files"""
+
+    @property
+    def done(self) -> bool:
+        return self.exhausted and not self.pending
+
+    def start(self, path: str) -> None:
+        self.pending.append(path)
+
+    def finish(self, path: str) -> list[str]:
+        """Mark a started file as finished, and return the paths the cursor passed."""
+        self.finished.add(path)
+
+        passed = []
+        while self.pending and self.pending[0] in self.finished:
+            self.cursor = self.pending.popleft()
+            self.finished.discard(self.cursor)
+            passed.append(self.cursor)
+        return passed
+
+
+class RunJournal:
+    def __init__(
+        self,
+        path: Path,
+        fingerprint: str,
+        checkpoint_every: timedelta = timedelta(minutes=1),
+    ) -> None:
+        self.path = path
+        self.fingerprint = fingerprint
+        self.checkpoint_every = checkpoint_every
+
+        self.cursors: dict[str, str] = {}
+        """cursor of each walk, as of the last checkpoint"""
+        self.walked: set[str] = set()
+        """walks whose files were all finished"""
+        self.completed: set[str] = set()
+        """relative paths of the files transferred past the cursors"""
+
+        self.trackers: dict[tuple[str, int], CursorTracker] = {}
+        self._tracking: dict[str, list[CursorTracker]] = {}
+        # number of trackers yet to pass each completed path
+        self._passing: dict[str, int] = {}
+        self._last_checkpoint = time.monotonic()
+        # files are walked and finished from different threads in pipelined runs
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(
+        cls,
+        path: Path,
+        fingerprint: str,
+        checkpoint_every: timedelta = timedelta(minutes=1),
+    ) -> "RunJournal":
+        """Journal of the run of a configuration, restored from its last checkpoint."""
+        journal = cls(path, fingerprint, checkpoint_every)
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return journal
+
+        if data.get("fingerprint") != fingerprint:
+            logger.warning(
+                f"The journal {path} was written for another configuration, "
+                "it is ignored."
+            )
+            return journal
+
+        journal.cursors = data["cursors"]
+        journal.walked = set(data["walked"])
+        journal.completed = set(data["completed"])
+        logger.info(
+            f"Resuming the run from {path}: {len(journal.walked)} walks finished, "
+            f"{len(journal.cursors)} walks in progress."
+        )
+        return journal
+
+    def tracker(self, walk_key: str, storage_id: int) -> CursorTracker:
+        """Tracker of the walk of a storage, starting from the cursor of the walk."""
+        key = (walk_key, storage_id)
+        with self._lock:
+            if key not in self.trackers:
+                self.trackers[key] = CursorTracker(self.cursors.get(walk_key))
+            return self.trackers[key]
+
+    def start(self, tracker: CursorTracker, relative_path: str) -> None:
+        with self._lock:
+            tracker.start(relative_path)
+            self._tracking.setdefault(relative_path, []).append(tracker)
+
+    def finish(self, relative_path: str) -> None:
+        """Mark a file as finished in all the walks that yielded it."""
+        with self._lock:
+            for tracker in self._tracking.pop(relative_path, []):
+                for passed in tracker.finish(relative_path):
+                    self._passed(passed)
+
+    def complete(self, relative_path: str) -> None:
+        """Record that the action of a file was done, and mark the file as finished."""
+        with self._lock:
+            self.completed.add(relative_path)
+            self._passing[relative_path] = len(self._tracking.get(relative_path, []))
+            self.finish(relative_path)
+
+    def _passed(self, relative_path: str) -> None:
+        if relative_path not in self._passing:
+            return
+        self._passing[relative_path] -= 1
+        if self._passing[relative_path] <= 0:
+            # files before all the cursors are not walked again
+            del self._passing[relative_path]
+            self.completed.discard(relative_path)
+
+    def checkpoint_if_due(self, before: Callable[[], None] | None = None) -> None:
+        """Save the journal if the last checkpoint is old enough.
+
+        `before` is called first, e.g. to write the cache records of the finished
+        files, which are not compared again once the journal is saved.
+        """
+        elapsed = time.monotonic() - self._last_checkpoint
+        if elapsed < self.checkpoint_every.total_seconds():
+            return
+        if before is not None:
+            before()
+        self.save()
+
+    def save(self) -> None:
+        """Write the journal to a temporary file, then replace the previous one."""
+        with self._lock:
+            walk_trackers: dict[str, list[CursorTracker]] = {}
+            for (walk_key, _), tracker in self.trackers.items():
+                walk_trackers.setdefault(walk_key, []).append(tracker)
+
+            for walk_key, trackers in walk_trackers.items():
+                if all(tracker.done for tracker in trackers):
+                    self.walked.add(walk_key)
+                    self.cursors.pop(walk_key, None)
+                    continue
+                cursors = [tracker.cursor for tracker in trackers if not tracker.done]
+                if None not in cursors:
+                    self.cursors[walk_key] = min(c for c in cursors if c is not None)
+
+            data = {
+                "fingerprint": self.fingerprint,
+                "cursors": dict(self.cursors),
+                "walked": sorted(self.walked),
+                "completed": sorted(self.completed),
+            }
+        write_json_atomically(self.path, data)
+        self._last_checkpoint = time.monotonic()
+
+    def remove(self) -> None:
+        """Delete the journal, once the run is over."""
+        self.path.unlink(missing_ok=True)
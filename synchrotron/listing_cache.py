@@ -0,0 +1,135 @@
+"""
+Listings shared by all the filters of a run.
+
+Filters often share parent directories, e.g. several include filters under the
+same prefix with different size or date bounds. Caching the listings by storage
+and directory ensures that each directory is listed once per run, whatever the
+number of filters that go through it.
+
+Recursive listings and glob expansions are cached the same way. A path under a
+recursively listed one is served from the listing of its nearest listed parent,
+found by looking up each of its parents.
+"""
+
+from collections import OrderedDict
+from typing import Any, cast
+
+from synchrotron.configuration.storage import Storage
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+
+class ListingCache:
+    def __init__(self, max_directories: int | None = None) -> None:
+        """
+        Parameters
+        ----------
+        max_directories : int | None, optional
+            maximum number of directory listings kept in memory, the least
+            recently used being dropped first. Recursive listings and glob
+            expansions are each bounded by the same number. By default, there is
+            no limit.
+        """
+        self.max_directories = max_directories
+        self._listings: OrderedDict[tuple[int, str], list[FileInfo]] = OrderedDict()
+        self._recursive_listings: OrderedDict[tuple[int, str], dict[str, FileInfo]] = (
+            OrderedDict()
+        )
+        self._globs: OrderedDict[tuple[int, str, int | None], dict[str, FileInfo]] = (
+            OrderedDict()
+        )
+
+    def _remember(self, cache: OrderedDict, key: tuple, value: Any) -> None:
+        cache[key] = value
+        if self.max_directories is not None:
+            while len(cache) > self.max_directories:
+                cache.popitem(last=False)
+
+    def ls(self, storage: Storage, directory: str) -> list[FileInfo]:
+        """List the content of a directory, with the details of each entry."""
+        key = (storage.id, directory)
+        if key in self._listings:
+            self._listings.move_to_end(key)
+            return self._listings[key]
+
+        listing = cast(list[FileInfo], storage.fs.ls(directory, detail=True))
+        self._remember(self._listings, key, listing)
+        return listing
+
+    def find(self, storage: Storage, path: str) -> dict[str, FileInfo]:
+        """
+        List all the files under a path, with their details. Paths under an
+        already listed path are served from its listing.
+        """
+        listed_path = path
+        while True:
+            key = (storage.id, listed_path)
+            if key in self._recursive_listings:
+                self._recursive_listings.move_to_end(key)
+                listing = self._recursive_listings[key]
+                if listed_path == path:
+                    return listing
+                return {
+                    file_path: details
+                    for file_path, details in listing.items()
+                    if file_path == path or file_path.startswith(path + "/")
+                }
+            if "/" not in listed_path:
+                break
+            listed_path = listed_path.rpartition("/")[0]
+
+        listing = cast(
+            dict[str, FileInfo],
+            storage.fs.find(path, maxdepth=None, detail=True, withdirs=False),
+        )
+        self._remember(self._recursive_listings, (storage.id, path), listing)
+        return listing
+
+    def glob(
+        self, storage: Storage, pattern: str, maxdepth: int | None = None
+    ) -> dict[str, FileInfo]:
+        """Paths matching a glob pattern, with their details."""
+        key = (storage.id, pattern, maxdepth)
+        if key in self._globs:
+            self._globs.move_to_end(key)
+            return self._globs[key]
+
+        matches = cast(
+            dict[str, FileInfo],
+            storage.fs.glob(pattern, maxdepth=maxdepth, detail=True),
+        )
+        self._remember(self._globs, key, matches)
+        return matches
+
+    def finder(self, storage: Storage):
+        """Drop-in replacement of `fs.find` that goes through the cache when it can."""
+
+        def find(
+            path: str,
+            maxdepth: int | None = None,
+            detail: bool = False,
+            withdirs: bool = False,
+            **kwargs: Any,
+        ):
+            if maxdepth is not None or withdirs or kwargs:
+                return storage.fs.find(
+                    path, maxdepth=maxdepth, detail=detail, withdirs=withdirs, **kwargs
+                )
+
+            listing = self.find(storage, path)
+            return listing if detail else list(listing)
+
+        return find
+
+    def globber(self, storage: Storage):
+        """Drop-in replacement of `fs.glob` that goes through the cache when it can."""
+
+        def glob(
+            path: str, maxdepth: int | None = None, detail: bool = False, **kwargs: Any
+        ):
+            if kwargs:
+                return storage.fs.glob(path, maxdepth=maxdepth, detail=detail, **kwargs)
+
+            matches = self.glob(storage, path, maxdepth)
+            return matches if detail else list(matches)
+
+        return glob
@@ -1,15 +1,14 @@
-from synchrotron.comparaison import ComparaisonSvc
 from synchrotron.configuration import OneConfig
-from synchrotron.filter import FilterSvc
+from synchrotron.synchronisation import synchronise
+from synchrotron.watch import WatchSvc
 
 
 # filter interesting paths
 def main():
     config = OneConfig.model_validate({})
 
-    filter_svc = FilterSvc(config.filters, config.left)
-    comparison_svc = ComparaisonSvc(config.comparaison, config.left, config.right)
+    if config.synchronisation.trigger.on == "watch":
+        WatchSvc(config).run()
+        return
 
-    for file_path, file_details in filter_svc.walk():
-        comparison_svc.compare()
-        ...
+    synchronise(config)
@@ -0,0 +1,276 @@
+"""
+Staged pipeline, where each stage runs in its own threads.
+
+The items of a source (e.g. the listing of a storage) go through stages that are
+connected by bounded queues. A stage whose output queue is full waits for the
+next stage to catch up, so that a slow stage throttles the ones before it instead
+of letting items pile up in memory. Stages that wait on the network, on the
+database or on hashing then overlap instead of taking turns.
+
+The source is consumed by a single thread, so a listing is not parallelised: it
+only overlaps with the stages. The consumer of the output queue is not a stage
+either. In a synchronisation, the transfers consume it in `TransferSvc.run`,
+whose pool of workers is bounded by the transfers allowed on each storage.
+
+Each stage reports how busy its workers were, and how long they waited for room
+in the next queue, which points at the stage that slows the whole pipeline.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+"""put in a queue once all the items are in it"""
+
+
+class PipelineStopped(Exception):
+    """Raised in the threads of a pipeline that stopped before its end."""
+
+
+@dataclass
+class Stage:
+    name: str
+    function: Callable[[Any], Any]
+    """called on each item in the input queue, its result goes to the next stage"""
+    workers: int = 1
+    queue_size: int = 1_000
+    """maximum number of items waiting for the stage"""
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items: int = 0
+    busy: float = 0.0
+    """total time spent by the workers on the items, in seconds"""
+    blocked: float = 0.0
+    """total time spent by the workers waiting for room in the next queue, in seconds"""
+    input_queue: queue.Queue[Any] | None = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, busy: float = 0.0, blocked: float = 0.0) -> None:
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.blocked += blocked
+
+    def utilisation(self, elapsed: float) -> float:
+        """Share of the time the workers of the stage spent on items."""
+        if elapsed <= 0:
+            return 0.0
+        return self.busy / (self.workers * elapsed)
+
+    def describe(self, elapsed: float) -> str:
+        description = (
+            f"{self.name}: {self.items} items, {self.workers} workers "
+            f"{self.utilisation(elapsed):.0%} busy"
+        )
+        if elapsed > 0 and self.blocked:
+            blocked = self.blocked / (self.workers * elapsed)
+            description += f", {blocked:.0%} waiting for the next stage"
+        if self.input_queue is not None:
+            description += (
+                f", {self.input_queue.qsize()}/{self.input_queue.maxsize} queued"
+            )
+        return description
+
+
+class Pipeline:
+    def __init__(
+        self,
+        source: Iterable[Any],
+        stages: Sequence[Stage],
+        output_queue_size: int = 1_000,
+        source_name: str = "listing",
+        report_every: timedelta | None = None,
+    ) -> None:
+        """Run the items of a source through stages.
+
+        Items leave a stage with several workers in the order they are done.
+
+        Parameters
+        ----------
+        source : Iterable[Any]
+            items going through the pipeline, iterated in a thread of its own.
+        stages : Sequence[Stage]
+            stages the items go through, in order.
+        output_queue_size : int, optional
+            maximum number of items waiting to be consumed out of the pipeline.
+        source_name : str, optional
+            name of the source in the reports, by default "listing".
+        report_every : timedelta | None, optional
+            time between two reports of the stages in the logs while items go
+            through, by default the stages are only reported by calling `report`.
+        """
+        self.source = source
+        self.stages = stages
+        self.report_every = report_every
+
+        self.queues: list[queue.Queue[Any]] = [
+            queue.Queue(maxsize=size)
+            for size in [stage.queue_size for stage in stages] + [output_queue_size]
+        ]
+        self.stats = [StageStats(source_name, 1)] + [
+            StageStats(stage.name, stage.workers, input_queue=input_queue)
+            for stage, input_queue in zip(stages, self.queues)
+        ]
+
+        self._stop = threading.Event()
+        # the last worker of a stage to finish tells the next stage
+        self._remaining_workers = [stage.workers for stage in stages]
+        self._remaining_lock = threading.Lock()
+        self._error: Exception | None = None
+        self._started_at = time.monotonic()
+
+    def add_stats(self, name: str, workers: int) -> StageStats:
+        """Stats of a stage running outside of the pipeline, e.g. its consumer."""
+        stats = StageStats(name, workers)
+        self.stats.append(stats)
+        return stats
+
+    def __iter__(self) -> Iterator[Any]:
+        self._started_at = time.monotonic()
+        self._remaining_workers = [stage.workers for stage in self.stages]
+        threads = [
+            threading.Thread(target=self._produce, name="pipeline-source", daemon=True)
+        ]
+        for index, stage in enumerate(self.stages):
+            threads += [
+                threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True,
+                )
+                for worker in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+
+        last_report = time.monotonic()
+        try:
+            while True:
+                item = self._get(self.queues[-1])
+                if item is _END:
+                    break
+                yield item
+
+                if (
+                    self.report_every is not None
+                    and time.monotonic() - last_report
+                    >= self.report_every.total_seconds()
+                ):
+                    self.report()
+                    last_report = time.monotonic()
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def report(self) -> None:
+        """Log how busy each stage is."""
+        elapsed = time.monotonic() - self._started_at
+        for stats in self.stats:
+            logger.info(stats.describe(elapsed))
+
+    def _produce(self) -> None:
+        output_queue = self.queues[0]
+        stats = self.stats[0]
+        try:
+            iterator = iter(self.source)
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                busy = time.perf_counter() - start
+                if item is _END:
+                    break
+
+                start = time.perf_counter()
+                self._put(output_queue, item)
+                stats.add(busy, time.perf_counter() - start)
+            self._put(output_queue, _END)
+        except PipelineStopped:
+            return
+        except Exception as error:
+            logger.exception(f"The {stats.name} failed.")
+            self._fail(error)
+        except BaseException:
+            self._interrupt()
+            raise
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        input_queue, output_queue = self.queues[index], self.queues[index + 1]
+        stats = self.stats[index + 1]
+        try:
+            while True:
+                item = self._get(input_queue)
+                if item is _END:
+                    # the other workers of the stage also need to see the end
+                    self._put(input_queue, _END)
+                    break
+
+                start = time.perf_counter()
+                result = stage.function(item)
+                busy = time.perf_counter() - start
+
+                start = time.perf_counter()
+                self._put(output_queue, result)
+                stats.add(busy, time.perf_counter() - start)
+
+            with self._remaining_lock:
+                self._remaining_workers[index] -= 1
+                is_last_worker = self._remaining_workers[index] == 0
+            if is_last_worker:
+                self._put(output_queue, _END)
+        except PipelineStopped:
+            return
+        except Exception as error:
+            logger.exception(f"The {stage.name} stage failed.")
+            self._fail(error)
+        except BaseException:
+            self._interrupt()
+            raise
+
+    def _fail(self, error: Exception) -> None:
+        """Stop the pipeline, the error of the stage is raised to the consumer."""
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _interrupt(self) -> None:
+        """Stop the pipeline, e.g. on `SystemExit`, which is not an error of a stage."""
+        self._stop.set()
+
+    def _put(self, output_queue: queue.Queue[Any], item: Any) -> None:
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                output_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, input_queue: queue.Queue[Any]) -> Any:
+        while True:
+            if self._stop.is_set():
+                if self._error is not None:
+                    raise self._error
+                raise PipelineStopped()
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
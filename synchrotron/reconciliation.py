@@ -0,0 +1,257 @@
+"""
+Detect files that were renamed or moved on one side since the last synchronisation.
+
+A renamed file shows up as a removed file (at its old path) and a created file (at
+its new path) on the same side. Instead of removing the old copy on the other side
+and transferring the new file again, the old copy is moved to the new path.
+
+Removed files are identified by their cached record (size and modification time
+when they were last synchronised), created files by their current details. They
+are paired through a dict keyed by this identity, so the pass stays linear in the
+number of changes. When the cached record holds a digest of the content, the
+created file is hashed to confirm the pairing.
+
+The pairing is done as the comparaisons stream by, with a bounded number of
+files held on each side, so that transfers start before the listing ends.
+"""
+
+import logging
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from itertools import count
+
+from synchrotron.comparaison import ComparaisonState, ComparaisonSvc
+from synchrotron.configuration.comparaison import DateTimeSizeCacheComparaison
+from synchrotron.configuration.storage import Storage
+from synchrotron.hashing import hash_file
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.transfer import Side, Transfer
+from synchrotron.utils.file_info import get_modifed_time
+
+logger = logging.getLogger(__name__)
+
+type Comparaison = tuple[FileSnapshot, FileSnapshot, ComparaisonState | None]
+type FileIdentity = tuple[int, datetime]
+
+
+class HeldChanges:
+    """
+    Removed and created files of a side, held until their counterpart comes.
+
+    Files are indexed by their identity. At most `max_held` files are held, the
+    ones held the longest being released first.
+    """
+
+    def __init__(self, max_held: int) -> None:
+        self.max_held = max_held
+        self.removed: dict[FileIdentity, dict[int, Comparaison]] = defaultdict(dict)
+        self.created: dict[FileIdentity, dict[int, Comparaison]] = defaultdict(dict)
+        self._order: OrderedDict[int, tuple[bool, FileIdentity]] = OrderedDict()
+        self._keys = count()
+
+    def hold(
+        self, is_removed: bool, identity: FileIdentity, comparaison: Comparaison
+    ) -> Comparaison | None:
+        """Hold a file, and return the file released to make room for it, if any."""
+        key = next(self._keys)
+        self._index(is_removed)[identity][key] = comparaison
+        self._order[key] = (is_removed, identity)
+        if len(self._order) <= self.max_held:
+            return None
+        return self.take(next(iter(self._order)))
+
+    def take(self, key: int) -> Comparaison:
+        is_removed, identity = self._order.pop(key)
+        held = self._index(is_removed)[identity]
+        comparaison = held.pop(key)
+        if not held:
+            del self._index(is_removed)[identity]
+        return comparaison
+
+    def release_created(self) -> list[Comparaison]:
+        keys = [key for key, (is_removed, _) in self._order.items() if not is_removed]
+        return [self.take(key) for key in keys]
+
+    def release(self) -> list[Comparaison]:
+        return [self.take(key) for key in list(self._order)]
+
+    def _index(self, is_removed: bool) -> dict[FileIdentity, dict[int, Comparaison]]:
+        return self.removed if is_removed else self.created
+
+
+class RenameReconciliationSvc:
+    def __init__(
+        self, comparaison_svc: ComparaisonSvc, chunk_size: int, max_held: int = 10_000
+    ) -> None:
+        self.comparaison_svc = comparaison_svc
+        self.chunk_size = chunk_size
+        self.max_held = max_held
+        """maximum number of removed and created files held at once on each side"""
+        self.storages: dict[Side, Storage] = {
+            "left": comparaison_svc.storage_left,
+            "right": comparaison_svc.storage_right,
+        }
+
+    def reconcile(
+        self, comparaisons: Iterable[Comparaison]
+    ) -> Iterator[Comparaison | Transfer]:
+        """
+        Replace pairs of removed and created files by moves on the other side.
+
+        Removed files are held until a created file with the same identity comes.
+        Created files are only held while there are removed files waiting on the
+        same side, so that a stream of creations, e.g. the first run, flows
+        through. Held files are released when they do not fit in `max_held`, or
+        once all the comparaisons are consumed. Any other comparaison is yielded
+        as it comes.
+
+        Yields
+        ------
+        Comparaison | Transfer
+            comparaisons left as is, and the moves that replace renamed files.
+        """
+        config = self.comparaison_svc.config
+        if not isinstance(config, DateTimeSizeCacheComparaison):
+            yield from comparaisons
+            return
+
+        held: dict[Side, HeldChanges] = {
+            side: HeldChanges(self.max_held)
+            for side in ("left", "right")
+            if self.propagates_renames(side)
+        }
+        for comparaison in comparaisons:
+            state = comparaison[2]
+            state_side = side_of_state(state)
+            if state is None or state_side is None or state_side not in held:
+                yield comparaison
+            elif state.startswith("removed_"):
+                yield from self.reconcile_removed(state_side, comparaison, held)
+            elif state.startswith("created_"):
+                yield from self.reconcile_created(state_side, comparaison, held)
+            else:
+                yield comparaison
+
+        for side_held in held.values():
+            yield from side_held.release()
+
+    def reconcile_removed(
+        self, side: Side, comparaison: Comparaison, held: dict[Side, HeldChanges]
+    ) -> Iterator[Comparaison | Transfer]:
+        identity = self.removed_file_identity(side, comparaison)
+        if identity is None:
+            yield comparaison
+            return
+
+        side_held = held[side]
+        for key, created in side_held.created.get(identity, {}).items():
+            if self.same_content(side, comparaison, get_snapshot(side, created)):
+                side_held.take(key)
+                yield self.move(side, comparaison, created)
+                return
+
+        released = side_held.hold(True, identity, comparaison)
+        if released is not None:
+            yield released
+        if not side_held.removed:
+            yield from side_held.release_created()
+
+    def reconcile_created(
+        self, side: Side, comparaison: Comparaison, held: dict[Side, HeldChanges]
+    ) -> Iterator[Comparaison | Transfer]:
+        side_held = held[side]
+        identity = created_file_identity(get_snapshot(side, comparaison))
+        if identity is None or not side_held.removed:
+            yield comparaison
+            return
+
+        snapshot = get_snapshot(side, comparaison)
+        for key, removed in side_held.removed.get(identity, {}).items():
+            if self.same_content(side, removed, snapshot):
+                side_held.take(key)
+                yield self.move(side, removed, comparaison)
+                break
+        else:
+            released = side_held.hold(False, identity, comparaison)
+            if released is not None:
+                yield released
+
+        if not side_held.removed:
+            yield from side_held.release_created()
+
+    def move(self, side: Side, removed: Comparaison, created: Comparaison) -> Transfer:
+        """Move to its new path the copy of a renamed file on the other side."""
+        old_path = removed[0].relative_path
+        new_path = created[0].relative_path
+        logger.info(f"{old_path} was renamed {new_path} in {side} storage")
+        return Transfer(
+            old_path,
+            "move",
+            "move",
+            other_side(side),
+            destination_path=new_path,
+        )
+
+    def propagates_renames(self, side: Side) -> bool:
+        """Whether removals and creations on a side are both mirrored on the other."""
+        config = self.comparaison_svc.config
+        assert isinstance(config, DateTimeSizeCacheComparaison)
+        other = other_side(side)
+        return (
+            getattr(config.actions, f"removed_{side}") == f"remove_in_{other}"
+            and getattr(config.actions, f"created_{side}") == f"copy_to_{other}"
+        )
+
+    def removed_file_identity(
+        self, side: Side, comparaison: Comparaison
+    ) -> FileIdentity | None:
+        record = self.comparaison_svc.get_cached_file(
+            self.storages[side].id, comparaison[0].relative_path
+        )
+        if record is None or record.size is None:
+            return None
+        return (record.size, record.modified_datetime.replace(tzinfo=None))
+
+    def same_content(
+        self, side: Side, removed: Comparaison, snapshot: FileSnapshot
+    ) -> bool:
+        """Compare the created file with the digest of the removed one, if known."""
+        storage = self.storages[side]
+        record = self.comparaison_svc.get_cached_file(
+            storage.id, removed[0].relative_path
+        )
+        if record is None or not record.content_hash:
+            return True
+
+        algorithm, _, digest = record.content_hash.partition(":")
+        path = storage.joinpath(snapshot.relative_path)
+        try:
+            return digest == hash_file(storage.fs, path, algorithm, self.chunk_size)
+        except ValueError:
+            logger.warning(f"Unknown digest {record.content_hash!r}, it is ignored.")
+            return True
+
+
+def get_snapshot(side: Side, comparaison: Comparaison) -> FileSnapshot:
+    return comparaison[0] if side == "left" else comparaison[1]
+
+
+def created_file_identity(snapshot: FileSnapshot) -> FileIdentity | None:
+    if snapshot.info is None or snapshot.info["size"] is None:
+        return None
+    try:
+        modified_time = get_modifed_time(snapshot.info)
+    except KeyError:
+        return None
+    return (snapshot.info["size"], modified_time.replace(tzinfo=None))
+
+
+def side_of_state(state: ComparaisonState | None) -> Side | None:
+    if state is None:
+        return None
+    return "left" if state.endswith("_left") else "right"
+
+
+def other_side(side: Side) -> Side:
+    return "right" if side == "left" else "left"
@@ -0,0 +1,10 @@
+from datetime import datetime
+from typing import NamedTuple
+
+
+class CachedStorageFile(NamedTuple):
+    """Compact copy of the cached state of a file, used for the comparaison."""
+
+    modified_datetime: datetime
+    size: int | None
+    content_hash: str | None
@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+
+@dataclass(frozen=True, slots=True)
+class FileSnapshot:
+    """State of a file in a storage, as seen when it was listed."""
+
+    relative_path: str
+    """path of the file relative to the storage base path"""
+    info: FileInfo | None
+    """details of the file given by the listing, None if the file does not exist"""
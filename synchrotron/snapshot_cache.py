@@ -0,0 +1,321 @@
+"""
+Cache of the last known state of the files of a storage, in a single file.
+
+Each storage gets a file made of a header, fixed-width records sorted by path, and
+a table of the strings (paths and digests) the records point to:
+
+    header   | magic (8 bytes) | number of records (uint64)
+    records  | path offset (uint64) | path length (uint32) | size (int64)
+             | modified time in µs since epoch (int64)
+             | digest offset (uint64) | digest length (uint32)
+    strings  | UTF-8 encoded paths and digests
+
+Offsets are relative to the start of the strings.
+
+The file is memory-mapped and looked up by binary search over the records, only
+decoding the record found. A run writes the new state next to the previous one
+and swaps them atomically with `os.replace`.
+
+Checkpoints of a run do not rewrite the snapshot: they append the changes since
+the previous checkpoint to a log next to it, one JSON line per change. The log
+is merged into the snapshot, then removed, when the run flushes its changes.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Self
+
+from synchrotron.configuration.comparaison.cache_engines import SnapshotCacheEngine
+from synchrotron.configuration.storage import Storage as StorageConfig
+from synchrotron.schema.molecules.cached_storage_file import CachedStorageFile
+from synchrotron.utils.merge_join import merge_join
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SYNSNAP1"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QIqqQI")
+MISSING = -(2**63)
+"""stored in place of a missing size"""
+EPOCH = datetime(1970, 1, 1)
+
+type SnapshotRecord = tuple[str, CachedStorageFile]
+
+
+def snapshot_path(cache_engine: SnapshotCacheEngine, storage_id: int) -> Path:
+    return cache_engine.directory / f"storage_{storage_id}.snapshot"
+
+
+def log_path(cache_engine: SnapshotCacheEngine, storage_id: int) -> Path:
+    """Changes checkpointed since the snapshot of a storage was written."""
+    return cache_engine.directory / f"storage_{storage_id}.snapshot.log"
+
+
+class SnapshotReader:
+    """Read-only view over the snapshot of a storage."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._mmap: mmap.mmap | None = None
+        self.n_records = 0
+        self._strings_start = HEADER.size
+
+        try:
+            with open(path, "rb") as file:
+                if os.fstat(file.fileno()).st_size > 0:
+                    self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        if self._mmap is None:
+            return
+
+        magic, self.n_records = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a snapshot cache file.")
+        self._strings_start = HEADER.size + self.n_records * RECORD.size
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_records
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def get(self, relative_path: str) -> CachedStorageFile | None:
+        """Cached state of a file, or None if it is not in the snapshot."""
+        target = relative_path.encode()
+        low, high = 0, self.n_records
+        while low < high:
+            middle = (low + high) // 2
+            path = self._path_at(middle)
+            if path < target:
+                low = middle + 1
+            elif path > target:
+                high = middle
+            else:
+                return self._record_at(middle)[1]
+        return None
+
+    def __iter__(self) -> Iterator[SnapshotRecord]:
+        """All the records, in path order."""
+        for i in range(self.n_records):
+            yield self._record_at(i)
+
+    def _path_at(self, i: int) -> bytes:
+        assert self._mmap is not None
+        offset, length = struct.unpack_from(
+            "<QI", self._mmap, HEADER.size + i * RECORD.size
+        )
+        start = self._strings_start + offset
+        return self._mmap[start : start + length]
+
+    def _record_at(self, i: int) -> SnapshotRecord:
+        assert self._mmap is not None
+        path_offset, path_length, size, modified, hash_offset, hash_length = (
+            RECORD.unpack_from(self._mmap, HEADER.size + i * RECORD.size)
+        )
+        path_start = self._strings_start + path_offset
+        path = self._mmap[path_start : path_start + path_length].decode()
+        content_hash = None
+        if hash_length:
+            hash_start = self._strings_start + hash_offset
+            content_hash = self._mmap[hash_start : hash_start + hash_length].decode()
+
+        return path, CachedStorageFile(
+            EPOCH + timedelta(microseconds=modified),
+            None if size == MISSING else size,
+            content_hash,
+        )
+
+
+def write_snapshot(path: Path, records: Iterable[SnapshotRecord]) -> int:
+    """Atomically replace the snapshot at `path` with the records, sorted by path.
+
+    Returns
+    -------
+    int
+        number of records written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with (
+            os.fdopen(descriptor, "w+b") as file,
+            tempfile.TemporaryFile(dir=path.parent) as strings,
+        ):
+            file.write(HEADER.pack(MAGIC, 0))
+            # strings are spooled to a temporary file and appended after the
+            # records, so offsets are relative to the start of the strings
+            n_records = 0
+            strings_size = 0
+            for relative_path, cached in records:
+                encoded_path = relative_path.encode()
+                encoded_hash = (cached.content_hash or "").encode()
+                modified = cached.modified_datetime.replace(tzinfo=None) - EPOCH
+                file.write(
+                    RECORD.pack(
+                        strings_size,
+                        len(encoded_path),
+                        MISSING if cached.size is None else cached.size,
+                        modified // timedelta(microseconds=1),
+                        strings_size + len(encoded_path),
+                        len(encoded_hash),
+                    )
+                )
+                strings.write(encoded_path)
+                strings.write(encoded_hash)
+                strings_size += len(encoded_path) + len(encoded_hash)
+                n_records += 1
+
+            strings.seek(0)
+            while chunk := strings.read(1024 * 1024):
+                file.write(chunk)
+
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, n_records))
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+    return n_records
+
+
+class SnapshotCacheWriter:
+    """
+    Collect the changes of the cached states during a run, and write the new
+    snapshots on flush. Same interface as `StorageFileWriter`.
+
+    The changes are merged with the previous snapshot in a single pass in path
+    order, so that a snapshot is rewritten once per run. Checkpoints only append
+    the changes to the log of the snapshot.
+    """
+
+    def __init__(self, cache_engine: SnapshotCacheEngine) -> None:
+        self.cache_engine = cache_engine
+        self._changes: dict[int, dict[str, CachedStorageFile | None]] = {}
+        self._logged: set[int] = set()
+        """storages whose changes were checkpointed to their log"""
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.flush()
+
+    def upsert(
+        self,
+        storage: StorageConfig,
+        relative_path: str,
+        modified_datetime: datetime,
+        size: int | None,
+        content_hash: str | None = None,
+    ) -> None:
+        self._changes.setdefault(storage.id, {})[relative_path] = CachedStorageFile(
+            modified_datetime.replace(tzinfo=None), size, content_hash
+        )
+
+    def delete(self, storage: StorageConfig, relative_path: str) -> None:
+        self._changes.setdefault(storage.id, {})[relative_path] = None
+
+    def checkpoint(self) -> None:
+        """Make the changes durable by appending them to the logs of the snapshots."""
+        for storage_id, changes in self._changes.items():
+            append_log(log_path(self.cache_engine, storage_id), changes)
+            self._logged.add(storage_id)
+        self._changes.clear()
+
+    def flush(self) -> None:
+        """Write the new snapshots, with the changes of their logs."""
+        for storage_id in self._changes.keys() | self._logged:
+            path = snapshot_path(self.cache_engine, storage_id)
+            changes_log = log_path(self.cache_engine, storage_id)
+            changes = read_log(changes_log) | self._changes.get(storage_id, {})
+            sorted_changes = sorted(changes.items())
+            with SnapshotReader(path) as previous:
+                n_records = write_snapshot(
+                    path, apply_changes(previous, sorted_changes)
+                )
+            changes_log.unlink(missing_ok=True)
+            logger.debug(f"Wrote {n_records} records in {path}.")
+        self._changes.clear()
+        self._logged.clear()
+
+
+def append_log(path: Path, changes: dict[str, CachedStorageFile | None]) -> None:
+    """Append changes to a log, one JSON line each.
+
+    A removal is written as `[path]`, other changes as
+    `[path, size, modified time in µs since epoch, digest]`.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        for relative_path, cached in changes.items():
+            entry: list[object] = [relative_path]
+            if cached is not None:
+                modified = cached.modified_datetime.replace(tzinfo=None) - EPOCH
+                entry += [
+                    cached.size,
+                    modified // timedelta(microseconds=1),
+                    cached.content_hash,
+                ]
+            file.write(json.dumps(entry) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def read_log(path: Path) -> dict[str, CachedStorageFile | None]:
+    """Changes of a log, the last change of each path winning."""
+    changes: dict[str, CachedStorageFile | None] = {}
+    if not path.exists():
+        return changes
+
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line is torn if the process stopped while appending it
+                logger.warning(f"Ignoring a truncated change in {path}.")
+                continue
+            if len(entry) == 1:
+                changes[entry[0]] = None
+                continue
+            relative_path, size, modified, content_hash = entry
+            changes[relative_path] = CachedStorageFile(
+                EPOCH + timedelta(microseconds=modified), size, content_hash
+            )
+    return changes
+
+
+def apply_changes(
+    previous: Iterable[SnapshotRecord],
+    changes: Iterable[tuple[str, CachedStorageFile | None]],
+) -> Iterator[SnapshotRecord]:
+    """Merge records and changes sorted by path. A None change removes the record."""
+    for record, change in merge_join(previous, changes, key=lambda item: item[0]):
+        if change is None:
+            assert record is not None
+            relative_path, cached = record
+        else:
+            relative_path, cached = change
+
+        if cached is not None:
+            yield relative_path, cached
@@ -0,0 +1,266 @@
+"""
+One synchronisation run: filter the files, compare them, and execute the actions.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from synchrotron.comparaison import ComparaisonSvc
+from synchrotron.configuration import OneConfig
+from synchrotron.configuration.comparaison import (
+    AllComparaison,
+    DateTimeSizeCacheComparaison,
+)
+from synchrotron.configuration.comparaison.cache_engines import SnapshotCacheEngine
+from synchrotron.database.writer import StorageFileWriter
+from synchrotron.filter import FilterSvc
+from synchrotron.journal import RunJournal, config_fingerprint
+from synchrotron.pipeline import Pipeline, Stage
+from synchrotron.reconciliation import Comparaison, RenameReconciliationSvc
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.snapshot_cache import SnapshotCacheWriter
+from synchrotron.transfer import (
+    CacheWriter,
+    Transfer,
+    TransferBudget,
+    TransferSvc,
+    get_transfer,
+)
+
+
+@dataclass
+class SynchronisationReport:
+    n_transfers: int = 0
+    n_errors: int = 0
+    bytes_transferred: int = 0
+
+
+def get_writer(config: OneConfig) -> CacheWriter | None:
+    """Writer of the cache of the comparaison, if it uses one."""
+    if not isinstance(config.comparaison, DateTimeSizeCacheComparaison):
+        return None
+
+    cache_engine = config.comparaison.cache_engine
+    if isinstance(cache_engine, SnapshotCacheEngine):
+        return SnapshotCacheWriter(cache_engine)
+    return StorageFileWriter(cache_engine)
+
+
+def get_transfer_svc(
+    config: OneConfig,
+    writer: CacheWriter | None,
+    budget: TransferBudget | None = None,
+) -> TransferSvc:
+    return TransferSvc(
+        config.comparaison,
+        config.left,
+        config.right,
+        int(config.synchronisation.transfer_chunk_size),
+        config.synchronisation.delta_transfer,
+        writer,
+        budget,
+    )
+
+
+def get_journal(config: OneConfig) -> RunJournal | None:
+    """Journal of the run, restored from the checkpoint of an unfinished run."""
+    journal_config = config.synchronisation.journal
+    if journal_config is None:
+        return None
+    return RunJournal.load(
+        journal_config.path,
+        config_fingerprint(config),
+        journal_config.checkpoint_every,
+    )
+
+
+def skip_completed(
+    comparaisons: Iterable[Comparaison | Transfer],
+    journal: RunJournal,
+    config: AllComparaison,
+    checkpoint: Callable[[], None],
+) -> Iterator[Comparaison | Transfer]:
+    """
+    Drop the actions already done by a previous attempt of the run, and mark the
+    files needing no action as finished once they went through.
+    """
+    for comparaison in comparaisons:
+        checkpoint()
+
+        transfer: Transfer | None
+        if isinstance(comparaison, Transfer):
+            transfer = comparaison
+            relative_paths = [transfer.relative_path]
+            if transfer.destination_path is not None:
+                relative_paths.append(transfer.destination_path)
+        else:
+            left_snapshot, _, state = comparaison
+            relative_paths = [left_snapshot.relative_path]
+            transfer = None
+            if state is not None:
+                transfer = get_transfer(config, left_snapshot.relative_path, state)
+
+        if transfer is None:
+            yield comparaison
+            for relative_path in relative_paths:
+                journal.finish(relative_path)
+        elif all(path in journal.completed for path in relative_paths):
+            for relative_path in relative_paths:
+                journal.finish(relative_path)
+        else:
+            yield comparaison
+
+
+def get_pipeline(
+    config: OneConfig,
+    comparison_svc: ComparaisonSvc,
+    filter_svc: FilterSvc,
+    right_filter_svc: FilterSvc | None,
+) -> Pipeline:
+    """
+    Pipeline listing the files and comparing them. With a right listing, both
+    storages are listed at the same time, each through a bounded queue, then
+    joined. Listings that are not yielded in path order are sorted in memory by
+    the join.
+    """
+    pipeline_config = config.synchronisation.pipeline
+    assert pipeline_config is not None
+
+    pairs: Iterable[tuple[FileSnapshot, FileSnapshot | Path]]
+    if right_filter_svc is None:
+        pairs = (
+            (snapshot, Path(snapshot.relative_path))
+            for snapshot in filter_svc.snapshots()
+        )
+    else:
+        # a pipeline without stages lists the right storage in a thread of its own
+        right_listing = Pipeline(
+            right_filter_svc.snapshots(),
+            [],
+            output_queue_size=pipeline_config.comparaison_queue_size,
+            source_name="right listing",
+        )
+        pairs = comparison_svc.join_listings(
+            filter_svc.snapshots(),
+            right_listing,
+            presorted=is_presorted(filter_svc, right_filter_svc),
+        )
+
+    return Pipeline(
+        pairs,
+        [
+            Stage(
+                "comparaison",
+                comparison_svc.compare_pair,
+                pipeline_config.comparaison_workers,
+                pipeline_config.comparaison_queue_size,
+            )
+        ],
+        output_queue_size=pipeline_config.transfer_queue_size,
+        report_every=pipeline_config.report_every,
+    )
+
+
+def is_presorted(filter_svc: FilterSvc, right_filter_svc: FilterSvc) -> bool:
+    """Whether both listings come in path order, to be joined as they come."""
+    return filter_svc.yields_sorted_paths() and right_filter_svc.yields_sorted_paths()
+
+
+def observe_joined(
+    comparaisons: Iterable[Comparaison], comparison_svc: ComparaisonSvc
+) -> Iterator[Comparaison]:
+    """Keep track of the comparaisons of joined listings, as `compare_listings` does."""
+    for left_snapshot, right_snapshot, state in comparaisons:
+        comparison_svc.observe(left_snapshot, right_snapshot, state)
+        yield left_snapshot, right_snapshot, state
+    comparison_svc.save_observations()
+
+
+def synchronise(
+    config: OneConfig, budget: TransferBudget | None = None
+) -> SynchronisationReport:
+    """Synchronise all the files meeting the filters.
+
+    Parameters
+    ----------
+    config : OneConfig
+        configuration of the synchronisation.
+    budget : TransferBudget | None, optional
+        limits shared with other synchronisations running at the same time.
+    """
+    journal = get_journal(config)
+    filter_svc = FilterSvc(config.filters, config.left, journal=journal)
+    comparison_svc = ComparaisonSvc(
+        config.comparaison, config.left, config.right, journal=journal
+    )
+    writer = get_writer(config)
+    transfer_svc = get_transfer_svc(config, writer, budget)
+
+    def checkpoint() -> None:
+        if journal is not None:
+            journal.checkpoint_if_due(writer.checkpoint if writer is not None else None)
+
+    right_filter_svc = None
+    if config.comparaison.type == "datetime_size" and (
+        config.comparaison.engine == "merge_join"
+    ):
+        right_filter_svc = FilterSvc(config.filters, config.right, journal=journal)
+
+    pipeline = None
+    comparaisons: Iterable[Comparaison]
+    if config.synchronisation.pipeline is not None:
+        pipeline = get_pipeline(config, comparison_svc, filter_svc, right_filter_svc)
+        comparaisons = pipeline
+        if right_filter_svc is not None:
+            comparaisons = observe_joined(comparaisons, comparison_svc)
+    elif right_filter_svc is not None:
+        comparaisons = comparison_svc.compare_listings(
+            filter_svc.snapshots(),
+            right_filter_svc.snapshots(),
+            presorted=is_presorted(filter_svc, right_filter_svc),
+        )
+    else:
+        comparaisons = comparison_svc.compare_many(filter_svc.snapshots())
+
+    reconciliation_svc = RenameReconciliationSvc(
+        comparison_svc, int(config.synchronisation.transfer_chunk_size)
+    )
+    incremental_scan_svc = comparison_svc.incremental_scan_svc
+    transfers = reconciliation_svc.reconcile(comparaisons)
+    if journal is not None:
+        transfers = skip_completed(transfers, journal, config.comparaison, checkpoint)
+
+    transfer_stats = None
+    if pipeline is not None:
+        transfer_stats = pipeline.add_stats("transfer", transfer_svc.max_workers)
+
+    run_report = SynchronisationReport()
+    for report in transfer_svc.run(transfers):
+        run_report.n_transfers += 1
+        run_report.bytes_transferred += report.bytes_transferred
+        if transfer_stats is not None:
+            transfer_stats.add(report.duration)
+        if report.error is not None:
+            run_report.n_errors += 1
+        else:
+            relative_paths = [report.transfer.relative_path]
+            if report.transfer.destination_path is not None:
+                relative_paths.append(report.transfer.destination_path)
+            for relative_path in relative_paths:
+                if incremental_scan_svc is not None:
+                    incremental_scan_svc.resolve(relative_path)
+                if journal is not None:
+                    journal.complete(relative_path)
+        checkpoint()
+
+    if pipeline is not None:
+        pipeline.report()
+    if writer is not None:
+        writer.flush()
+    comparison_svc.flush()
+    if incremental_scan_svc is not None:
+        incremental_scan_svc.save()
+    if journal is not None:
+        journal.remove()
+    return run_report
@@ -0,0 +1,626 @@
+"""
+Execute the actions configured for the comparaison states.
+
+Each state is turned into a copy or a removal between the two storages, run on a
+bounded pool of threads. Files are streamed from one filesystem to the other by
+chunks, so they are never entirely held in memory.
+
+Data does not go through the process at all when it can be avoided: copies
+within the same filesystem are delegated to its server-side `copy`, and copies
+between local files are made by the kernel (`copy_file_range`, or `sendfile`).
+Updates of large local files can also only write the blocks that changed, see
+`synchrotron.delta`.
+
+Several synchronisations running at the same time can share a budget of
+concurrent transfers and of bandwidth, see `synchrotron.fleet`.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import BoundedSemaphore
+from typing import Literal
+
+from fsspec import AbstractFileSystem
+from fsspec.implementations.local import LocalFileSystem
+
+from synchrotron.comparaison import ComparaisonState
+from synchrotron.configuration.comparaison import AllComparaison
+from synchrotron.configuration.storage import Storage
+from synchrotron.configuration.synchronisation.delta_transfer import DeltaTransfer
+from synchrotron.database.block_signature import BlockSignatureCache
+from synchrotron.database.writer import StorageFileWriter
+from synchrotron.delta import delta_copy
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+from synchrotron.snapshot_cache import SnapshotCacheWriter
+from synchrotron.utils.file_info import get_modifed_time
+from synchrotron.utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+type Side = Literal["left", "right"]
+type CacheWriter = StorageFileWriter | SnapshotCacheWriter
+type Throttle = Callable[[int], None]
+"""called with a number of bytes before they are transferred, waits for the budget"""
+
+PARTIAL_SUFFIX = ".synchrotron-partial"
+"""suffix of the hidden files local targets are written to before being renamed"""
+
+MAP_ACTION_TO_OPERATION: dict[str, tuple[Literal["copy", "remove"], Side]] = {
+    "copy_to_right": ("copy", "right"),
+    "update_in_right": ("copy", "right"),
+    "copy_left_to_right": ("copy", "right"),
+    "copy_to_left": ("copy", "left"),
+    "update_in_left": ("copy", "left"),
+    "copy_right_to_left": ("copy", "left"),
+    "remove_in_right": ("remove", "right"),
+    "remove_in_left": ("remove", "left"),
+}
+"""Operation and the side of the file it is applied to, for each action."""
+
+
+@dataclass(frozen=True, slots=True)
+class Transfer:
+    """Operation to apply on a file of the target storage."""
+
+    relative_path: str
+    action: str
+    operation: Literal["copy", "remove", "move"]
+    target: Side
+    destination_path: str | None = None
+    """new path of the file in the target storage, for moves"""
+
+    @property
+    def source(self) -> Side:
+        return "left" if self.target == "right" else "right"
+
+
+@dataclass(slots=True)
+class TransferReport:
+    transfer: Transfer
+    bytes_transferred: int = 0
+    duration: float = 0.0
+    """duration of the operation, in seconds"""
+    error: Exception | None = field(default=None, repr=False)
+
+    @property
+    def bytes_per_second(self) -> float:
+        if self.duration <= 0:
+            return 0.0
+        return self.bytes_transferred / self.duration
+
+
+@dataclass(frozen=True)
+class TransferBudget:
+    """Limits shared by the transfers of several synchronisations."""
+
+    transfers: BoundedSemaphore
+    """acquired by each transfer, on top of the limits of its storages"""
+    bandwidth: TokenBucket | None = None
+    """bytes per second copied through the process, by all the transfers"""
+
+
+def get_transfer(
+    config: AllComparaison, relative_path: str, state: ComparaisonState
+) -> Transfer | None:
+    """Turn the state of a file into the transfer configured for it, if any."""
+    action: str = getattr(config.actions, state)
+    if action == "nothing":
+        return None
+
+    if action == "remove":
+        # the file only exists (or was only created) on the side given by the state
+        target: Side = "left" if state.endswith("_left") else "right"
+        return Transfer(relative_path, action, "remove", target)
+
+    operation, target = MAP_ACTION_TO_OPERATION[action]
+    return Transfer(relative_path, action, operation, target)
+
+
+class TransferSvc:
+    def __init__(
+        self,
+        config: AllComparaison,
+        storage_left: Storage,
+        storage_right: Storage,
+        chunk_size: int,
+        delta_transfer: DeltaTransfer | None = None,
+        writer: CacheWriter | None = None,
+        budget: TransferBudget | None = None,
+    ) -> None:
+        self.config = config
+        self.storages: dict[Side, Storage] = {
+            "left": storage_left,
+            "right": storage_right,
+        }
+        self.chunk_size = chunk_size
+        self.writer = writer
+        """records the state of the files once synchronised, if given"""
+        self.delta_transfer = delta_transfer
+        self.budget = budget
+        self.throttle: Throttle | None = None
+        if budget is not None and budget.bandwidth is not None:
+            self.throttle = budget.bandwidth.consume
+        self.signature_cache: BlockSignatureCache | None = None
+        if delta_transfer is not None and delta_transfer.signature_cache is not None:
+            self.signature_cache = BlockSignatureCache(delta_transfer.signature_cache)
+
+        self.semaphores: dict[Side, BoundedSemaphore] = {
+            side: BoundedSemaphore(storage.max_concurrent_transfers)
+            for side, storage in self.storages.items()
+        }
+        self.max_workers = (
+            storage_left.max_concurrent_transfers
+            + storage_right.max_concurrent_transfers
+        )
+
+    def run(
+        self,
+        comparaisons: Iterable[
+            tuple[FileSnapshot, FileSnapshot, ComparaisonState | None] | Transfer
+        ],
+    ) -> Iterator[TransferReport]:
+        """
+        Execute the transfers of the compared files, as they are compared.
+        Transfers already resolved (e.g. moves of renamed files) are executed
+        as is.
+
+        At most twice as many transfers as there are workers are pending at the
+        same time, so that comparaisons are not consumed far ahead of transfers.
+
+        With a writer, the state of the files that are in sync, either already
+        or once transferred, is recorded.
+
+        Yields
+        ------
+        TransferReport
+            report of each transfer, in the order they complete.
+        """
+        max_pending = 2 * self.max_workers
+        pending: set[Future[TransferReport]] = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for comparaison in comparaisons:
+                if isinstance(comparaison, Transfer):
+                    transfer: Transfer | None = comparaison
+                else:
+                    left_snapshot, right_snapshot, state = comparaison
+                    if state is None:
+                        self.record_snapshots(left_snapshot, right_snapshot)
+                        continue
+                    transfer = get_transfer(
+                        self.config, left_snapshot.relative_path, state
+                    )
+                if transfer is None:
+                    continue
+
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self.record(future.result())
+                pending.add(executor.submit(self.execute, transfer))
+
+            for future in pending:
+                yield self.record(future.result())
+
+        if self.signature_cache is not None:
+            self.signature_cache.flush()
+
+    def execute(self, transfer: Transfer) -> TransferReport:
+        """Execute a transfer, within the concurrency limits of the storages."""
+        report = TransferReport(transfer)
+        # semaphores are always acquired in the same order to avoid deadlocks
+        sides: list[Side] = ["left", "right"]
+        if transfer.operation != "copy":
+            sides = [transfer.target]
+
+        for side in sides:
+            self.semaphores[side].acquire()
+        if self.budget is not None:
+            self.budget.transfers.acquire()
+        start = time.perf_counter()
+        try:
+            if transfer.operation == "copy":
+                report.bytes_transferred = self.copy(transfer)
+            elif transfer.operation == "move":
+                self.move(transfer)
+            else:
+                self.remove(transfer)
+        except OSError as error:
+            report.error = error
+            logger.error(
+                f"Could not {transfer.action} {transfer.relative_path}: {error}"
+            )
+        except Exception as error:
+            # a failed transfer does not stop the others, its traceback is kept
+            report.error = error
+            logger.exception(f"Could not {transfer.action} {transfer.relative_path}.")
+        finally:
+            report.duration = time.perf_counter() - start
+            if self.budget is not None:
+                self.budget.transfers.release()
+            for side in sides:
+                self.semaphores[side].release()
+
+        if report.error is None:
+            logger.info(
+                f"{transfer.action} {transfer.relative_path}: "
+                f"{report.bytes_transferred} bytes at "
+                f"{report.bytes_per_second:.0f} bytes/s"
+            )
+        return report
+
+    def record_snapshots(
+        self, left_snapshot: FileSnapshot, right_snapshot: FileSnapshot
+    ) -> None:
+        """Record the state of a file found in sync on both sides."""
+        if self.writer is None:
+            return
+
+        snapshots: dict[Side, FileSnapshot] = {
+            "left": left_snapshot,
+            "right": right_snapshot,
+        }
+        for side, snapshot in snapshots.items():
+            if snapshot.info is not None:
+                self.record_info(side, snapshot.relative_path, snapshot.info)
+
+    def record(self, report: TransferReport) -> TransferReport:
+        """Record the state of the file of a successful transfer, on both sides."""
+        transfer = report.transfer
+        if self.writer is None or report.error is not None:
+            return report
+
+        sides: list[Side] = ["left", "right"]
+        if transfer.operation == "move":
+            assert transfer.destination_path is not None
+            for side in sides:
+                self.writer.delete(self.storages[side], transfer.relative_path)
+            relative_path = transfer.destination_path
+        else:
+            relative_path = transfer.relative_path
+
+        for side in sides:
+            storage = self.storages[side]
+            if transfer.operation == "remove":
+                self.writer.delete(storage, relative_path)
+                continue
+            try:
+                info = storage.fs.info(storage.joinpath(relative_path))
+            except FileNotFoundError:
+                self.writer.delete(storage, relative_path)
+                continue
+            self.record_info(side, relative_path, info)
+        return report
+
+    def record_info(self, side: Side, relative_path: str, info: FileInfo) -> None:
+        assert self.writer is not None
+        try:
+            modified_time = get_modifed_time(info)
+        except KeyError:
+            return
+        self.writer.upsert(
+            self.storages[side], relative_path, modified_time, info["size"]
+        )
+
+    def copy(self, transfer: Transfer) -> int:
+        source = self.storages[transfer.source]
+        target = self.storages[transfer.target]
+
+        target_info = self.get_delta_target_info(transfer)
+        if target_info is not None:
+            return self.delta_copy(transfer, target_info)
+
+        return copy_file(
+            source.fs,
+            source.joinpath(transfer.relative_path),
+            target.fs,
+            target.joinpath(transfer.relative_path),
+            self.chunk_size,
+            self.throttle,
+        )
+
+    def get_delta_target_info(self, transfer: Transfer) -> FileInfo | None:
+        """Details of the target file, if it can be updated by a delta transfer."""
+        if self.delta_transfer is None or not transfer.action.startswith("update_in_"):
+            return None
+
+        target = self.storages[transfer.target]
+        if not isinstance(target.fs, LocalFileSystem):
+            # other backends do not support random writes
+            return None
+
+        try:
+            target_info = target.fs.info(target.joinpath(transfer.relative_path))
+        except FileNotFoundError:
+            return None
+        size = target_info["size"]
+        if size is None or size < self.delta_transfer.min_file_size:
+            return None
+        return target_info
+
+    def delta_copy(self, transfer: Transfer, target_info: FileInfo) -> int:
+        """Write in the target only the blocks that differ from the source.
+
+        As for full copies, the target is updated in a partial copy of itself,
+        given the modification time of the source, then renamed into place.
+        """
+        assert self.delta_transfer is not None
+        source = self.storages[transfer.source]
+        source_path = source.joinpath(transfer.relative_path)
+        target = self.storages[transfer.target]
+        target_path = target.joinpath(transfer.relative_path)
+        local_target_path = target.fs._strip_protocol(target_path)
+        block_size = int(self.delta_transfer.block_size)
+
+        signature = None
+        if self.signature_cache is not None:
+            signature = self.signature_cache.get(
+                target.id,
+                transfer.relative_path,
+                target_info["size"] or 0,
+                get_modifed_time(target_info),
+                block_size,
+            )
+
+        partial_path = get_partial_path(local_target_path)
+        try:
+            # a local copy, that filesystems supporting it share the blocks of
+            kernel_copy(local_target_path, partial_path, self.chunk_size)
+            result = delta_copy(
+                source.fs, source_path, partial_path, block_size, signature
+            )
+            copy_modified_time(source.fs, source_path, partial_path)
+            os.replace(partial_path, local_target_path)
+        finally:
+            Path(partial_path).unlink(missing_ok=True)
+        if self.throttle is not None:
+            # the changed blocks are only known once written
+            self.throttle(result.bytes_written)
+
+        if self.signature_cache is not None:
+            updated_info = target.fs.info(target_path)
+            self.signature_cache.set(
+                target,
+                transfer.relative_path,
+                updated_info["size"] or 0,
+                get_modifed_time(updated_info),
+                block_size,
+                result.signature,
+            )
+        return result.bytes_written
+
+    def move(self, transfer: Transfer) -> None:
+        """Move a file within the target storage, without transferring it."""
+        assert transfer.destination_path is not None
+        target = self.storages[transfer.target]
+        destination = target.joinpath(transfer.destination_path)
+        target.fs.makedirs(target.fs._parent(destination), exist_ok=True)
+        target.fs.mv(target.joinpath(transfer.relative_path), destination)
+
+    def remove(self, transfer: Transfer) -> None:
+        target = self.storages[transfer.target]
+        target.fs.rm_file(target.joinpath(transfer.relative_path))
+
+
+def copy_file(
+    source_fs: AbstractFileSystem,
+    source_path: str,
+    target_fs: AbstractFileSystem,
+    target_path: str,
+    chunk_size: int,
+    throttle: Throttle | None = None,
+) -> int:
+    """Copy a file between filesystems with the fastest way available.
+
+    The bytes copied through the process are throttled, server-side copies are
+    not.
+
+    Local targets are written to a partial file, given the modification time of
+    the source, then renamed into place: an interrupted copy never leaves a
+    truncated target, and the copy does not look more recent than its source to
+    the next comparaison. Other backends set the modification time themselves,
+    and commit the file once it is entirely written.
+
+    Returns
+    -------
+    int
+        number of bytes copied.
+    """
+    if isinstance(target_fs, LocalFileSystem):
+        local_target_path = target_fs._strip_protocol(target_path)
+        target_fs.makedirs(target_fs._parent(local_target_path), exist_ok=True)
+        partial_path = get_partial_path(local_target_path)
+        try:
+            if isinstance(source_fs, LocalFileSystem):
+                n_bytes = kernel_copy(
+                    source_fs._strip_protocol(source_path),
+                    partial_path,
+                    chunk_size,
+                    throttle,
+                )
+            else:
+                n_bytes = stream_copy(
+                    source_fs,
+                    source_path,
+                    target_fs,
+                    partial_path,
+                    chunk_size,
+                    throttle,
+                )
+            copy_modified_time(source_fs, source_path, partial_path)
+            os.replace(partial_path, local_target_path)
+        finally:
+            # nothing is left behind by a failed copy
+            Path(partial_path).unlink(missing_ok=True)
+        return n_bytes
+
+    # fsspec caches instances, so the same protocol with the same options gives
+    # back the same filesystem, able to copy between its own paths
+    if source_fs is target_fs:
+        target_fs.makedirs(target_fs._parent(target_path), exist_ok=True)
+        source_fs.copy(source_path, target_path)
+        return int(target_fs.size(target_path) or 0)
+
+    return stream_copy(
+        source_fs, source_path, target_fs, target_path, chunk_size, throttle
+    )
+
+
+def get_partial_path(local_path: str) -> str:
+    """Hidden path next to a local file, where it is written before being renamed."""
+    directory, name = os.path.split(local_path)
+    return os.path.join(directory, f".{name}{PARTIAL_SUFFIX}")
+
+
+def is_partial_path(path: str) -> bool:
+    """Whether a path is the partial file of a transfer, see `get_partial_path`."""
+    name = os.path.basename(path)
+    return name.startswith(".") and name.endswith(PARTIAL_SUFFIX)
+
+
+def copy_modified_time(
+    source_fs: AbstractFileSystem, source_path: str, local_target_path: str
+) -> None:
+    """Give a local file the modification time of its source."""
+    if isinstance(source_fs, LocalFileSystem):
+        stat = os.stat(source_fs._strip_protocol(source_path))
+        os.utime(local_target_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return
+
+    modified = get_modifed_time(source_fs.info(source_path)).timestamp()
+    # backends give times to the microsecond at best
+    modified_ns = round(modified * 1_000_000) * 1_000
+    os.utime(local_target_path, ns=(time.time_ns(), modified_ns))
+
+
+UNSUPPORTED_KERNEL_COPY_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+}
+
+
+def kernel_copy(
+    source_path: str,
+    target_path: str,
+    chunk_size: int,
+    throttle: Throttle | None = None,
+) -> int:
+    """
+    Copy a local file without bringing its content to user space, with
+    `copy_file_range` or else `sendfile`. Falls back on a buffered copy when the
+    platform or the filesystems support neither.
+
+    With a throttle, the file is copied by chunks of `chunk_size` bytes.
+
+    Returns
+    -------
+    int
+        number of bytes copied.
+    """
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        size = os.fstat(source.fileno()).st_size
+
+        for copy_range in (
+            getattr(os, "copy_file_range", None),
+            sendfile if hasattr(os, "sendfile") else None,
+        ):
+            if copy_range is None:
+                continue
+            try:
+                return copy_all(
+                    copy_range,
+                    source.fileno(),
+                    target.fileno(),
+                    size,
+                    chunk_size if throttle is not None else None,
+                    throttle,
+                )
+            except OSError as error:
+                if error.errno not in UNSUPPORTED_KERNEL_COPY_ERRNOS:
+                    raise
+                # nothing was written when the call is not supported
+                source.seek(0)
+                target.seek(0)
+                target.truncate()
+
+        if throttle is None:
+            shutil.copyfileobj(source, target, chunk_size)
+            return size
+
+        n_bytes = 0
+        while chunk := source.read(chunk_size):
+            throttle(len(chunk))
+            target.write(chunk)
+            n_bytes += len(chunk)
+        return n_bytes
+
+
+def sendfile(source_fd: int, target_fd: int, count: int) -> int:
+    return os.sendfile(target_fd, source_fd, None, count)
+
+
+def copy_all(
+    copy_range,
+    source_fd: int,
+    target_fd: int,
+    size: int,
+    chunk_size: int | None = None,
+    throttle: Throttle | None = None,
+) -> int:
+    """Call `copy_range(source_fd, target_fd, count)` until the file is copied.
+
+    `count` is at most `chunk_size` bytes, if given.
+    """
+    n_bytes = 0
+    while n_bytes < size:
+        count = size - n_bytes
+        if chunk_size is not None:
+            count = min(count, chunk_size)
+        if throttle is not None:
+            throttle(count)
+        copied = copy_range(source_fd, target_fd, count)
+        if copied == 0:
+            # the file was truncated while being copied
+            break
+        n_bytes += copied
+    return n_bytes
+
+
+def stream_copy(
+    source_fs: AbstractFileSystem,
+    source_path: str,
+    target_fs: AbstractFileSystem,
+    target_path: str,
+    chunk_size: int,
+    throttle: Throttle | None = None,
+) -> int:
+    """Copy a file from one filesystem to another, chunk by chunk.
+
+    Returns
+    -------
+    int
+        number of bytes copied.
+    """
+    target_fs.makedirs(target_fs._parent(target_path), exist_ok=True)
+
+    n_bytes = 0
+    with (
+        source_fs.open(source_path, "rb") as source,
+        target_fs.open(target_path, "wb") as target,
+    ):
+        while chunk := source.read(chunk_size):
+            if throttle is not None:
+                throttle(len(chunk))
+            target.write(chunk)
+            n_bytes += len(chunk)
+    return n_bytes
@@ -0,0 +1,19 @@
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+def write_json_atomically(path: Path, data: Any) -> None:
+    """Write data to a temporary file, then replace the file with it.
+
+    Readers see either the previous content or the new one, never a partial write,
+    even if the process stops midway.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "w") as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
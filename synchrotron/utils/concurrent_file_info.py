@@ -0,0 +1,77 @@
+"""
+Fetch the details of many files concurrently.
+
+Asynchronous fsspec backends (e.g. s3fs, gcsfs, adlfs) expose coroutines such as
+`_info`, that are gathered on the event loop of the filesystem. Synchronous
+backends get their `info` calls spread over a bounded thread pool instead.
+"""
+
+import asyncio
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Self, cast
+
+from fsspec import AbstractFileSystem
+from fsspec.asyn import AsyncFileSystem, sync
+
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+
+class FileInfoFetcher:
+    def __init__(self, fs: AbstractFileSystem, max_concurrency: int) -> None:
+        self.fs = fs
+        self.max_concurrency = max_concurrency
+
+        self._executor: ThreadPoolExecutor | None = None
+        if not is_async_filesystem(fs):
+            self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def fetch(self, paths: Sequence[str]) -> list[FileInfo | None]:
+        """Fetch the details of the files, in the same order as the paths.
+
+        Returns
+        -------
+        list[FileInfo | None]
+            details of each file, or None if the file does not exist.
+        """
+        if self._executor is None:
+            fs = cast(AsyncFileSystem, self.fs)
+            return sync(fs.loop, gather_file_infos, fs, paths, self.max_concurrency)
+
+        return list(self._executor.map(self._info, paths))
+
+    def _info(self, path: str) -> FileInfo | None:
+        try:
+            return cast(FileInfo, self.fs.info(path))
+        except FileNotFoundError:
+            return None
+
+
+def is_async_filesystem(fs: AbstractFileSystem) -> bool:
+    return isinstance(fs, AsyncFileSystem) and fs.async_impl
+
+
+async def gather_file_infos(
+    fs: AsyncFileSystem, paths: Sequence[str], max_concurrency: int
+) -> list[FileInfo | None]:
+    """Gather the `_info` coroutines, with at most `max_concurrency` of them running."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def info(path: str) -> FileInfo | None:
+        async with semaphore:
+            try:
+                return cast(FileInfo, await fs._info(path))
+            except FileNotFoundError:
+                return None
+
+    return await asyncio.gather(*(info(path) for path in paths))
@@ -5,4 +5,14 @@ from synchrotron.utils.get_one_of import get_one_of
 
 
 def get_modifed_time(file_info: FileInfo) -> datetime:
-    return datetime.fromtimestamp(get_one_of(file_info, ["LastModified", "mtime"]))
+    modified_time = get_one_of(file_info, ["LastModified", "mtime"])
+    if isinstance(modified_time, datetime):
+        return modified_time
+    return datetime.fromtimestamp(modified_time)
+
+
+def to_timestamp(value: float | datetime) -> float:
+    """Backends give times either as POSIX timestamps or as datetimes."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
@@ -0,0 +1,49 @@
+from collections.abc import Callable, Iterable, Iterator
+
+
+def merge_join[T](
+    left: Iterable[T], right: Iterable[T], key: Callable[[T], str]
+) -> Iterator[tuple[T | None, T | None]]:
+    """Join two iterables sorted by key in a single linear pass.
+
+    Parameters
+    ----------
+    left : Iterable[T]
+        Items sorted by ascending key, without duplicated keys.
+    right : Iterable[T]
+        Items sorted by ascending key, without duplicated keys.
+    key : Callable[[T], str]
+        Function giving the key used to join the items.
+
+    Yields
+    ------
+    tuple[T | None, T | None]
+        Pairs of items sharing the same key. When one of the iterables does not
+        have an item for a key, its side of the pair is None.
+    """
+    left_iter = iter(left)
+    right_iter = iter(right)
+    left_item = next(left_iter, None)
+    right_item = next(right_iter, None)
+
+    while left_item is not None and right_item is not None:
+        left_key = key(left_item)
+        right_key = key(right_item)
+        if left_key == right_key:
+            yield left_item, right_item
+            left_item = next(left_iter, None)
+            right_item = next(right_iter, None)
+        elif left_key < right_key:
+            yield left_item, None
+            left_item = next(left_iter, None)
+        else:
+            yield None, right_item
+            right_item = next(right_iter, None)
+
+    while left_item is not None:
+        yield left_item, None
+        left_item = next(left_iter, None)
+
+    while right_item is not None:
+        yield None, right_item
+        right_item = next(right_iter, None)
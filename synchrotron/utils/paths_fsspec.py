@@ -8,10 +8,16 @@ function is still 100% compatible with all backends because it relies on
 common methods.
 """
 
+import heapq
+import re
+import sys
+from collections.abc import Callable
+from fnmatch import fnmatchcase
 from glob import has_magic
 from typing import Iterator, Literal, Sequence, cast, overload
 
 from fsspec import AbstractFileSystem
+from fsspec.utils import glob_translate
 
 from synchrotron.schema.molecules.fsspec_file_info import FileInfo
 
@@ -24,6 +30,8 @@ def expand_paths(
     maxdepth: int | None,
     detail: Literal[True],
     withdirs: bool = False,
+    find: Callable | None = None,
+    glob: Callable | None = None,
     **kwargs,
 ) -> Iterator[tuple[str, FileInfo]]: ...
 @overload
@@ -34,6 +42,8 @@ def expand_paths(
     maxdepth: int | None,
     detail: Literal[False],
     withdirs: bool = False,
+    find: Callable | None = None,
+    glob: Callable | None = None,
     **kwargs,
 ) -> Iterator[str]: ...
 def expand_paths(
@@ -43,15 +53,28 @@ def expand_paths(
     maxdepth: int | None,
     detail: bool,
     withdirs: bool = False,
+    find: Callable | None = None,
+    glob: Callable | None = None,
     **kwargs,
 ) -> Iterator[tuple[str, FileInfo] | str]:
+    """
+    Expand paths (with or without glob patterns) into the files they hold.
+
+    `find` and `glob` replace `fs.find` for the recursive listings and `fs.glob`
+    for the patterns, e.g. to go through a cache of listings.
+    """
+    find = find or fs.find
+    glob = glob or fs.glob
     paths = (fs._strip_protocol(p) for p in paths)
     for p in paths:
         if has_magic(p):
             expanded_paths = cast(
                 dict[str, FileInfo],
-                fs.glob(p, maxdepth=maxdepth, detail=True, **kwargs),
+                glob(p, maxdepth=maxdepth, detail=True, **kwargs),
             )
+            matched_directories = [
+                path for path, info in expanded_paths.items() if info["type"] != "file"
+            ]
 
             if withdirs is False:
                 expanded_paths = {
@@ -69,22 +92,287 @@ def expand_paths(
                 if maxdepth is not None and maxdepth <= 1:
                     continue
 
-                rec_paths = expand_paths(
-                    fs,
-                    list(expanded_paths),
-                    recursive=True,
-                    maxdepth=maxdepth - 1 if maxdepth is not None else None,
-                    detail=True,
-                    **kwargs,
-                )
-                yield from rec_paths
+                rec_maxdepth = maxdepth - 1 if maxdepth is not None else None
+                # the overloads need the literal value of `detail`
+                if detail is True:
+                    yield from expand_paths(
+                        fs,
+                        matched_directories,
+                        recursive=True,
+                        maxdepth=rec_maxdepth,
+                        detail=True,
+                        withdirs=withdirs,
+                        find=find,
+                        glob=glob,
+                        **kwargs,
+                    )
+                else:
+                    yield from expand_paths(
+                        fs,
+                        matched_directories,
+                        recursive=True,
+                        maxdepth=rec_maxdepth,
+                        detail=False,
+                        withdirs=withdirs,
+                        find=find,
+                        glob=glob,
+                        **kwargs,
+                    )
         elif recursive:
             rec = cast(
-                dict[str, dict],
-                fs.find(p, maxdepth=maxdepth, detail=True, withdirs=withdirs, **kwargs),
+                dict[str, FileInfo],
+                find(p, maxdepth=maxdepth, detail=True, withdirs=withdirs, **kwargs),
             )
 
             if detail is True:
                 yield from rec.items()
             else:
                 yield from rec.keys()
+
+
+def stream_expand_paths(
+    fs: AbstractFileSystem,
+    paths: Sequence[str] | Iterator[str],
+    recursive: bool,
+    maxdepth: int | None = None,
+    ls: Callable[[str], list[FileInfo]] | None = None,
+    sort: bool = False,
+) -> Iterator[tuple[str, FileInfo]]:
+    """Streaming counterpart of `expand_paths`, with detail=True and withdirs=False.
+
+    Paths are expanded directory by directory with `walk_directories`, so that
+    only the listings of the directories being walked are held in memory, and
+    matches are yielded as soon as their directory is listed. A directory that
+    was entirely expanded for a previous path is never listed again.
+
+    Parameters
+    ----------
+    fs : AbstractFileSystem
+        filesystem to expand the paths in.
+    paths : Sequence[str] | Iterator[str]
+        paths, with or without glob patterns.
+    recursive : bool
+        whether to yield the files under the matching directories.
+    maxdepth : int | None, optional
+        maximum depth of the files yielded under a matching directory, by
+        default there is no limit.
+    ls : Callable[[str], list[FileInfo]] | None, optional
+        function listing the content of a directory, see `walk_directories`.
+    sort : bool, optional
+        yield the files of all the paths in a single lexicographic order. The walk
+        of each path already yields sorted files, so the walks are k-way merged
+        (as in the merge phase of an external sort), holding one pending file per
+        path in memory. By default False, the paths are expanded one after
+        the other.
+
+    Yields
+    ------
+    tuple[str, FileInfo]
+        path of each file with its details.
+    """
+    stripped_paths = list(dict.fromkeys(fs._strip_protocol(path) for path in paths))
+    if recursive and maxdepth is None:
+        # paths under a plain path are entirely expanded with it
+        plain_paths = [
+            GlobPattern(path) for path in stripped_paths if not has_magic(path)
+        ]
+        stripped_paths = [
+            path
+            for path in stripped_paths
+            if not any(
+                plain_path.pattern != path.rstrip("/")
+                and plain_path.covers(GlobPattern(path).root)
+                for plain_path in plain_paths
+            )
+        ]
+
+    expanded_directories: set[str] = set()
+    walks = [
+        _stream_expand_path(fs, path, recursive, maxdepth, ls, expanded_directories)
+        for path in stripped_paths
+    ]
+
+    if not sort:
+        for walk in walks:
+            yield from walk
+        return
+
+    # the walks run side by side, so a directory can be expanded by two of them
+    previous_path = None
+    for path, info in heapq.merge(*walks, key=lambda item: item[0]):
+        if path != previous_path:
+            yield path, info
+        previous_path = path
+
+
+def _stream_expand_path(
+    fs: AbstractFileSystem,
+    path: str,
+    recursive: bool,
+    maxdepth: int | None,
+    ls: Callable[[str], list[FileInfo]] | None,
+    expanded_directories: set[str],
+) -> Iterator[tuple[str, FileInfo]]:
+    pattern = GlobPattern(path)
+    match_depth = len(pattern.parts)
+    max_file_depth = match_depth
+    if recursive:
+        max_file_depth += maxdepth if maxdepth is not None else sys.maxsize
+    # only the directories whose whole subtree is yielded count as expanded
+    expands_subtrees = recursive and maxdepth is None
+
+    root_parts = pattern.root.split("/")
+    for depth in range(1, len(root_parts) + 1):
+        if "/".join(root_parts[:depth]) in expanded_directories:
+            return
+    if expands_subtrees and pattern.covers(pattern.root):
+        expanded_directories.add(pattern.root)
+
+    def prune(directory: str) -> bool:
+        if directory in expanded_directories:
+            return True
+
+        depth = directory.count("/") + 1
+        if depth >= max_file_depth or not pattern.may_contain(directory):
+            return True
+
+        if expands_subtrees and pattern.covers(directory):
+            expanded_directories.add(directory)
+        return False
+
+    for file_path, info in walk_directories(fs, pattern.root, prune=prune, ls=ls):
+        depth = file_path.count("/") + 1
+        if depth > max_file_depth:
+            continue
+        if (recursive or depth == match_depth) and pattern.covers(file_path):
+            yield file_path, info
+
+
+class GlobPattern:
+    """
+    Glob pattern (or plain path) that matches paths, and everything under them.
+
+    It tells whether a path is covered by the pattern, and whether a directory can
+    hold covered paths, which allows to skip whole subtrees while walking.
+    """
+
+    def __init__(self, pattern: str) -> None:
+        self.pattern = pattern.rstrip("/")
+        self.parts = self.pattern.split("/")
+
+        self._regex: re.Pattern[str] | None = None
+        if has_magic(self.pattern):
+            self._regex = re.compile(glob_translate(self.pattern))
+
+    @property
+    def root(self) -> str:
+        """Deepest directory that contains all the paths covered by the pattern."""
+        literal_parts = []
+        for part in self.parts:
+            if has_magic(part):
+                break
+            literal_parts.append(part)
+        return "/".join(literal_parts)
+
+    def covers(self, path: str) -> bool:
+        """Whether the path, or one of its parent directories, matches the pattern."""
+        path = path.rstrip("/")
+        if self._regex is None:
+            return path == self.pattern or path.startswith(self.pattern + "/")
+
+        path_parts = path.split("/")
+        for depth in range(1, len(path_parts) + 1):
+            if self._regex.match("/".join(path_parts[:depth])):
+                return True
+        return False
+
+    def may_contain(self, directory: str) -> bool:
+        """Whether the directory, or some of its descendants, can be covered."""
+        directory_parts = directory.rstrip("/").split("/")
+        for directory_part, pattern_part in zip(directory_parts, self.parts):
+            if "**" in pattern_part:
+                return True
+            if not fnmatchcase(directory_part, pattern_part):
+                return False
+
+        if len(directory_parts) <= len(self.parts):
+            return True
+        return self.covers(directory)
+
+
+def walk_directories(
+    fs: AbstractFileSystem,
+    root: str,
+    prune: Callable[[str], bool] | None = None,
+    ls: Callable[[str], list[FileInfo]] | None = None,
+) -> Iterator[tuple[str, FileInfo]]:
+    """Walk a tree directory by directory and yield its files, in path order.
+
+    Parameters
+    ----------
+    fs : AbstractFileSystem
+        filesystem to walk through.
+    root : str
+        directory (or file) to start the walk from.
+    prune : Callable[[str], bool] | None, optional
+        called with the path of each directory found. When it returns True, the
+        directory is neither listed nor walked through.
+    ls : Callable[[str], list[FileInfo]] | None, optional
+        function listing the content of a directory with its details, by default
+        `fs.ls(path, detail=True)`.
+
+    Yields
+    ------
+    tuple[str, FileInfo]
+        path of each file with its details.
+    """
+    if ls is None:
+        ls = cast(
+            Callable[[str], list[FileInfo]], lambda path: fs.ls(path, detail=True)
+        )
+
+    root = fs._strip_protocol(root).rstrip("/")
+    try:
+        root_entries = ls(root)
+    except FileNotFoundError:
+        return
+
+    for root_entry in root_entries:
+        if root_entry["name"].rstrip("/") == root and root_entry["type"] != "directory":
+            # the root is a file, listed as itself
+            yield root, root_entry
+            return
+
+    stack = [iter(sort_entries(root, root_entries))]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+
+        path = entry["name"].rstrip("/")
+        if entry["type"] == "directory":
+            if prune is not None and prune(path):
+                continue
+            try:
+                entries = ls(path)
+            except FileNotFoundError:
+                # removed since its parent was listed
+                continue
+            stack.append(iter(sort_entries(path, entries)))
+        else:
+            yield path, entry
+
+
+def sort_entries(directory: str, entries: list[FileInfo]) -> list[FileInfo]:
+    """
+    Sort the entries of a directory so that walking them depth first gives paths
+    in lexicographic order. The directory itself, listed by some backends, is
+    dropped.
+    """
+    return sorted(
+        (entry for entry in entries if entry["name"].rstrip("/") != directory),
+        key=lambda entry: (
+            entry["name"].rstrip("/") + ("/" if entry["type"] == "directory" else "")
+        ),
+    )
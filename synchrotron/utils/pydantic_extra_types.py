@@ -1,7 +1,15 @@
 from datetime import timedelta
-from typing import Annotated
+from typing import Annotated, Any
 
 from isodate import parse_duration
 from pydantic import BeforeValidator
 
-type Duration = Annotated[timedelta, BeforeValidator(parse_duration)]
+
+def parse_duration_str(value: Any) -> Any:
+    """Parse ISO 8601 durations, let already parsed values through."""
+    if isinstance(value, str):
+        return parse_duration(value)
+    return value
+
+
+type Duration = Annotated[timedelta, BeforeValidator(parse_duration_str)]
@@ -0,0 +1,120 @@
+"""
+Regex patterns of paths, combined into a single pattern.
+
+To avoid listing a whole storage to match a few paths, the literal directory
+prefix of each pattern is extracted (e.g. `projects/` for
+`projects/[0-9]{4}/raw/.*\\.tif`), and only the subtrees under those prefixes are
+listed.
+"""
+
+import re
+
+REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+OPTIONAL_QUANTIFIERS = set("*?{")
+
+
+class RegexPaths:
+    def __init__(self, root: str, patterns: list[str]) -> None:
+        """
+        Parameters
+        ----------
+        root : str
+            directory the patterns are relative to.
+        patterns : list[str]
+            regex patterns that must match the whole relative path of a file.
+        """
+        self.root = root.rstrip("/")
+        self.regex = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+        prefixes = sorted({literal_directory_prefix(pattern) for pattern in patterns})
+        self.prefixes = remove_nested_prefixes(prefixes)
+        """literal directory prefixes of the patterns, none being under another"""
+
+    @property
+    def listing_roots(self) -> list[str]:
+        """Directories to list to find all the files that can match the patterns."""
+        return [
+            f"{self.root}/{prefix}" if prefix else self.root or "/"
+            for prefix in self.prefixes
+        ]
+
+    def covers(self, path: str) -> bool:
+        """Whether the path, relative to the root, matches one of the patterns."""
+        if self.root:
+            if not path.startswith(self.root + "/"):
+                return False
+            relative_path = path[len(self.root) + 1 :]
+        else:
+            relative_path = path.lstrip("/")
+
+        return self.regex.fullmatch(relative_path) is not None
+
+
+def literal_directory_prefix(pattern: str) -> str:
+    """Directory that holds all the paths matching the pattern, without trailing slash.
+
+    Returns an empty string if the pattern can match any directory.
+    """
+    pattern = pattern.removeprefix("^")
+    if has_top_level_alternation(pattern):
+        return ""
+
+    literal: list[str] = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            escaped = pattern[index + 1 : index + 2]
+            if escaped == "" or escaped.isalnum():
+                # character classes such as \d or \w
+                break
+            literal.append(escaped)
+            index += 2
+            continue
+        if char in OPTIONAL_QUANTIFIERS:
+            # the quantifier applies to the previous character, that may be absent
+            if literal:
+                literal.pop()
+            break
+        if char in REGEX_SPECIAL_CHARACTERS:
+            break
+
+        literal.append(char)
+        index += 1
+
+    return "".join(literal).rpartition("/")[0]
+
+
+def has_top_level_alternation(pattern: str) -> bool:
+    """Whether the pattern contains a `|` that is not inside a group or a set."""
+    depth = 0
+    in_set = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            index += 2
+            continue
+        if in_set:
+            in_set = char != "]"
+        elif char == "[":
+            in_set = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+        index += 1
+
+    return False
+
+
+def remove_nested_prefixes(prefixes: list[str]) -> list[str]:
+    """Drop the prefixes that are under another one. The prefixes must be sorted."""
+    kept: list[str] = []
+    for prefix in prefixes:
+        if kept and (kept[-1] == "" or prefix.startswith(kept[-1] + "/")):
+            continue
+        kept.append(prefix)
+    return kept
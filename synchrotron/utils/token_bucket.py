@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """Budget of units (e.g. bytes) per second, shared between threads.
+
+        Parameters
+        ----------
+        rate : float
+            units added to the bucket per second.
+        capacity : float | None, optional
+            maximum number of units in the bucket, i.e. the largest burst, by
+            default one second worth of units.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        """Wait until `amount` units can be taken from the bucket, and take them.
+
+        An amount larger than the capacity is taken as soon as the bucket is full,
+        the bucket then owes the difference, which delays the next consumers.
+        """
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
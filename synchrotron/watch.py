@@ -0,0 +1,356 @@
+"""
+Watch mode: synchronise the files of local storages as they change.
+
+Changes are reported by inotify (Linux only), through `ctypes` so that no extra
+dependency is needed. As inotify does not watch directories recursively, every
+directory under the watched roots gets its own watch, and new directories are
+watched as they appear.
+
+Events are coalesced by path and debounced: a batch of changed paths is
+synchronised once no new event came for `debounce`, or after `max_delay` at the
+latest. Only the changed paths are filtered, compared and synchronised, by
+services built once for all the batches. Paths that exist on neither side and
+are not cached are dropped, as are the partial files written by transfers. All
+the files are synchronised at startup, and again when the kernel event queue
+overflows, as changes could have been lost.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Self
+
+from fsspec.implementations.local import LocalFileSystem
+
+from synchrotron.comparaison import ComparaisonSvc, take_snapshot
+from synchrotron.configuration import OneConfig
+from synchrotron.configuration.storage import Storage
+from synchrotron.filter import FilterSvc
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+from synchrotron.synchronisation import get_transfer_svc, get_writer, synchronise
+from synchrotron.transfer import Side, is_partial_path
+
+logger = logging.getLogger(__name__)
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+"""watch descriptor, mask, cookie and length of the name of an inotify event"""
+
+
+@dataclass(frozen=True, slots=True)
+class InotifyEvent:
+    path: str
+    mask: int
+    tag: str
+
+    @property
+    def is_dir(self) -> bool:
+        return bool(self.mask & IN_ISDIR)
+
+    @property
+    def overflow(self) -> bool:
+        return bool(self.mask & IN_Q_OVERFLOW)
+
+
+class Inotify:
+    """Minimal binding to the inotify API of the Linux kernel."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            self._init = libc.inotify_init1
+            self._add_watch = libc.inotify_add_watch
+        except AttributeError:
+            raise OSError("inotify is not available on this platform.") from None
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = self._init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Could not initialise inotify.")
+
+        self.watches: dict[int, tuple[str, str]] = {}
+        """watched directory and its tag, for each watch descriptor"""
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def add_watch(self, directory: str, tag: str) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == 28:  # ENOSPC
+                raise OSError(
+                    error,
+                    "Too many watched directories, raise fs.inotify.max_user_watches.",
+                )
+            logger.warning(f"Could not watch {directory}: {os.strerror(error)}")
+            return
+        self.watches[wd] = (directory, tag)
+
+    def add_tree(self, root: str, tag: str) -> None:
+        """Watch a directory and all its subdirectories."""
+        for directory, _, _ in os.walk(root):
+            self.add_watch(directory, tag)
+
+    def read(self, timeout: float | None) -> list[InotifyEvent]:
+        """Events pending, waiting at most `timeout` seconds for the first one."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        events: list[InotifyEvent] = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            events.extend(self._parse(data))
+
+    def _parse(self, data: bytes) -> list[InotifyEvent]:
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(InotifyEvent("", mask, ""))
+                continue
+            if wd not in self.watches:
+                continue
+
+            directory, tag = self.watches[wd]
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(directory, name) if name else directory
+            events.append(InotifyEvent(path, mask, tag))
+        return events
+
+
+class WatchSvc:
+    def __init__(self, config: OneConfig) -> None:
+        self.config = config
+        self.storages: dict[Side, Storage] = {
+            "left": config.left,
+            "right": config.right,
+        }
+        self.filter_svcs = self.get_filter_svcs()
+        self.comparison_svc = ComparaisonSvc(
+            config.comparaison, config.left, config.right
+        )
+        self.writer = get_writer(config)
+        self.transfer_svc = get_transfer_svc(config, self.writer)
+        self.watched_sides: list[Side] = [
+            side
+            for side, storage in self.storages.items()
+            if isinstance(storage.fs, LocalFileSystem)
+        ]
+        if not self.watched_sides:
+            raise ValueError("Watch mode requires at least one local storage.")
+
+        trigger = config.synchronisation.trigger
+        self.debounce = trigger.debounce.total_seconds()
+        self.max_delay = trigger.max_delay.total_seconds()
+
+    def run(self) -> None:
+        """Synchronise everything, then the changes as they come, until interrupted."""
+        with Inotify() as inotify:
+            self.watch(inotify)
+            synchronise(self.config)
+
+            changed_paths: set[str] = set()
+            first_change = last_change = 0.0
+            while True:
+                timeout = None
+                if changed_paths:
+                    deadline = min(
+                        last_change + self.debounce, first_change + self.max_delay
+                    )
+                    timeout = max(0.0, deadline - time.monotonic())
+
+                events = inotify.read(timeout)
+                now = time.monotonic()
+                if any(event.overflow for event in events):
+                    logger.warning("Events were lost, synchronising all the files.")
+                    changed_paths.clear()
+                    self.watch(inotify)
+                    synchronise(self.config)
+                    continue
+
+                if events:
+                    if not changed_paths:
+                        first_change = now
+                    last_change = now
+                    changed_paths.update(self.changed_paths(inotify, events))
+
+                if changed_paths and (
+                    now >= last_change + self.debounce
+                    or now >= first_change + self.max_delay
+                ):
+                    self.synchronise_paths(changed_paths)
+                    changed_paths.clear()
+
+    def get_filter_svcs(self) -> dict[Side, FilterSvc]:
+        """Filters of both sides, built once and shared by all the batches."""
+        return {
+            side: FilterSvc(self.config.filters, storage)
+            for side, storage in self.storages.items()
+        }
+
+    def watch(self, inotify: Inotify) -> None:
+        """Watch all the directories that can hold included files."""
+        for side in self.watched_sides:
+            for root in self.filter_svcs[side].watched_roots():
+                if os.path.isdir(root):
+                    inotify.add_tree(root, side)
+
+    def changed_paths(self, inotify: Inotify, events: list[InotifyEvent]) -> set[str]:
+        """Relative paths of the files affected by the events."""
+        paths: set[str] = set()
+        for event in events:
+            side: Side = "left" if event.tag == "left" else "right"
+            try:
+                relative_path = self.storages[side].relative_path(event.path)
+            except ValueError:
+                continue
+
+            if not event.is_dir:
+                # transfers write local targets to partial files first
+                if not is_partial_path(relative_path):
+                    paths.add(relative_path)
+                continue
+
+            if event.mask & (IN_CREATE | IN_MOVED_TO):
+                inotify.add_tree(event.path, side)
+            if event.mask & (IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                # the files of a directory are listed on both sides, to catch the
+                # ones that appeared in one and the ones that vanished from the other
+                paths.update(self.files_under(relative_path))
+        return paths
+
+    def files_under(self, relative_directory: str) -> set[str]:
+        paths: set[str] = set()
+        for storage in self.storages.values():
+            try:
+                found = storage.fs.find(storage.joinpath(relative_directory))
+            except FileNotFoundError:
+                continue
+            paths.update(
+                storage.relative_path(path)
+                for path in found
+                if not is_partial_path(path)
+            )
+        return paths
+
+    def synchronise_paths(self, relative_paths: set[str]) -> None:
+        """Filter, compare and synchronise only the given files."""
+        # the run of a batch starts now for the filters with relative durations
+        run_start = datetime.now()
+        for filter_svc in self.filter_svcs.values():
+            filter_svc.run_start = run_start
+        matchers = {
+            side: filter_svc.matcher() for side, filter_svc in self.filter_svcs.items()
+        }
+        # records were written by the previous batch or a full synchronisation
+        self.comparison_svc.forget_cached_files()
+
+        comparaisons = []
+        for relative_path in sorted(relative_paths):
+            left_snapshot = take_snapshot(self.config.left, Path(relative_path))
+            right_snapshot = take_snapshot(self.config.right, Path(relative_path))
+            snapshots: dict[Side, FileSnapshot] = {
+                "left": left_snapshot,
+                "right": right_snapshot,
+            }
+            if (
+                left_snapshot.info is None
+                and right_snapshot.info is None
+                and not self.is_cached(relative_path)
+            ):
+                # e.g. a temporary file, gone before the batch
+                continue
+            # a file removed from both sides can only be matched on its path
+            existing = {
+                side: snapshot
+                for side, snapshot in snapshots.items()
+                if snapshot.info is not None
+            }
+            if not any(
+                self.meets_filters(side, snapshot, matchers[side])
+                for side, snapshot in (existing or snapshots).items()
+            ):
+                continue
+
+            state = self.comparison_svc.compare(left_snapshot, right_snapshot)
+            comparaisons.append((left_snapshot, right_snapshot, state))
+
+        logger.info(f"Synchronising {len(comparaisons)} changed files.")
+        n_transfers = n_errors = 0
+        for report in self.transfer_svc.run(comparaisons):
+            n_transfers += 1
+            if report.error is not None:
+                n_errors += 1
+        if self.writer is not None:
+            self.writer.flush()
+        self.comparison_svc.flush()
+        logger.info(f"{n_transfers} transfers done, {n_errors} failed.")
+
+    def is_cached(self, relative_path: str) -> bool:
+        """Whether the cache of the comparaison holds the file, on either side."""
+        return any(
+            self.comparison_svc.get_cached_file(storage.id, relative_path) is not None
+            for storage in self.storages.values()
+        )
+
+    def meets_filters(
+        self,
+        side: Side,
+        snapshot: FileSnapshot,
+        matches: Callable[[str, FileInfo | None], bool],
+    ) -> bool:
+        storage = self.storages[side]
+        path = storage.fs._strip_protocol(storage.joinpath(snapshot.relative_path))
+        return matches(path, snapshot.info)
@@ -0,0 +1,118 @@
+from datetime import datetime
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+from synchrotron.comparaison import ComparaisonSvc
+from synchrotron.configuration.comparaison import (
+    CacheDisabledComparaison,
+    DateTimeSizeCacheComparaison,
+)
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.cache_index import StorageFileIndex
+from synchrotron.database.writer import StorageFileWriter
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+CONFIG = CacheDisabledComparaison.model_validate(
+    {
+        "type": "size",
+        "cache": "disabled",
+        "actions": {
+            "only_exist_left": "copy_to_right",
+            "only_exist_right": "copy_to_left",
+            "file_is_different": "update_in_right",
+        },
+    }
+)
+
+
+def file_info(size: int) -> FileInfo:
+    return cast(FileInfo, {"name": "", "size": size, "type": "file", "mtime": 0.0})
+
+
+@pytest.fixture
+def comparaison_svc(tmp_path: Path) -> ComparaisonSvc:
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "a.txt").write_bytes(b"a")
+    (tmp_path / "right" / "a.txt").write_bytes(b"a")
+    return ComparaisonSvc(
+        CONFIG,
+        Storage(id=1, base_path=tmp_path / "left"),
+        Storage(id=2, base_path=tmp_path / "right"),
+    )
+
+
+def test_compare_reuses_snapshot_details(
+    comparaison_svc: ComparaisonSvc, monkeypatch: pytest.MonkeyPatch
+):
+    def info(*args, **kwargs):
+        raise AssertionError("the details of a snapshot are not fetched again")
+
+    monkeypatch.setattr(comparaison_svc.fs_left, "info", info)
+    monkeypatch.setattr(comparaison_svc.fs_right, "info", info)
+
+    # the listing details differ from the files on disk, which are the same
+    assert "file_is_different" == comparaison_svc.compare(
+        FileSnapshot("a.txt", file_info(1)), FileSnapshot("a.txt", file_info(2))
+    )
+    assert "only_exist_left" == comparaison_svc.compare(
+        FileSnapshot("a.txt", file_info(1)), FileSnapshot("a.txt", None)
+    )
+
+
+def test_compare_fetches_details_of_paths(comparaison_svc: ComparaisonSvc):
+    assert comparaison_svc.compare(Path("a.txt"), Path("a.txt")) is None
+    assert "only_exist_right" == comparaison_svc.compare(
+        FileSnapshot("a.txt", None), Path("a.txt")
+    )
+
+
+def test_get_cached_file_queries_without_lock(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    config = DateTimeSizeCacheComparaison.model_validate(
+        {
+            "type": "datetime_size",
+            "time_zone_shift": "+00:00",
+            "cache": "enabled",
+            "cache_engine": {
+                "cache_engine": "database",
+                "engine_url": f"sqlite:///{tmp_path / 'cache.db'}",
+                "lookup": "preload",
+                "preload_max_records": 1,
+                "range_query_size": 2,
+            },
+            "actions": {
+                "created_left": "copy_to_right",
+                "created_right": "copy_to_left",
+                "more_recent_left": "update_in_right",
+                "more_recent_right": "update_in_left",
+                "removed_left": "remove_in_right",
+                "removed_right": "remove_in_left",
+            },
+        }
+    )
+    storage = Storage(id=1, base_path=tmp_path)
+    cache_engine = config.cache_engine
+    assert isinstance(cache_engine, DatabaseCacheEngine)
+    with StorageFileWriter(cache_engine) as writer:
+        for path in ("a", "b", "c"):
+            writer.upsert(storage, path, datetime(2024, 6, 15), 1)
+    comparaison_svc = ComparaisonSvc(config, storage, storage)
+
+    query_window = StorageFileIndex.query_window
+    locked_queries: list[bool] = []
+
+    def spy_query_window(index: StorageFileIndex, start: str) -> list:
+        locked_queries.append(comparaison_svc.cache_lock.locked())
+        return query_window(index, start)
+
+    monkeypatch.setattr(StorageFileIndex, "query_window", spy_query_window)
+    records = [comparaison_svc.get_cached_file(1, path) for path in ("a", "b", "c")]
+
+    assert [1, 1, 1] == [record and record.size for record in records]
+    assert [False, False] == locked_queries
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fsspec.asyn import AsyncFileSystem
+from fsspec.implementations.memory import MemoryFileSystem
+
+from synchrotron.utils.concurrent_file_info import FileInfoFetcher
+
+
+class SlowAsyncFileSystem(AsyncFileSystem):
+    """Asynchronous filesystem whose `_info` calls take a while to complete."""
+
+    cachable = False
+
+    def __init__(self, sizes: dict[str, int], **kwargs):
+        super().__init__(**kwargs)
+        self.sizes = sizes
+        self.running = 0
+        self.max_running = 0
+
+    async def _info(self, path, **kwargs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.running -= 1
+
+        if path == "/denied":
+            raise PermissionError(path)
+        if path not in self.sizes:
+            raise FileNotFoundError(path)
+        return {"name": path, "size": self.sizes[path], "type": "file"}
+
+
+@pytest.fixture
+def memory_fs() -> MemoryFileSystem:
+    fs = MemoryFileSystem(skip_instance_cache=True)
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    return fs
+
+
+def test_file_info_fetcher_sync(memory_fs: MemoryFileSystem):
+    memory_fs.pipe("/a", b"a")
+    memory_fs.pipe("/b", b"bb")
+
+    with FileInfoFetcher(memory_fs, max_concurrency=2) as fetcher:
+        infos = fetcher.fetch(["/b", "/missing", "/a"])
+
+    assert [2, None, 1] == [info and info["size"] for info in infos]
+
+
+def test_file_info_fetcher_sync_error(
+    memory_fs: MemoryFileSystem, monkeypatch: pytest.MonkeyPatch
+):
+    def info(path, **kwargs):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(memory_fs, "info", info)
+
+    with (
+        FileInfoFetcher(memory_fs, max_concurrency=2) as fetcher,
+        pytest.raises(PermissionError),
+    ):
+        fetcher.fetch(["/a"])
+
+
+def test_file_info_fetcher_async():
+    fs = SlowAsyncFileSystem({f"/{i}": i for i in range(10)})
+
+    with FileInfoFetcher(fs, max_concurrency=3) as fetcher:
+        infos = fetcher.fetch([f"/{i}" for i in range(10)] + ["/missing"])
+
+    assert [*range(10), None] == [info and info["size"] for info in infos]
+    # the calls run concurrently, up to the limit
+    assert 3 == fs.max_running
+
+
+def test_file_info_fetcher_async_error():
+    fs = SlowAsyncFileSystem({"/a": 1})
+
+    with (
+        FileInfoFetcher(fs, max_concurrency=3) as fetcher,
+        pytest.raises(PermissionError),
+    ):
+        fetcher.fetch(["/a", "/denied"])
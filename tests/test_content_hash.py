@@ -0,0 +1,88 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, func, inspect, select
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.block_signature import BlockSignatureCache
+from synchrotron.database.content_hash import ContentHashCache
+from synchrotron.database.models.storage_file import StorageFile
+from synchrotron.database.models.storage_file_signature import StorageFileSignature
+from synchrotron.database.utils import get_engine, session_manager
+
+MODIFIED = datetime(2024, 6, 15, 12)
+
+
+def count_commits(cache_engine: DatabaseCacheEngine, commits: list[int]) -> None:
+    def on_commit(conn) -> None:
+        commits.append(1)
+
+    event.listen(get_engine(cache_engine.engine_url), "commit", on_commit)
+
+
+@pytest.mark.parametrize("lookup", ["per_file", "preload"])
+def test_content_hash_cache(tmp_path: Path, lookup: str):
+    cache_engine = DatabaseCacheEngine.model_validate(
+        {
+            "engine_url": f"sqlite:///{tmp_path / 'cache.db'}",
+            "lookup": lookup,
+            "write_batch_size": 2,
+        }
+    )
+    storage = Storage(id=1)
+    commits: list[int] = []
+    count_commits(cache_engine, commits)
+
+    hash_cache = ContentHashCache(cache_engine, "sha256")
+    hash_cache.set(storage, "a", 1, MODIFIED, "digest-a")
+    # digests are served before being written
+    assert "digest-a" == hash_cache.get(1, "a", 1, MODIFIED)
+    assert hash_cache.get(1, "a", 2, MODIFIED) is None
+    assert [] == commits
+
+    hash_cache.set(storage, "b", 2, MODIFIED, "digest-b")
+    hash_cache.set(storage, "c", 3, MODIFIED, "digest-c")
+    hash_cache.flush()
+
+    # a batch is written in a single transaction
+    assert 2 == len(commits)
+    fresh_cache = ContentHashCache(cache_engine, "sha256")
+    assert ["digest-a", "digest-b", "digest-c"] == [
+        fresh_cache.get(1, path, size, MODIFIED)
+        for path, size in [("a", 1), ("b", 2), ("c", 3)]
+    ]
+    assert ContentHashCache(cache_engine, "md5").get(1, "a", 1, MODIFIED) is None
+    with session_manager(cache_engine) as session:
+        assert 3 == session.scalar(select(func.count()).select_from(StorageFile))
+
+
+def test_block_signature_cache(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(
+        engine_url=f"sqlite:///{tmp_path / 'cache.db'}", write_batch_size=2
+    )
+    storage = Storage(id=1)
+    signature_cache = BlockSignatureCache(cache_engine)
+
+    signature_cache.set(storage, "a", 1, MODIFIED, 8, b"old")
+    signature_cache.set(storage, "a", 1, MODIFIED, 8, b"new")
+    assert b"new" == signature_cache.get(1, "a", 1, MODIFIED, 8)
+    signature_cache.set(storage, "b", 1, MODIFIED, 8, b"b")
+    signature_cache.set(storage, "a", 2, MODIFIED, 8, b"newer")
+    signature_cache.flush()
+
+    assert b"newer" == signature_cache.get(1, "a", 2, MODIFIED, 8)
+    assert signature_cache.get(1, "a", 2, MODIFIED, 16) is None
+    with session_manager(cache_engine) as session:
+        assert 2 == session.scalar(
+            select(func.count()).select_from(StorageFileSignature)
+        )
+
+    indexes = inspect(get_engine(cache_engine.engine_url)).get_indexes(
+        StorageFileSignature.__tablename__
+    )
+    assert any(
+        index["unique"] and index["column_names"] == ["storage_id", "relative_path"]
+        for index in indexes
+    )
@@ -0,0 +1,130 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, event, insert, inspect, select, text
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.database.cache_index import StorageFileIndex, iter_cached_files
+from synchrotron.database.models.storage import Storage
+from synchrotron.database.models.storage_file import StorageFile
+from synchrotron.database.utils import create_db, get_engine, session_manager
+from synchrotron.schema.molecules.cached_storage_file import CachedStorageFile
+
+MODIFIED = datetime(2024, 6, 15, 12)
+
+
+def record(storage_id: int, relative_path: str, size: int = 0) -> dict:
+    return {
+        "storage_id": storage_id,
+        "relative_path": relative_path,
+        "modified_datetime": MODIFIED,
+        "size": size,
+        "content_hash": None,
+    }
+
+
+def test_create_db_migrates_duplicated_records(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    create_db(engine)
+    with engine.begin() as connection:
+        # schema of the previous versions
+        connection.execute(text("DROP INDEX ix_storage_file_storage_id_relative_path"))
+        connection.execute(insert(Storage).values(id=1, type="file", base_path=""))
+        connection.execute(
+            insert(StorageFile), [record(1, "a", 1), record(1, "a", 2), record(1, "b")]
+        )
+
+    create_db(engine)
+
+    indexes = inspect(engine).get_indexes("storage_file")
+    assert any(
+        index["unique"] and index["column_names"] == ["storage_id", "relative_path"]
+        for index in indexes
+    )
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(StorageFile.relative_path, StorageFile.size).order_by(
+                StorageFile.relative_path
+            )
+        ).all()
+    assert [("a", 2), ("b", 0)] == [tuple(row) for row in rows]
+
+
+@pytest.mark.parametrize(
+    "directory, expected_results",
+    [
+        ("", ["a", "a/b", "a/b/c", "a/c", "a0", "a_b/c"]),
+        ("a", ["a/b", "a/b/c", "a/c"]),
+        ("a/b/", ["a/b/c"]),
+        ("z", []),
+    ],
+)
+def test_iter_cached_files(tmp_path: Path, directory: str, expected_results: list):
+    cache_engine = DatabaseCacheEngine(
+        engine_url=f"sqlite:///{tmp_path / 'cache.db'}", range_query_size=2
+    )
+    paths = ["a_b/c", "a/b/c", "a0", "a", "a/c", "a/b"]
+    with session_manager(cache_engine, autocommit=True) as session:
+        session.execute(insert(Storage).values(id=1, type="file", base_path=""))
+        session.execute(insert(Storage).values(id=2, type="file", base_path=""))
+        session.execute(insert(StorageFile), [record(1, path) for path in paths])
+        session.execute(insert(StorageFile), [record(2, "a/d")])
+
+    cached_paths = [path for path, _ in iter_cached_files(cache_engine, 1, directory)]
+    assert expected_results == cached_paths
+
+
+def test_storage_file_index_preload(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(
+        engine_url=f"sqlite:///{tmp_path / 'cache.db'}", lookup="preload"
+    )
+    with session_manager(cache_engine, autocommit=True) as session:
+        session.execute(insert(Storage).values(id=1, type="file", base_path=""))
+        session.execute(insert(Storage).values(id=2, type="file", base_path=""))
+        session.execute(insert(StorageFile), [record(1, "a", 1), record(1, "b", 2)])
+        session.execute(insert(StorageFile), [record(2, "c")])
+
+    index = StorageFileIndex(cache_engine, 1)
+    index.load()
+
+    assert index.preloaded
+    assert CachedStorageFile(MODIFIED, 2, None) == index.get("b")
+    assert index.get("c") is None
+
+
+def test_storage_file_index_windows(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(
+        engine_url=f"sqlite:///{tmp_path / 'cache.db'}",
+        lookup="preload",
+        preload_max_records=2,
+        range_query_size=2,
+    )
+    paths = ["a", "b", "c", "d", "e"]
+    with session_manager(cache_engine, autocommit=True) as session:
+        session.execute(insert(Storage).values(id=1, type="file", base_path=""))
+        session.execute(
+            insert(StorageFile), [record(1, path, i) for i, path in enumerate(paths)]
+        )
+
+    index = StorageFileIndex(cache_engine, 1)
+    index.load()
+    assert not index.preloaded
+
+    queries: list[str] = []
+
+    def count_queries(conn, cursor, statement: str, *args) -> None:
+        queries.append(statement)
+
+    engine = get_engine(cache_engine.engine_url)
+    event.listen(engine, "after_cursor_execute", count_queries)
+    try:
+        # files are looked up in path order, one range query serves two of them
+        sizes = [index.get(path) for path in ["a", "b", "b0", "c", "d", "e", "f"]]
+    finally:
+        event.remove(engine, "after_cursor_execute", count_queries)
+
+    assert [0, 1, None, 2, 3, 4, None] == [
+        cached.size if cached else None for cached in sizes
+    ]
+    assert 3 == len(queries)
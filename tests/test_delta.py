@@ -0,0 +1,47 @@
+import io
+from pathlib import Path
+
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+
+from synchrotron.delta import BLOCK_SIGNATURE_SIZE, compute_signature, delta_copy
+
+BLOCK = 8
+
+
+@pytest.mark.parametrize(
+    "target_content, source_content, expected_bytes_written",
+    [
+        (b"a" * 32, b"a" * 32, 0),
+        (b"a" * 32, b"a" * 8 + b"b" + b"a" * 23, 8),
+        (b"a" * 32, b"a" * 20, 4),
+        (b"a" * 32, b"a" * 36, 4),
+        (b"a" * 20, b"b" * 20, 20),
+        (b"", b"a" * 10, 10),
+    ],
+)
+def test_delta_copy(
+    tmp_path: Path,
+    target_content: bytes,
+    source_content: bytes,
+    expected_bytes_written: int,
+):
+    (tmp_path / "source").write_bytes(source_content)
+    (tmp_path / "target").write_bytes(target_content)
+
+    result = delta_copy(
+        LocalFileSystem(), str(tmp_path / "source"), str(tmp_path / "target"), BLOCK
+    )
+
+    assert source_content == (tmp_path / "target").read_bytes()
+    assert expected_bytes_written == result.bytes_written
+    assert compute_signature(io.BytesIO(source_content), BLOCK) == result.signature
+
+
+def test_compute_signature():
+    signature = compute_signature(io.BytesIO(b"a" * 20), BLOCK)
+    assert 3 * BLOCK_SIGNATURE_SIZE == len(signature)
+    assert (
+        signature[:BLOCK_SIGNATURE_SIZE]
+        == signature[BLOCK_SIGNATURE_SIZE : 2 * BLOCK_SIGNATURE_SIZE]
+    )
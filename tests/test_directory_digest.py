@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.directory_digest import (
+    DirectoryDigestSvc,
+    compute_directory_digests,
+    is_under,
+)
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+
+def snapshots(files: dict[str, int]) -> list[FileSnapshot]:
+    return [
+        FileSnapshot(
+            path,
+            cast(FileInfo, {"name": path, "size": size, "type": "file", "mtime": 0}),
+        )
+        for path, size in sorted(files.items())
+    ]
+
+
+FILES = {"a/b/c": 1, "a/b/d": 2, "a/e": 3, "f/g": 4, "h": 5}
+
+
+def test_compute_directory_digests():
+    digests = compute_directory_digests(snapshots(FILES))
+    assert {"", "a", "a/b", "f"} == digests.keys()
+
+    changed = compute_directory_digests(snapshots(FILES | {"a/b/d": 20}))
+    assert {"", "a", "a/b"} == {
+        path for path in digests if digests[path] != changed[path]
+    }
+
+    # the name of a directory is part of the digest of its parent
+    renamed = compute_directory_digests(snapshots(FILES | {"f/g": 0, "i/g": 4}))
+    moved = compute_directory_digests(snapshots(FILES | {"f/g": 0, "j/g": 4}))
+    assert renamed["i"] == moved["j"]
+    assert renamed[""] != moved[""]
+
+
+@pytest.mark.parametrize(
+    "relative_path, directories, expected_results",
+    [
+        ("a/b/c", {"a"}, True),
+        ("a/b/c", {"a/b"}, True),
+        ("a/b/c", {"a/b/c"}, False),
+        ("ab/c", {"a"}, False),
+        ("c", {""}, True),
+    ],
+)
+def test_is_under(relative_path: str, directories: set[str], expected_results: bool):
+    assert expected_results == is_under(relative_path, directories)
+
+
+def test_directory_digest_svc(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    svc = DirectoryDigestSvc(cache_engine, Storage(id=1), Storage(id=2))
+
+    left, right = svc.skip_unchanged(snapshots(FILES), snapshots(FILES))
+    assert len(FILES) == len(left) == len(right)
+    svc.observe("f/g", "more_recent_left")
+    svc.save()
+
+    svc = DirectoryDigestSvc(cache_engine, Storage(id=1), Storage(id=2))
+    left, right = svc.skip_unchanged(snapshots(FILES), snapshots(FILES))
+    # "f" and the root were not in sync, so they were not stored
+    assert ["f/g", "h"] == [snapshot.relative_path for snapshot in left]
+    svc.save()
+
+    svc = DirectoryDigestSvc(cache_engine, Storage(id=1), Storage(id=2))
+    left, right = svc.skip_unchanged(snapshots(FILES), snapshots(FILES))
+    assert [] == left == right
+
+    svc = DirectoryDigestSvc(cache_engine, Storage(id=1), Storage(id=2))
+    left, right = svc.skip_unchanged(snapshots(FILES | {"a/b/c": 10}), snapshots(FILES))
+    assert ["a/b/c", "a/b/d", "a/e", "h"] == [
+        snapshot.relative_path for snapshot in left
+    ]
@@ -1,8 +1,18 @@
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from typing import Any, cast
 
 import pytest
 
-from synchrotron.filter import assemble_paths
+from synchrotron.configuration.filter import Filter, Filters
+from synchrotron.configuration.storage import Storage
+from synchrotron.filter import (
+    FilterSvc,
+    assemble_paths,
+    compile_filter,
+    meet_filter,
+)
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
 
 
 @pytest.mark.parametrize(
@@ -18,3 +28,112 @@ def test_build_path_prefix(
 ):
     results = assemble_paths(*components)
     assert expected_results == results
+
+
+NOW = datetime(2024, 6, 15, 12, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "filter_kwargs, file_details, expected_results",
+    [
+        ({"min_size": 10}, {"name": "a.txt", "size": 10}, True),
+        ({"min_size": 10}, {"name": "a.txt", "size": 9}, False),
+        ({"max_size": 10}, {"name": "a.txt", "size": 11}, False),
+        ({"extensions": [".md"]}, {"name": "dir.txt/a.md", "size": 1}, True),
+        ({"extensions": ["md"]}, {"name": "a.txt", "size": 1}, False),
+        (
+            {"modified_after": "P1D"},
+            {"name": "a", "mtime": (NOW - timedelta(hours=1)).timestamp()},
+            True,
+        ),
+        (
+            {"modified_after": "P1D"},
+            {"name": "a", "mtime": (NOW - timedelta(days=2)).timestamp()},
+            False,
+        ),
+        (
+            {"modified_before": "P1D"},
+            {"name": "a", "LastModified": NOW - timedelta(days=2)},
+            True,
+        ),
+        (
+            {"created_after": date(2024, 6, 1)},
+            {"name": "a", "created": datetime(2024, 5, 31).timestamp()},
+            False,
+        ),
+    ],
+)
+def test_compile_filter(
+    filter_kwargs: dict[str, Any], file_details: FileInfo, expected_results: bool
+):
+    filter_ = Filter(paths=[Path("a")], **filter_kwargs)
+    results = compile_filter(filter_, NOW)(file_details)
+    assert expected_results == results
+    # one-off checks evaluate the properties without compiling the filter
+    assert expected_results == meet_filter(file_details, filter_, NOW)
+
+
+@pytest.mark.parametrize(
+    "file_path, file_details, expected_results",
+    [
+        ("/base/docs/a.md", {"name": "a.md", "size": 1}, True),
+        ("/base/docs/a.txt", {"name": "a.txt", "size": 1}, False),
+        ("/base/docs/private/a.md", {"name": "a.md", "size": 1}, False),
+        ("/base/other/a.md", {"name": "a.md", "size": 1}, False),
+        ("/base/docs/private/a.md", None, True),
+    ],
+)
+def test_filter_svc_matches(
+    file_path: str, file_details: dict[str, Any] | None, expected_results: bool
+):
+    filters = Filters.model_validate(
+        {
+            "include": [{"paths": ["docs"], "extensions": [".md"]}],
+            "exclude": [{"paths": ["docs/private"]}],
+        }
+    )
+    filter_svc = FilterSvc(filters, Storage(id=1, base_path=Path("/base")), NOW)
+    assert expected_results == filter_svc.matches(
+        file_path, cast(FileInfo | None, file_details)
+    )
+
+
+@pytest.mark.parametrize(
+    "traversal, streaming_expansion",
+    [("listing", False), ("listing", True), ("pruning", False)],
+)
+def test_filter_svc_file_path(
+    tmp_path: Path, traversal: str, streaming_expansion: bool
+):
+    for relative_path in ("a/f.txt", "a/g.txt", "c/h.txt"):
+        (tmp_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative_path).write_text(relative_path)
+
+    filters = Filters.model_validate(
+        {
+            "include": [{"paths": ["a/f.txt", "c"]}],
+            "traversal": traversal,
+            "streaming_expansion": streaming_expansion,
+        }
+    )
+    snapshots = FilterSvc(filters, Storage(id=1, base_path=tmp_path)).snapshots()
+
+    assert ["a/f.txt", "c/h.txt"] == sorted(snap.relative_path for snap in snapshots)
+
+
+@pytest.mark.parametrize(
+    "filters, expected_results",
+    [
+        ({"include": [{"paths": ["a"]}], "traversal": "pruning"}, True),
+        ({"include": [{"paths": ["a", "b"]}], "traversal": "pruning"}, False),
+        ({"include": [{"regex_paths": ["a/.*"]}], "traversal": "pruning"}, False),
+        ({"include": [{"paths": ["a"]}], "traversal": "listing"}, False),
+    ],
+)
+def test_filter_svc_yields_sorted_paths(
+    filters: dict[str, Any], expected_results: bool
+):
+    filter_svc = FilterSvc(
+        Filters.model_validate(filters), Storage(id=1, base_path=Path("/base"))
+    )
+    assert expected_results == filter_svc.yields_sorted_paths()
@@ -0,0 +1,110 @@
+import threading
+import time
+from pathlib import Path
+
+from pydantic import ByteSize
+
+from synchrotron.configuration import OneConfig
+from synchrotron.configuration.fleet import Fleet
+from synchrotron.configuration.storage import Storage
+from synchrotron.fleet import FleetSvc, PairState, load_states
+from synchrotron.transfer import kernel_copy
+from synchrotron.utils.token_bucket import TokenBucket
+
+
+def get_config(tmp_path: Path, left_id: int, right_id: int) -> OneConfig:
+    return OneConfig.model_validate(
+        {
+            "filters": {"include": [{"paths": ["*"]}]},
+            "synchronisation": {},
+            "comparaison": {
+                "type": "size",
+                "cache": "disabled",
+                "actions": {
+                    "only_exist_left": "copy_to_right",
+                    "only_exist_right": "copy_to_left",
+                    "file_is_different": "update_in_right",
+                },
+            },
+            "left": {"id": left_id, "base_path": tmp_path / str(left_id)},
+            "right": {"id": right_id, "base_path": tmp_path / str(right_id)},
+        }
+    )
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10_000)
+    start = time.monotonic()
+    bucket.consume(10_000)
+    bucket.consume(5_000)
+
+    assert time.monotonic() - start >= 0.45
+
+
+def test_kernel_copy_throttled(tmp_path: Path):
+    (tmp_path / "source").write_bytes(b"0123456789")
+    throttled: list[int] = []
+
+    n_bytes = kernel_copy(
+        str(tmp_path / "source"), str(tmp_path / "target"), 4, throttled.append
+    )
+
+    assert 10 == n_bytes
+    assert [4, 4, 2] == throttled
+    assert b"0123456789" == (tmp_path / "target").read_bytes()
+
+
+def test_storages_do_not_share_sync_filesystem_between_threads():
+    filesystems = []
+    thread = threading.Thread(target=lambda: filesystems.append(Storage(id=1).fs))
+    thread.start()
+    thread.join()
+
+    assert Storage(id=2).fs is not filesystems[0]
+
+
+def test_fleet_svc_order(tmp_path: Path):
+    configs = [get_config(tmp_path, 2 * index, 2 * index + 1) for index in range(4)]
+    fleet_svc = FleetSvc(configs, Fleet(priority="duration"))
+    fleet_svc.states = {
+        "0-1": PairState("2024-01-02T00:00:00", 10.0, 100),
+        "2-3": PairState("2024-01-01T00:00:00", 60.0, 10),
+        "4-5": PairState(None, 30.0, 1_000),
+    }
+
+    def order() -> list[str]:
+        return [f"{config.left.id}-{config.right.id}" for config in fleet_svc.order()]
+
+    assert ["6-7", "2-3", "4-5", "0-1"] == order()
+    fleet_svc.config.priority = "changes"
+    assert ["6-7", "4-5", "0-1", "2-3"] == order()
+    fleet_svc.config.priority = "staleness"
+    assert ["6-7", "4-5", "2-3", "0-1"] == order()
+
+
+def test_fleet_svc_run(tmp_path: Path):
+    configs = [get_config(tmp_path, 2 * index, 2 * index + 1) for index in range(3)]
+    for index in range(3):
+        (tmp_path / str(2 * index)).mkdir()
+        (tmp_path / str(2 * index + 1)).mkdir()
+        (tmp_path / str(2 * index) / "file.txt").write_bytes(b"content")
+    state_path = tmp_path / "fleet.json"
+
+    reports = FleetSvc(
+        configs,
+        Fleet(
+            max_concurrent_synchronisations=2,
+            max_concurrent_transfers=1,
+            max_bandwidth=ByteSize(1_000_000),
+            state_path=state_path,
+        ),
+    ).run()
+
+    assert {"0-1", "2-3", "4-5"} == reports.keys()
+    for index in range(3):
+        target = tmp_path / str(2 * index + 1) / "file.txt"
+        assert b"content" == target.read_bytes()
+
+    states = load_states(state_path)
+    assert 7 == states["0-1"].bytes_transferred
+    assert states["0-1"].last_success is not None
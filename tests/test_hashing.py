@@ -0,0 +1,71 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+
+from synchrotron.hashing import (
+    LocalHashingSvc,
+    compare_file_contents,
+    hash_file,
+    hash_local_file,
+)
+
+
+@pytest.fixture
+def fs() -> MemoryFileSystem:
+    fs = MemoryFileSystem()
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    return fs
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_hash_file(fs: MemoryFileSystem, chunk_size: int):
+    fs.pipe("/a", b"some content")
+    expected = hashlib.sha256(b"some content").hexdigest()
+    assert expected == hash_file(fs, "/a", "sha256", chunk_size)
+
+
+@pytest.mark.parametrize(
+    "left_content, right_content, identical",
+    [
+        (b"", b"", True),
+        (b"some content", b"some content", True),
+        (b"some content", b"some contend", False),
+        (b"some content", b"some", False),
+    ],
+)
+def test_compare_file_contents(
+    fs: MemoryFileSystem, left_content: bytes, right_content: bytes, identical: bool
+):
+    fs.pipe("/left", left_content)
+    fs.pipe("/right", right_content)
+
+    digest = compare_file_contents(fs, "/left", fs, "/right", "sha256", 4)
+    if identical:
+        assert hashlib.sha256(left_content).hexdigest() == digest
+    else:
+        assert digest is None
+
+
+@pytest.mark.parametrize("content", [b"", b"some content", bytes(range(256)) * 100])
+def test_hash_local_file(tmp_path: Path, content: bytes):
+    path = tmp_path / "file"
+    path.write_bytes(content)
+    expected = hashlib.sha256(content).hexdigest()
+    assert expected == hash_local_file(str(path), "sha256", 1000)
+
+
+def test_local_hashing_svc_keeps_order(tmp_path: Path):
+    contents = [str(i).encode() * i for i in range(10)]
+    paths = []
+    for i, content in enumerate(contents):
+        path = tmp_path / str(i)
+        path.write_bytes(content)
+        paths.append(str(path))
+
+    with LocalHashingSvc(max_workers=2) as hashing_svc:
+        digests = list(hashing_svc.hash_files(paths, "sha256", 4))
+
+    assert [hashlib.sha256(content).hexdigest() for content in contents] == digests
@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import cast
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import sqlite
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.comparaison.incremental_scan import IncrementalScan
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.scan_state import (
+    ScanState,
+    load_directory_aggregates,
+    load_scan_state,
+)
+from synchrotron.database.utils import create_db
+from synchrotron.database.writer import StorageFileWriter
+from synchrotron.incremental_scan import (
+    IncrementalScanSvc,
+    get_directory_aggregates,
+    get_watermark,
+)
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+OLD = datetime(2024, 6, 15, 12)
+
+
+def snapshots(files: dict[str, tuple[int, datetime]]) -> list[FileSnapshot]:
+    return [
+        FileSnapshot(
+            path,
+            cast(
+                FileInfo,
+                {
+                    "name": path,
+                    "size": size,
+                    "type": "file",
+                    "mtime": modified.timestamp(),
+                },
+            ),
+        )
+        for path, (size, modified) in sorted(files.items())
+    ]
+
+
+FILES = {
+    "a/b": (1, OLD - timedelta(hours=3)),
+    "a/c": (2, OLD - timedelta(hours=2)),
+    "d/e": (3, OLD - timedelta(hours=1)),
+    "f": (4, OLD),
+}
+
+
+def test_get_directory_aggregates():
+    assert {"a": (2, 3), "d": (1, 3), "": (1, 4)} == get_directory_aggregates(
+        snapshots(FILES)
+    )
+
+
+@pytest.mark.parametrize(
+    "files, expected_results",
+    [
+        (FILES, OLD),
+        (FILES | {"g": (5, OLD + timedelta(days=1))}, OLD + timedelta(days=1)),
+        # modification times in the future are capped to the start of the run
+        (FILES | {"g": (5, datetime(2100, 1, 1))}, datetime(2030, 1, 1)),
+        ({}, None),
+    ],
+)
+def test_get_watermark(
+    files: dict[str, tuple[int, datetime]], expected_results: datetime | None
+):
+    started_at = datetime(2030, 1, 1).astimezone()
+    assert expected_results == get_watermark(snapshots(files), started_at)
+
+
+def record(cache_engine: DatabaseCacheEngine, storage: Storage, files: dict) -> None:
+    with StorageFileWriter(cache_engine) as writer:
+        for path, (size, modified) in files.items():
+            writer.upsert(storage, path, modified, size)
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "other"])
+def test_load_directory_aggregates(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, dialect: str
+):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    files = FILES | {"a/b/c/d": (6, OLD), "a/b/c/e": (7, OLD)}
+    record(cache_engine, Storage(id=1), files)
+    record(cache_engine, Storage(id=2), {"h": (8, OLD)})
+    if dialect == "other":
+        # other dialects group the streamed records
+        monkeypatch.setattr(sqlite.dialect, "name", "other")
+
+    assert get_directory_aggregates(snapshots(files)) == load_directory_aggregates(
+        cache_engine, 1
+    )
+
+
+def test_incremental_scan_svc(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    left, right = Storage(id=1), Storage(id=2)
+    config = IncrementalScan(full_scan_every=timedelta(days=1))
+
+    # the first run is a full scan
+    svc = IncrementalScanSvc(cache_engine, config, left, right)
+    selected = svc.select(snapshots(FILES), snapshots(FILES))
+    assert (len(FILES), len(FILES)) == tuple(map(len, selected))
+    record(cache_engine, left, FILES)
+    record(cache_engine, right, FILES)
+    svc.save()
+    assert OLD == load_scan_state(cache_engine, left.id).watermark
+
+    new = OLD + timedelta(hours=1)
+    left_files = FILES | {"a/c": (2, new + timedelta(hours=1)), "g": (5, new)}
+    right_files = {path: file for path, file in FILES.items() if path != "d/e"}
+
+    svc = IncrementalScanSvc(cache_engine, config, left, right)
+    left_selected, right_selected = svc.select(
+        snapshots(left_files), snapshots(right_files)
+    )
+    # "f" was modified at the watermark, "d/e" was deleted on the right side
+    assert ["a/c", "d/e", "f", "g"] == [snap.relative_path for snap in left_selected]
+    assert ["a/c", "f"] == [snap.relative_path for snap in right_selected]
+    assert not svc.full_scan
+
+    # "g" could not be transferred, the watermark stays before it
+    for left_snapshot in left_selected:
+        svc.observe(left_snapshot, left_snapshot, "created_left")
+    for path in ("a/c", "d/e", "f"):
+        svc.resolve(path)
+    svc.save()
+    state = load_scan_state(cache_engine, left.id)
+    assert new == state.watermark
+    assert state.last_full_scan is not None
+
+
+def test_full_scan_is_due(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    svc = IncrementalScanSvc(
+        cache_engine,
+        IncrementalScan(full_scan_every=timedelta(days=1)),
+        Storage(id=1),
+        Storage(id=2),
+    )
+
+    assert svc.is_full_scan_due(ScanState(None, datetime.now()))
+    assert svc.is_full_scan_due(ScanState(OLD, OLD))
+    assert not svc.is_full_scan_due(ScanState(OLD, datetime.now()))
+
+
+def test_migrate_storage_scan_columns(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE storage (id INTEGER PRIMARY KEY, type VARCHAR, "
+                "base_path VARCHAR, created_at DATETIME)"
+            )
+        )
+
+    create_db(engine)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT watermark, last_full_scan FROM storage"))
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from pathlib import Path
+
+from synchrotron.configuration.filter import Filters
+from synchrotron.configuration.storage import Storage
+from synchrotron.filter import FilterSvc
+from synchrotron.journal import CursorTracker, RunJournal
+
+
+def test_cursor_tracker():
+    tracker = CursorTracker()
+    for path in ("a", "b", "c"):
+        tracker.start(path)
+
+    assert [] == tracker.finish("b")
+    assert tracker.cursor is None
+    assert ["a", "b"] == tracker.finish("a")
+    assert "b" == tracker.cursor
+
+    tracker.exhausted = True
+    assert not tracker.done
+    assert ["c"] == tracker.finish("c")
+    assert tracker.done
+
+
+def test_run_journal_checkpoint(tmp_path: Path):
+    path = tmp_path / "journal.json"
+    journal = RunJournal(path, "fingerprint", checkpoint_every=timedelta(0))
+
+    left = journal.tracker("0:", 1)
+    right = journal.tracker("0:", 2)
+    for relative_path in ("a", "b", "c"):
+        journal.start(left, relative_path)
+        journal.start(right, relative_path)
+    journal.complete("b")
+    journal.finish("a")
+    journal.complete("c")
+    journal.finish("d")
+
+    flushed = []
+    journal.checkpoint_if_due(lambda: flushed.append(True))
+    assert [True] == flushed
+
+    resumed = RunJournal.load(path, "fingerprint")
+    assert {"0:": "c"} == resumed.cursors
+    # files before the cursors are not walked again, they are not kept
+    assert set() == resumed.completed
+
+    assert {} == RunJournal.load(path, "other fingerprint").cursors
+
+
+def test_run_journal_walked(tmp_path: Path):
+    path = tmp_path / "journal.json"
+    journal = RunJournal(path, "fingerprint")
+    tracker = journal.tracker("0:", 1)
+    journal.start(tracker, "a")
+    journal.complete("a")
+    tracker.exhausted = True
+    journal.save()
+
+    resumed = RunJournal.load(path, "fingerprint")
+    assert {"0:"} == resumed.walked
+    assert {} == resumed.cursors
+
+    journal.remove()
+    assert not path.exists()
+
+
+def test_filter_svc_resumes_walk(tmp_path: Path):
+    base_path = tmp_path / "storage"
+    for relative_path in ("a/1", "a/2", "b/1", "b/2", "c"):
+        (base_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (base_path / relative_path).write_text(relative_path)
+
+    filters = Filters.model_validate(
+        {"include": [{"paths": ["*"]}], "traversal": "pruning"}
+    )
+    storage = Storage(id=1, base_path=base_path)
+    journal_path = tmp_path / "journal.json"
+
+    journal = RunJournal(journal_path, "fingerprint")
+    walk = FilterSvc(filters, storage, journal=journal).snapshots()
+    for _ in range(3):
+        journal.finish(next(walk).relative_path)
+    journal.save()
+
+    journal = RunJournal.load(journal_path, "fingerprint")
+    snapshots = FilterSvc(filters, storage, journal=journal).snapshots()
+    assert ["b/2", "c"] == [snap.relative_path for snap in snapshots]
@@ -0,0 +1,141 @@
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+
+from synchrotron.configuration.filter import Filters
+from synchrotron.configuration.storage import Storage
+from synchrotron.filter import FilterSvc
+from synchrotron.listing_cache import ListingCache
+
+
+class CountingFileSystem(MemoryFileSystem):
+    """In-memory filesystem counting the listings asked to it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls: Counter[tuple[str, str]] = Counter()
+
+    def ls(self, path, detail=True, **kwargs):
+        self.calls["ls", path] += 1
+        return super().ls(path, detail=detail, **kwargs)
+
+    def find(self, path, maxdepth=None, withdirs=False, detail=False, **kwargs):
+        self.calls["find", path] += 1
+        return super().find(
+            path, maxdepth=maxdepth, withdirs=withdirs, detail=detail, **kwargs
+        )
+
+    def glob(self, path, maxdepth=None, **kwargs):
+        self.calls["glob", path] += 1
+        return super().glob(path, maxdepth=maxdepth, **kwargs)
+
+
+@pytest.fixture
+def storage(monkeypatch: pytest.MonkeyPatch) -> Storage:
+    fs = CountingFileSystem(skip_instance_cache=True)
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    for path in ("/r/a/b/c", "/r/a/d", "/r/e"):
+        fs.pipe(path, b"content")
+
+    storage = Storage(id=1, name="memory", base_path=Path("/r"))
+    monkeypatch.setitem(storage.__dict__, "fs", fs)
+    return storage
+
+
+def test_listing_cache_ls(storage: Storage):
+    listing_cache = ListingCache()
+
+    first = listing_cache.ls(storage, "/r/a")
+    assert first == listing_cache.ls(storage, "/r/a")
+    assert 1 == storage.fs.calls["ls", "/r/a"]
+
+
+def test_listing_cache_ls_bounded(storage: Storage):
+    listing_cache = ListingCache(max_directories=1)
+
+    listing_cache.ls(storage, "/r/a")
+    listing_cache.ls(storage, "/r/a/b")
+    listing_cache.ls(storage, "/r/a")
+
+    assert 2 == storage.fs.calls["ls", "/r/a"]
+
+
+def test_listing_cache_find_from_parent(storage: Storage):
+    listing_cache = ListingCache()
+
+    listing_cache.find(storage, "/r")
+    assert ["/r/a/b/c", "/r/a/d"] == sorted(listing_cache.find(storage, "/r/a"))
+    assert ["/r/a/b/c"] == list(listing_cache.find(storage, "/r/a/b/c"))
+
+    assert 1 == storage.fs.calls["find", "/r"]
+    assert 0 == storage.fs.calls["find", "/r/a"]
+
+
+def test_listing_cache_find_bounded(storage: Storage):
+    listing_cache = ListingCache(max_directories=1)
+
+    listing_cache.find(storage, "/r/a")
+    listing_cache.find(storage, "/r/e")
+    listing_cache.find(storage, "/r/a/d")
+
+    assert 1 == storage.fs.calls["find", "/r/a"]
+    assert 1 == storage.fs.calls["find", "/r/a/d"]
+
+
+def test_listing_cache_glob(storage: Storage):
+    listing_cache = ListingCache()
+    glob = listing_cache.globber(storage)
+
+    assert ["/r/a", "/r/e"] == sorted(glob("/r/*"))
+    assert ["/r/a", "/r/e"] == sorted(glob("/r/*", detail=True))
+    assert 1 == storage.fs.calls["glob", "/r/*"]
+
+
+@pytest.mark.parametrize("traversal", ["listing", "pruning"])
+@pytest.mark.parametrize("listing_cache_size", [None, 10])
+def test_filter_svc_shares_listings(
+    storage: Storage, traversal: str, listing_cache_size: int | None
+):
+    filters = Filters.model_validate(
+        {
+            "include": [{"paths": ["*"]}, {"paths": ["a/*"]}, {"paths": ["a"]}],
+            "traversal": traversal,
+            "listing_cache_size": listing_cache_size,
+        }
+    )
+    snapshots = FilterSvc(filters, storage).snapshots()
+
+    # files matching several include filters are yielded once
+    assert ["a/b/c", "a/d", "e"] == sorted(snap.relative_path for snap in snapshots)
+    if traversal == "listing":
+        assert 1 == storage.fs.calls["glob", "/r/*"]
+        assert 1 == storage.fs.calls["find", "/r/a"]
+    else:
+        assert 1 == storage.fs.calls["ls", "/r/a"]
+
+
+@pytest.mark.parametrize(
+    "listing_cache_size, dedup_max_paths, deduplicated",
+    [(1, None, True), (None, 1, False)],
+)
+def test_filter_svc_dedup_max_paths(
+    storage: Storage,
+    listing_cache_size: int | None,
+    dedup_max_paths: int | None,
+    deduplicated: bool,
+):
+    filters = Filters.model_validate(
+        {
+            "include": [{"paths": ["*"]}, {"paths": ["a/*"]}],
+            "listing_cache_size": listing_cache_size,
+            "dedup_max_paths": dedup_max_paths,
+        }
+    )
+    paths = [snap.relative_path for snap in FilterSvc(filters, storage).snapshots()]
+
+    # the deduplication is only bounded by its own setting
+    assert ["a/b/c", "a/d", "e"] == sorted(set(paths))
+    assert deduplicated == (3 == len(paths))
@@ -0,0 +1,21 @@
+import pytest
+
+from synchrotron.utils.merge_join import merge_join
+
+
+@pytest.mark.parametrize(
+    "left, right, expected_results",
+    [
+        (["a", "c"], ["b", "c"], [("a", None), (None, "b"), ("c", "c")]),
+        ([], ["a"], [(None, "a")]),
+        (["a", "b"], [], [("a", None), ("b", None)]),
+    ],
+)
+def test_merge_join(
+    left: list[str],
+    right: list[str],
+    expected_results: list[tuple[str | None, str | None]],
+):
+    pairs = merge_join(left, right, key=lambda item: item)
+    results = list(pairs)
+    assert expected_results == results
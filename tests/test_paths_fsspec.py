@@ -0,0 +1,115 @@
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+from synchrotron.utils.paths_fsspec import (
+    GlobPattern,
+    expand_paths,
+    stream_expand_paths,
+    walk_directories,
+)
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected_results",
+    [
+        ("/a/b", "/a/b", True),
+        ("/a/b", "/a/b/c/d", True),
+        ("/a/b", "/a/bc", False),
+        ("/a/b*", "/a/bc/d", True),
+        ("/a/b*", "/a/c/b", False),
+        ("/a/**/x", "/a/b/c/x/y", True),
+    ],
+)
+def test_glob_pattern_covers(pattern: str, path: str, expected_results: bool):
+    assert expected_results == GlobPattern(pattern).covers(path)
+
+
+@pytest.mark.parametrize(
+    "pattern, directory, expected_results",
+    [
+        ("/a/*/c", "/a", True),
+        ("/a/*/c", "/a/b", True),
+        ("/a/*/c", "/a/b/c/d", True),
+        ("/a/*/c", "/a/b/d", False),
+        ("/a/b", "/c", False),
+        ("/a/**/x", "/a/b/c", True),
+    ],
+)
+def test_glob_pattern_may_contain(pattern: str, directory: str, expected_results: bool):
+    assert expected_results == GlobPattern(pattern).may_contain(directory)
+
+
+def test_walk_directories():
+    fs = MemoryFileSystem(skip_instance_cache=True)
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    for path in ["/r/a.txt", "/r/a/b", "/r/skip/c", "/r/z"]:
+        fs.pipe(path, b"data")
+
+    results = [
+        path
+        for path, _ in walk_directories(
+            fs, "/r", prune=lambda directory: directory.endswith("skip")
+        )
+    ]
+    assert ["/r/a.txt", "/r/a/b", "/r/z"] == results
+
+
+def test_walk_directories_removed_directory():
+    fs = MemoryFileSystem(skip_instance_cache=True)
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    for path in ["/r/a/b", "/r/z"]:
+        fs.pipe(path, b"data")
+
+    def ls(path: str) -> list[FileInfo]:
+        if path == "/r/a":
+            raise FileNotFoundError(path)
+        return fs.ls(path, detail=True)
+
+    assert ["/r/z"] == [path for path, _ in walk_directories(fs, "/r", ls=ls)]
+
+
+def test_walk_directories_file():
+    fs = MemoryFileSystem(skip_instance_cache=True)
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    fs.pipe("/r/a.txt", b"data")
+
+    assert ["/r/a.txt"] == [path for path, _ in walk_directories(fs, "/r/a.txt")]
+
+
+@pytest.mark.parametrize(
+    "paths",
+    [
+        ["/r"],
+        ["/r/a*"],
+        ["/r/a*", "/r/f"],
+        ["/r/a", "/r"],
+        ["/r/*/*"],
+        ["/r/a.txt", "/r/f"],
+    ],
+)
+def test_stream_expand_paths(paths: list[str]):
+    fs = MemoryFileSystem(skip_instance_cache=True)
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    for path in ["/r/a.txt", "/r/a/b/c", "/r/a/d", "/r/ab/e", "/r/f/g"]:
+        fs.pipe(path, b"data")
+
+    listed_directories: list[str] = []
+
+    def ls(path: str):
+        listed_directories.append(path)
+        return fs.ls(path, detail=True)
+
+    expected_results = sorted(
+        set(expand_paths(fs, paths, recursive=True, maxdepth=None, detail=False))
+    )
+    results = [
+        path
+        for path, _ in stream_expand_paths(fs, paths, recursive=True, ls=ls, sort=True)
+    ]
+    assert expected_results == results
+    assert len(listed_directories) == len(set(listed_directories))
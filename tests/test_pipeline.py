@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from synchrotron.pipeline import Pipeline, PipelineStopped, Stage
+
+
+def test_pipeline():
+    pipeline = Pipeline(
+        range(100),
+        [
+            Stage("double", lambda item: 2 * item, workers=4, queue_size=5),
+            Stage("increment", lambda item: item + 1, workers=2, queue_size=5),
+        ],
+        output_queue_size=5,
+    )
+
+    assert [2 * item + 1 for item in range(100)] == sorted(pipeline)
+    assert [100, 100, 100] == [stats.items for stats in pipeline.stats]
+
+
+def test_pipeline_backpressure():
+    produced = []
+
+    def source():
+        for item in range(100):
+            produced.append(item)
+            yield item
+
+    pipeline = Pipeline(
+        source(),
+        [Stage("identity", lambda item: item, workers=2, queue_size=3)],
+        output_queue_size=3,
+    )
+    items = iter(pipeline)
+    next(items)
+    time.sleep(0.3)
+
+    # queues, workers and the source each hold at most a few items
+    assert len(produced) <= 3 + 2 + 3 + 2
+    items.close()
+
+
+def test_pipeline_without_stages():
+    produced = []
+
+    def source():
+        for item in range(100):
+            produced.append(item)
+            yield item
+
+    items = iter(Pipeline(source(), [], output_queue_size=3))
+    assert 0 == next(items)
+    time.sleep(0.3)
+
+    # the source runs ahead of the consumer by the size of the queue at most
+    assert len(produced) <= 1 + 3 + 1
+    assert list(range(1, 100)) == list(items)
+
+
+def test_pipeline_error():
+    def fail(item: int) -> int:
+        if item == 50:
+            raise ValueError("item 50")
+        return item
+
+    pipeline = Pipeline(range(100), [Stage("fail", fail, workers=3)])
+    with pytest.raises(ValueError, match="item 50"):
+        list(pipeline)
+
+
+# the interruption is raised again in the thread of the stage
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_pipeline_interrupted():
+    def interrupt(item: int) -> int:
+        if item == 50:
+            raise SystemExit()
+        return item
+
+    pipeline = Pipeline(range(100), [Stage("interrupt", interrupt, workers=3)])
+    # an interruption is not an error of the stage
+    with pytest.raises(PipelineStopped):
+        list(pipeline)
+
+
+def test_pipeline_stops_threads():
+    threads_before = threading.active_count()
+    items = iter(Pipeline(range(10_000), [Stage("identity", lambda item: item, 4, 2)]))
+    next(items)
+    items.close()
+
+    assert threads_before == threading.active_count()
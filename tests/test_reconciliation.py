@@ -0,0 +1,146 @@
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import cast
+
+from sqlalchemy import insert
+
+from synchrotron.comparaison import ComparaisonSvc
+from synchrotron.configuration.comparaison import DateTimeSizeCacheComparaison
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.models.storage_file import StorageFile
+from synchrotron.database.utils import ensure_storage, session_manager
+from synchrotron.reconciliation import Comparaison, RenameReconciliationSvc
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+from synchrotron.transfer import Transfer
+
+MODIFIED = datetime(2024, 6, 15, 12)
+
+
+def get_config(tmp_path: Path) -> DateTimeSizeCacheComparaison:
+    return DateTimeSizeCacheComparaison.model_validate(
+        {
+            "type": "datetime_size",
+            "time_zone_shift": "+00:00",
+            "cache": "enabled",
+            "cache_engine": {
+                "cache_engine": "database",
+                "engine_url": f"sqlite:///{tmp_path / 'cache.db'}",
+            },
+            "actions": {
+                "created_left": "copy_to_right",
+                "created_right": "copy_to_left",
+                "more_recent_left": "update_in_right",
+                "more_recent_right": "update_in_left",
+                "removed_left": "remove_in_right",
+                "removed_right": "remove_in_left",
+            },
+        }
+    )
+
+
+def get_reconciliation_svc(
+    tmp_path: Path, config: DateTimeSizeCacheComparaison, max_held: int = 10_000
+) -> RenameReconciliationSvc:
+    storage_left = Storage(id=1, base_path=tmp_path / "left")
+    storage_right = Storage(id=2, base_path=tmp_path / "right")
+    cache_engine = config.cache_engine
+    assert isinstance(cache_engine, DatabaseCacheEngine)
+    with session_manager(cache_engine, autocommit=True) as session:
+        ensure_storage(session, storage_left)
+        session.execute(
+            insert(StorageFile),
+            [
+                {
+                    "storage_id": 1,
+                    "relative_path": path,
+                    "modified_datetime": MODIFIED,
+                    "size": size,
+                    "content_hash": None,
+                }
+                for path, size in [("old/a", 5), ("old/b", 6)]
+            ],
+        )
+
+    return RenameReconciliationSvc(
+        ComparaisonSvc(config, storage_left, storage_right), 1024, max_held
+    )
+
+
+def file_info(size: int, mtime: float = MODIFIED.timestamp()) -> FileInfo:
+    return cast(FileInfo, {"name": "", "size": size, "type": "file", "mtime": mtime})
+
+
+def removed_left(path: str) -> Comparaison:
+    return FileSnapshot(path, None), FileSnapshot(path, file_info(5, 0)), "removed_left"
+
+
+def created_left(path: str, size: int) -> Comparaison:
+    return FileSnapshot(path, file_info(size)), FileSnapshot(path, None), "created_left"
+
+
+def test_reconcile(tmp_path: Path):
+    reconciliation_svc = get_reconciliation_svc(tmp_path, get_config(tmp_path))
+    comparaisons = [
+        removed_left("old/a"),
+        removed_left("old/b"),
+        created_left("new/a", 5),
+        created_left("new/c", 7),
+    ]
+
+    results = list(reconciliation_svc.reconcile(comparaisons))
+
+    assert Transfer("old/a", "move", "move", "right", "new/a") in results
+    assert comparaisons[1] in results
+    assert comparaisons[3] in results
+    assert 3 == len(results)
+
+
+def test_reconcile_created_before_removed(tmp_path: Path):
+    reconciliation_svc = get_reconciliation_svc(tmp_path, get_config(tmp_path))
+    comparaisons = [
+        removed_left("old/b"),
+        created_left("new/a", 5),
+        removed_left("old/a"),
+    ]
+
+    results = list(reconciliation_svc.reconcile(comparaisons))
+
+    assert [
+        Transfer("old/a", "move", "move", "right", "new/a"),
+        comparaisons[0],
+    ] == results
+
+
+def test_reconcile_streams_created(tmp_path: Path):
+    reconciliation_svc = get_reconciliation_svc(tmp_path, get_config(tmp_path))
+    consumed: list[str] = []
+
+    def comparaisons() -> Iterator[Comparaison]:
+        for i in range(3):
+            consumed.append(f"new/{i}")
+            yield created_left(f"new/{i}", i)
+
+    results = reconciliation_svc.reconcile(comparaisons())
+
+    # without removed files to pair them with, created files are not held
+    assert created_left("new/0", 0) == next(results)
+    assert ["new/0"] == consumed
+
+
+def test_reconcile_max_held(tmp_path: Path):
+    reconciliation_svc = get_reconciliation_svc(
+        tmp_path, get_config(tmp_path), max_held=1
+    )
+    comparaisons = [
+        removed_left("old/a"),
+        removed_left("old/b"),
+        created_left("new/a", 5),
+    ]
+
+    results = list(reconciliation_svc.reconcile(comparaisons))
+
+    # old/a was released to make room for old/b before new/a came
+    assert comparaisons == results
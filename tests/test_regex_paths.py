@@ -0,0 +1,26 @@
+import pytest
+
+from synchrotron.utils.regex_paths import RegexPaths, literal_directory_prefix
+
+
+@pytest.mark.parametrize(
+    "pattern, expected_results",
+    [
+        (r"projects/[0-9]{4}/raw/.*\.tif", "projects"),
+        (r"^a/b\.d/c?/x", "a/b.d"),
+        (r"abc/de*/f", "abc"),
+        (r"a/b|c/d", ""),
+        (r"(a|b)/c", ""),
+        (r"\d+/a", ""),
+    ],
+)
+def test_literal_directory_prefix(pattern: str, expected_results: str):
+    assert expected_results == literal_directory_prefix(pattern)
+
+
+def test_regex_paths():
+    regex_paths = RegexPaths("/root", [r"a/b/.*\.tif", r"a/c/.*", r"a/b/x/.*"])
+    assert ["/root/a/b", "/root/a/c"] == regex_paths.listing_roots
+    assert regex_paths.covers("/root/a/b/d/e.tif")
+    assert not regex_paths.covers("/root/a/b/e.tif.bak")
+    assert not regex_paths.covers("/other/a/c/e")
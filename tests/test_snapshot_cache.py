@@ -0,0 +1,111 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from synchrotron.configuration.comparaison.cache_engines import SnapshotCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.schema.molecules.cached_storage_file import CachedStorageFile
+from synchrotron.snapshot_cache import (
+    SnapshotCacheWriter,
+    SnapshotReader,
+    log_path,
+    snapshot_path,
+    write_snapshot,
+)
+
+MODIFIED = datetime(2024, 6, 15, 12, 30, 15, 123456)
+PATHS = ["a", "a/b", "a/é", "a0", "b/c", "z"]
+
+
+@pytest.fixture
+def snapshot(tmp_path: Path) -> Path:
+    path = tmp_path / "storage.snapshot"
+    write_snapshot(
+        path,
+        [
+            (
+                relative_path,
+                CachedStorageFile(MODIFIED, i, f"sha256:{i}" if i else None),
+            )
+            for i, relative_path in enumerate(PATHS)
+        ],
+    )
+    return path
+
+
+@pytest.mark.parametrize(
+    "relative_path, expected_results",
+    [
+        ("a", CachedStorageFile(MODIFIED, 0, None)),
+        ("a/é", CachedStorageFile(MODIFIED, 2, "sha256:2")),
+        ("z", CachedStorageFile(MODIFIED, 5, "sha256:5")),
+        ("a/", None),
+        ("0", None),
+        ("zz", None),
+    ],
+)
+def test_snapshot_reader_get(snapshot: Path, relative_path: str, expected_results):
+    with SnapshotReader(snapshot) as reader:
+        assert expected_results == reader.get(relative_path)
+
+
+def test_snapshot_reader_missing_file(tmp_path: Path):
+    with SnapshotReader(tmp_path / "missing.snapshot") as reader:
+        assert 0 == len(reader)
+        assert reader.get("a") is None
+
+
+def test_snapshot_cache_writer(tmp_path: Path):
+    cache_engine = SnapshotCacheEngine(directory=tmp_path)
+    storage = Storage(id=1)
+
+    with SnapshotCacheWriter(cache_engine) as writer:
+        for i, relative_path in enumerate(PATHS):
+            writer.upsert(storage, relative_path, MODIFIED, i)
+
+    with SnapshotCacheWriter(cache_engine) as writer:
+        writer.upsert(storage, "a0", MODIFIED, 10, "sha256:abc")
+        writer.upsert(storage, "new", MODIFIED, 11)
+        writer.delete(storage, "a/b")
+        writer.delete(storage, "unknown")
+
+    with SnapshotReader(snapshot_path(cache_engine, storage.id)) as reader:
+        records = {path: cached.size for path, cached in reader}
+        assert CachedStorageFile(MODIFIED, 10, "sha256:abc") == reader.get("a0")
+
+    assert {"a": 0, "a/é": 2, "a0": 10, "b/c": 4, "new": 11, "z": 5} == records
+    assert list(records) == sorted(records)
+    assert [snapshot_path(cache_engine, storage.id)] == list(tmp_path.iterdir())
+
+
+def test_snapshot_cache_writer_checkpoint(tmp_path: Path):
+    cache_engine = SnapshotCacheEngine(directory=tmp_path)
+    storage = Storage(id=1)
+    path = snapshot_path(cache_engine, storage.id)
+    with SnapshotCacheWriter(cache_engine) as writer:
+        writer.upsert(storage, "a", MODIFIED, 1)
+        writer.upsert(storage, "b", MODIFIED, 2)
+
+    writer = SnapshotCacheWriter(cache_engine)
+    writer.upsert(storage, "a", MODIFIED, 10, "sha256:abc")
+    writer.delete(storage, "b")
+    writer.checkpoint()
+    writer.upsert(storage, "c", MODIFIED, 3)
+    writer.checkpoint()
+
+    # checkpoints leave the snapshot as is
+    with SnapshotReader(path) as reader:
+        assert {"a": 1, "b": 2} == {path: cached.size for path, cached in reader}
+    log = log_path(cache_engine, storage.id)
+    assert 3 == len(log.read_text().splitlines())
+
+    # a change torn by a stop is ignored
+    with open(log, "a") as file:
+        file.write('["d", 4, ')
+    writer.flush()
+
+    with SnapshotReader(path) as reader:
+        assert CachedStorageFile(MODIFIED, 10, "sha256:abc") == reader.get("a")
+        assert {"a": 10, "c": 3} == {path: cached.size for path, cached in reader}
+    assert not log.exists()
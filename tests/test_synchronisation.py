@@ -0,0 +1,117 @@
+from pathlib import Path
+
+import pytest
+
+from synchrotron.configuration import OneConfig
+from synchrotron.synchronisation import synchronise
+
+
+def get_cache_config(
+    tmp_path: Path,
+    engine: str,
+    filters: dict | None = None,
+    synchronisation: dict | None = None,
+) -> OneConfig:
+    return OneConfig.model_validate(
+        {
+            "filters": filters or {"include": [{"paths": ["*"]}]},
+            "synchronisation": synchronisation or {},
+            "comparaison": {
+                "type": "datetime_size",
+                "time_zone_shift": "+00:00",
+                "cache": "enabled",
+                "engine": engine,
+                "cache_engine": {
+                    "cache_engine": "database",
+                    "engine_url": f"sqlite:///{tmp_path / 'cache.db'}",
+                },
+                "actions": {
+                    "created_left": "copy_to_right",
+                    "created_right": "copy_to_left",
+                    "more_recent_left": "update_in_right",
+                    "more_recent_right": "update_in_left",
+                    "removed_left": "remove_in_right",
+                    "removed_right": "remove_in_left",
+                },
+            },
+            "left": {"id": 1, "base_path": tmp_path / "left"},
+            "right": {"id": 2, "base_path": tmp_path / "right"},
+        }
+    )
+
+
+@pytest.mark.parametrize("engine", ["per_file", "merge_join"])
+def test_synchronise_changed_file_with_cache(tmp_path: Path, engine: str):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "a.txt").write_bytes(b"a")
+    config = get_cache_config(tmp_path, engine)
+
+    synchronise(config)
+    assert 0 == synchronise(config).n_transfers
+
+    with open(tmp_path / "left" / "a.txt", "ab") as file:
+        file.write(b"appended")
+    report = synchronise(config)
+
+    assert (1, 0) == (report.n_transfers, report.n_errors)
+    assert b"aappended" == (tmp_path / "right" / "a.txt").read_bytes()
+
+
+def test_synchronise_without_cache_settles(tmp_path: Path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "a.txt").write_bytes(b"a")
+    config = OneConfig.model_validate(
+        {
+            "filters": {"include": [{"paths": ["*"]}]},
+            "synchronisation": {},
+            "comparaison": {
+                "type": "datetime_size",
+                "time_zone_shift": "+00:00",
+                "cache": "disabled",
+                "actions": {
+                    "only_exist_left": "copy_to_right",
+                    "only_exist_right": "copy_to_left",
+                    "more_recent_left": "update_in_right",
+                    "more_recent_right": "update_in_left",
+                },
+            },
+            "left": {"id": 1, "base_path": tmp_path / "left"},
+            "right": {"id": 2, "base_path": tmp_path / "right"},
+        }
+    )
+
+    assert 1 == synchronise(config).n_transfers
+    # the copy has the modification time of its source, it is not copied back
+    assert 0 == synchronise(config).n_transfers
+
+
+@pytest.mark.parametrize("include_paths", [["docs"], ["docs", "src"]])
+def test_synchronise_pipelined_merge_join(tmp_path: Path, include_paths: list[str]):
+    for relative_path in ("docs/a", "docs/b/c", "docs/b.txt", "src/d"):
+        (tmp_path / "left" / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / "left" / relative_path).write_text(relative_path)
+    (tmp_path / "right" / "docs").mkdir(parents=True)
+    (tmp_path / "right" / "docs" / "e").write_text("e")
+    config = get_cache_config(
+        tmp_path,
+        "merge_join",
+        filters={"include": [{"paths": include_paths}], "traversal": "pruning"},
+        synchronisation={
+            "pipeline": {"comparaison_queue_size": 2, "transfer_queue_size": 2}
+        },
+    )
+
+    report = synchronise(config)
+
+    synchronised_paths = {"docs/a", "docs/b/c", "docs/b.txt", "docs/e"}
+    if "src" in include_paths:
+        synchronised_paths.add("src/d")
+    assert (len(synchronised_paths), 0) == (report.n_transfers, report.n_errors)
+    assert synchronised_paths == {
+        path.relative_to(tmp_path / "right").as_posix()
+        for path in (tmp_path / "right").rglob("*")
+        if path.is_file()
+    }
+    assert "e" == (tmp_path / "left" / "docs" / "e").read_text()
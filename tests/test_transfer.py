@@ -0,0 +1,268 @@
+import os
+from pathlib import Path
+from typing import cast
+
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+from fsspec.implementations.memory import MemoryFileSystem
+from sqlalchemy import select
+
+from synchrotron import transfer
+from synchrotron.configuration.comparaison import CacheDisabledComparaison
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.configuration.synchronisation.delta_transfer import DeltaTransfer
+from synchrotron.database.models.storage_file import StorageFile
+from synchrotron.database.utils import session_manager
+from synchrotron.database.writer import StorageFileWriter
+from synchrotron.delta import delta_copy
+from synchrotron.reconciliation import Comparaison
+from synchrotron.schema.molecules.file_snapshot import FileSnapshot
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+from synchrotron.transfer import (
+    Transfer,
+    TransferSvc,
+    copy_file,
+    get_transfer,
+    kernel_copy,
+    stream_copy,
+)
+
+CONFIG = CacheDisabledComparaison.model_validate(
+    {
+        "type": "size",
+        "cache": "disabled",
+        "actions": {
+            "only_exist_left": "copy_to_right",
+            "only_exist_right": "remove",
+            "file_is_different": "update_in_left",
+        },
+    }
+)
+
+
+@pytest.mark.parametrize(
+    "state, expected_results",
+    [
+        ("only_exist_left", Transfer("a", "copy_to_right", "copy", "right")),
+        ("only_exist_right", Transfer("a", "remove", "remove", "right")),
+        ("file_is_different", Transfer("a", "update_in_left", "copy", "left")),
+    ],
+)
+def test_get_transfer(state, expected_results: Transfer):
+    assert expected_results == get_transfer(CONFIG, "a", state)
+
+
+def test_transfer_svc(tmp_path: Path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "new.txt").write_bytes(b"new content")
+    (tmp_path / "right" / "old.txt").write_bytes(b"old content")
+    (tmp_path / "right" / "changed.txt").write_bytes(b"changed content")
+
+    storage_left = Storage(id=1, base_path=tmp_path / "left")
+    storage_right = Storage(id=2, base_path=tmp_path / "right")
+    transfer_svc = TransferSvc(CONFIG, storage_left, storage_right, chunk_size=4)
+
+    comparaisons: list[Comparaison] = [
+        (
+            FileSnapshot("new.txt", None),
+            FileSnapshot("new.txt", None),
+            "only_exist_left",
+        ),
+        (
+            FileSnapshot("old.txt", None),
+            FileSnapshot("old.txt", None),
+            "only_exist_right",
+        ),
+        (
+            FileSnapshot("changed.txt", None),
+            FileSnapshot("changed.txt", None),
+            "file_is_different",
+        ),
+        (FileSnapshot("same.txt", None), FileSnapshot("same.txt", None), None),
+    ]
+    reports = list(transfer_svc.run(comparaisons))
+
+    assert all(report.error is None for report in reports)
+    assert 3 == len(reports)
+    assert b"new content" == (tmp_path / "right" / "new.txt").read_bytes()
+    assert not (tmp_path / "right" / "old.txt").exists()
+    assert b"changed content" == (tmp_path / "left" / "changed.txt").read_bytes()
+
+
+def test_transfer_svc_records_snapshots(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    storage_left = Storage(id=1, base_path=tmp_path / "left")
+    storage_right = Storage(id=2, base_path=tmp_path / "right")
+
+    # files in sync are recorded from the details of their listing, the files
+    # themselves are not looked up
+    info = cast(FileInfo, {"name": "", "size": 3, "type": "file", "mtime": 0.0})
+    with StorageFileWriter(cache_engine) as writer:
+        transfer_svc = TransferSvc(
+            CONFIG, storage_left, storage_right, chunk_size=4, writer=writer
+        )
+        comparaisons = [
+            (FileSnapshot("same.txt", info), FileSnapshot("same.txt", info), None)
+        ]
+        assert [] == list(transfer_svc.run(comparaisons))
+
+    with session_manager(cache_engine) as session:
+        rows = session.execute(
+            select(StorageFile.storage_id, StorageFile.relative_path, StorageFile.size)
+        ).all()
+    assert [(1, "same.txt", 3), (2, "same.txt", 3)] == sorted(tuple(r) for r in rows)
+
+
+@pytest.mark.parametrize("error", [FileNotFoundError("a.txt"), ValueError("bug")])
+def test_transfer_svc_execute_error(
+    tmp_path: Path,
+    error: Exception,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+):
+    storage_left = Storage(id=1, base_path=tmp_path / "left")
+    storage_right = Storage(id=2, base_path=tmp_path / "right")
+    transfer_svc = TransferSvc(CONFIG, storage_left, storage_right, chunk_size=4)
+
+    def copy(transfer: Transfer) -> int:
+        raise error
+
+    monkeypatch.setattr(transfer_svc, "copy", copy)
+    report = transfer_svc.execute(Transfer("a.txt", "copy_to_right", "copy", "right"))
+
+    assert error is report.error
+    # unexpected errors are logged with their traceback
+    has_traceback = caplog.records[-1].exc_info is not None
+    assert has_traceback == (not isinstance(error, OSError))
+
+
+@pytest.mark.parametrize("content", [b"", b"some content", bytes(range(256)) * 1000])
+def test_kernel_copy(tmp_path: Path, content: bytes):
+    (tmp_path / "source").write_bytes(content)
+    n_bytes = kernel_copy(str(tmp_path / "source"), str(tmp_path / "target"), 16)
+
+    assert len(content) == n_bytes
+    assert content == (tmp_path / "target").read_bytes()
+
+
+def test_copy_file_local(tmp_path: Path):
+    (tmp_path / "source").write_bytes(b"some content")
+    os.utime(tmp_path / "source", ns=(0, 1_700_000_000_123_456_789))
+    fs = LocalFileSystem()
+
+    target = str(tmp_path / "target" / "a")
+    assert 12 == copy_file(fs, str(tmp_path / "source"), fs, target, 4)
+    assert b"some content" == (tmp_path / "target" / "a").read_bytes()
+    assert 1_700_000_000_123_456_789 == os.stat(target).st_mtime_ns
+    assert ["a"] == os.listdir(tmp_path / "target")
+
+
+def test_copy_file_local_interrupted(tmp_path: Path):
+    (tmp_path / "target").write_bytes(b"previous content")
+    fs = MemoryFileSystem()
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    fs.pipe("/source", b"some content")
+
+    def interrupt(n_bytes: int) -> None:
+        raise OSError("connection lost")
+
+    with pytest.raises(OSError, match="connection lost"):
+        copy_file(
+            fs, "/source", LocalFileSystem(), str(tmp_path / "target"), 4, interrupt
+        )
+    assert b"previous content" == (tmp_path / "target").read_bytes()
+    assert ["target"] == os.listdir(tmp_path)
+
+
+def test_copy_file_within_filesystem():
+    fs = MemoryFileSystem()
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    fs.pipe("/source/a", b"some content")
+
+    assert 12 == copy_file(fs, "/source/a", fs, "/target/b/a", 4)
+    assert b"some content" == fs.cat("/target/b/a")
+
+
+def test_stream_copy():
+    fs = MemoryFileSystem()
+    fs.store = {}
+    fs.pseudo_dirs = [""]
+    fs.pipe("/a", b"some content")
+
+    assert 12 == stream_copy(fs, "/a", fs, "/b/a", 5)
+    assert b"some content" == fs.cat("/b/a")
+
+
+def test_transfer_svc_delta_transfer(tmp_path: Path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "big").write_bytes(b"a" * 64 + b"b" * 8)
+    (tmp_path / "right" / "big").write_bytes(b"a" * 72)
+
+    storage_left = Storage(id=1, base_path=tmp_path / "left")
+    storage_right = Storage(id=2, base_path=tmp_path / "right")
+    delta = DeltaTransfer.model_validate(
+        {
+            "block_size": 8,
+            "min_file_size": 0,
+            "signature_cache": {
+                "cache_engine": "database",
+                "engine_url": f"sqlite:///{tmp_path / 'cache.db'}",
+            },
+        }
+    )
+    config = CONFIG.model_copy(
+        update={
+            "actions": CONFIG.actions.model_copy(
+                update={"file_is_different": "update_in_right"}
+            )
+        }
+    )
+    transfer_svc = TransferSvc(config, storage_left, storage_right, 4, delta)
+    comparaison: Comparaison = (
+        FileSnapshot("big", None),
+        FileSnapshot("big", None),
+        "file_is_different",
+    )
+
+    (report,) = transfer_svc.run([comparaison])
+    assert 8 == report.bytes_transferred
+    assert b"a" * 64 + b"b" * 8 == (tmp_path / "right" / "big").read_bytes()
+
+    # the cached signature of the target is used for the next update
+    (tmp_path / "left" / "big").write_bytes(b"a" * 72)
+    (report,) = transfer_svc.run([comparaison])
+    assert 8 == report.bytes_transferred
+    assert b"a" * 72 == (tmp_path / "right" / "big").read_bytes()
+
+
+def test_transfer_svc_delta_transfer_interrupted(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "big").write_bytes(b"b" * 72)
+    (tmp_path / "right" / "big").write_bytes(b"a" * 72)
+    modified_ns = (tmp_path / "right" / "big").stat().st_mtime_ns
+
+    storage_left = Storage(id=1, base_path=tmp_path / "left")
+    storage_right = Storage(id=2, base_path=tmp_path / "right")
+    delta = DeltaTransfer.model_validate({"block_size": 8, "min_file_size": 0})
+    transfer_svc = TransferSvc(CONFIG, storage_left, storage_right, 4, delta)
+
+    def interrupted_delta_copy(*args, **kwargs):
+        delta_copy(*args, **kwargs)
+        raise OSError("interrupted")
+
+    monkeypatch.setattr(transfer, "delta_copy", interrupted_delta_copy)
+    report = transfer_svc.execute(Transfer("big", "update_in_right", "copy", "right"))
+
+    # the target is left as it was, with no partial file next to it
+    assert isinstance(report.error, OSError)
+    assert b"a" * 72 == (tmp_path / "right" / "big").read_bytes()
+    assert modified_ns == (tmp_path / "right" / "big").stat().st_mtime_ns
+    assert ["big"] == os.listdir(tmp_path / "right")
@@ -0,0 +1,68 @@
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from synchrotron.configuration.filter import Filter
+from synchrotron.filter import compile_filter
+from synchrotron.schema.molecules.fsspec_file_info import FileInfo
+
+pytest.importorskip("numpy")
+
+from synchrotron.vectorized_filter import filter_batches
+
+NOW = datetime(2024, 6, 15, 12, 0, 0)
+EXTENSIONS = ["txt", "md", "tar.gz", "", "TXT"]
+
+
+def random_file_details(rng: random.Random, index: int) -> FileInfo:
+    extension = rng.choice(EXTENSIONS)
+    timestamp = NOW.timestamp() - rng.uniform(0, 10 * 24 * 3600)
+    details: dict[str, Any] = {
+        "name": f"dir.d/file_{index}" + (f".{extension}" if extension else ""),
+        "size": rng.randint(0, 100),
+        "type": "file",
+        "created": timestamp - rng.uniform(0, 24 * 3600),
+    }
+    if rng.random() < 0.5:
+        details["mtime"] = timestamp
+    else:
+        details["LastModified"] = datetime.fromtimestamp(timestamp)
+    return details  # type: ignore[return-value]
+
+
+@pytest.mark.parametrize(
+    "filter_kwargs",
+    [
+        {},
+        {"min_size": 10, "max_size": 50},
+        {"extensions": [".md", "tar.gz"]},
+        {"modified_after": "P3D"},
+        {"modified_before": "P3D", "created_after": "P5D"},
+        {"min_size": 25, "modified_after": "P7D", "extensions": ["txt", "md"]},
+    ],
+)
+@pytest.mark.parametrize("batch_size", [1, 7, 1000])
+def test_vectorized_filter_parity(filter_kwargs: dict[str, Any], batch_size: int):
+    rng = random.Random(0)
+    files = [(f"path_{i}", random_file_details(rng, i)) for i in range(500)]
+    compiled_filter = compile_filter(Filter(paths=[Path("a")], **filter_kwargs), NOW)
+
+    expected_results = [
+        (path, details) for path, details in files if compiled_filter(details)
+    ]
+    results = list(filter_batches(compiled_filter, files, batch_size))
+    assert expected_results == results
+
+
+def test_vectorized_filter_missing_property():
+    compiled_filter = compile_filter(
+        Filter(paths=[Path("a")], modified_after="P1D"), NOW
+    )
+    files: list[tuple[str, FileInfo]] = [
+        ("a", {"name": "a", "size": 1})  # type: ignore[typeddict-item]
+    ]
+    with pytest.raises(ValueError, match="not found in file details"):
+        list(filter_batches(compiled_filter, files, 10))
@@ -0,0 +1,149 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from synchrotron.configuration import OneConfig
+from synchrotron.watch import IN_CLOSE_WRITE, IN_CREATE, Inotify, WatchSvc
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+
+
+def test_inotify(tmp_path: Path):
+    (tmp_path / "sub").mkdir()
+
+    with Inotify() as inotify:
+        inotify.add_tree(str(tmp_path), "left")
+        (tmp_path / "sub" / "file").write_bytes(b"content")
+        (tmp_path / "new").mkdir()
+
+        events = inotify.read(timeout=1)
+
+    assert any(
+        event.path == str(tmp_path / "sub" / "file") and event.mask & IN_CLOSE_WRITE
+        for event in events
+    )
+    assert any(
+        event.path == str(tmp_path / "new") and event.is_dir and event.mask & IN_CREATE
+        for event in events
+    )
+    assert {"left"} == {event.tag for event in events}
+
+
+def test_inotify_no_event(tmp_path: Path):
+    with Inotify() as inotify:
+        inotify.add_tree(str(tmp_path), "left")
+        assert [] == inotify.read(timeout=0.01)
+
+
+def test_watch_svc_synchronise_paths(tmp_path: Path):
+    (tmp_path / "left" / "docs").mkdir(parents=True)
+    (tmp_path / "right").mkdir()
+    (tmp_path / "left" / "docs" / "a.md").write_bytes(b"a")
+    (tmp_path / "left" / "docs" / "b.txt").write_bytes(b"b")
+    (tmp_path / "left" / "docs" / "c.md").write_bytes(b"c")
+
+    config = OneConfig.model_validate(
+        {
+            "filters": {"include": [{"paths": ["docs"], "extensions": [".md"]}]},
+            "synchronisation": {"trigger": {"on": "watch"}},
+            "comparaison": {
+                "type": "size",
+                "cache": "disabled",
+                "actions": {
+                    "only_exist_left": "copy_to_right",
+                    "only_exist_right": "copy_to_left",
+                    "file_is_different": "update_in_right",
+                },
+            },
+            "left": {"id": 1, "base_path": tmp_path / "left"},
+            "right": {"id": 2, "base_path": tmp_path / "right"},
+        }
+    )
+    WatchSvc(config).synchronise_paths({"docs/a.md", "docs/b.txt"})
+
+    assert [Path("docs/a.md")] == [
+        path.relative_to(tmp_path / "right")
+        for path in (tmp_path / "right").rglob("*")
+        if path.is_file()
+    ]
+
+
+def test_watch_svc_relative_filters_follow_batches(tmp_path: Path):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    config = OneConfig.model_validate(
+        {
+            "filters": {"include": [{"paths": ["*"], "modified_before": "PT1S"}]},
+            "synchronisation": {"trigger": {"on": "watch"}},
+            "comparaison": {
+                "type": "size",
+                "cache": "disabled",
+                "actions": {
+                    "only_exist_left": "copy_to_right",
+                    "only_exist_right": "copy_to_left",
+                    "file_is_different": "update_in_right",
+                },
+            },
+            "left": {"id": 1, "base_path": tmp_path / "left"},
+            "right": {"id": 2, "base_path": tmp_path / "right"},
+        }
+    )
+    watch_svc = WatchSvc(config)
+    (tmp_path / "left" / "a.txt").write_bytes(b"a")
+
+    watch_svc.synchronise_paths({"a.txt"})
+    assert not (tmp_path / "right" / "a.txt").exists()
+
+    # the file is older than a second for the next batch
+    time.sleep(1.1)
+    watch_svc.synchronise_paths({"a.txt"})
+    assert b"a" == (tmp_path / "right" / "a.txt").read_bytes()
+
+
+def test_watch_svc_skips_partial_and_vanished_files(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    (tmp_path / "left").mkdir()
+    (tmp_path / "right").mkdir()
+    config = OneConfig.model_validate(
+        {
+            "filters": {"include": [{"paths": ["*"]}]},
+            "synchronisation": {"trigger": {"on": "watch"}},
+            "comparaison": {
+                "type": "size",
+                "cache": "disabled",
+                "actions": {
+                    "only_exist_left": "copy_to_right",
+                    "only_exist_right": "copy_to_left",
+                    "file_is_different": "update_in_right",
+                },
+            },
+            "left": {"id": 1, "base_path": tmp_path / "left"},
+            "right": {"id": 2, "base_path": tmp_path / "right"},
+        }
+    )
+    watch_svc = WatchSvc(config)
+
+    with Inotify() as inotify:
+        inotify.add_tree(str(tmp_path / "left"), "left")
+        (tmp_path / "left" / ".a.txt.synchrotron-partial").write_bytes(b"a")
+        (tmp_path / "left" / "a.txt").write_bytes(b"a")
+        changed_paths = watch_svc.changed_paths(inotify, inotify.read(timeout=1))
+    assert {"a.txt"} == changed_paths
+
+    compared: list[str] = []
+    compare = watch_svc.comparison_svc.compare
+
+    def record_compare(left, right):
+        compared.append(left.relative_path)
+        return compare(left, right)
+
+    monkeypatch.setattr(watch_svc.comparison_svc, "compare", record_compare)
+    watch_svc.synchronise_paths({"a.txt", "gone.txt"})
+
+    assert ["a.txt"] == compared
+    assert b"a" == (tmp_path / "right" / "a.txt").read_bytes()
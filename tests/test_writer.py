@@ -0,0 +1,84 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, select
+
+from synchrotron.configuration.comparaison.cache_engines import DatabaseCacheEngine
+from synchrotron.configuration.storage import Storage
+from synchrotron.database.models.storage_file import StorageFile
+from synchrotron.database.utils import get_engine, session_manager
+from synchrotron.database.writer import StorageFileWriter
+
+MODIFIED = datetime(2024, 6, 15, 12)
+
+
+def test_storage_file_writer(tmp_path: Path):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    storage = Storage(id=1)
+
+    with StorageFileWriter(cache_engine, batch_size=3) as writer:
+        for i in range(5):
+            writer.upsert(storage, f"file_{i}", MODIFIED, i)
+
+    with StorageFileWriter(cache_engine, batch_size=3) as writer:
+        writer.upsert(storage, "file_0", MODIFIED, 10, "sha256:abc")
+        writer.delete(storage, "file_1")
+        writer.upsert(storage, "file_5", MODIFIED, 5)
+        writer.delete(storage, "file_5")
+
+    with session_manager(cache_engine) as session:
+        rows = session.execute(
+            select(
+                StorageFile.relative_path, StorageFile.size, StorageFile.content_hash
+            ).order_by(StorageFile.relative_path)
+        ).all()
+
+    assert [
+        ("file_0", 10, "sha256:abc"),
+        ("file_2", 2, None),
+        ("file_3", 3, None),
+        ("file_4", 4, None),
+    ] == [tuple(row) for row in rows]
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "other"])
+def test_storage_file_writer_keeps_unchanged_records(
+    tmp_path: Path, dialect: str, monkeypatch: pytest.MonkeyPatch
+):
+    cache_engine = DatabaseCacheEngine(engine_url=f"sqlite:///{tmp_path / 'cache.db'}")
+    engine = get_engine(cache_engine.engine_url)
+    # other dialects go through an UPDATE followed by an INSERT
+    monkeypatch.setattr(engine.dialect, "name", dialect)
+    storage = Storage(id=1)
+
+    with StorageFileWriter(cache_engine) as writer:
+        writer.upsert(storage, "same", MODIFIED, 1, "sha256:same")
+        writer.upsert(storage, "changed", MODIFIED, 1, "sha256:changed")
+
+    updated_rows: list[int] = []
+
+    def count_updates(conn, cursor, statement: str, *args) -> None:
+        if "UPDATE" in statement.upper():
+            updated_rows.append(cursor.rowcount)
+
+    event.listen(engine, "after_cursor_execute", count_updates)
+    try:
+        with StorageFileWriter(cache_engine) as writer:
+            writer.upsert(storage, "same", MODIFIED, 1)
+            writer.upsert(storage, "changed", MODIFIED, 2)
+    finally:
+        event.remove(engine, "after_cursor_execute", count_updates)
+
+    with session_manager(cache_engine) as session:
+        rows = session.execute(
+            select(
+                StorageFile.relative_path, StorageFile.size, StorageFile.content_hash
+            ).order_by(StorageFile.relative_path)
+        ).all()
+
+    # the digest of a changed file no longer matches its content
+    assert [("changed", 2, None), ("same", 1, "sha256:same")] == [
+        tuple(row) for row in rows
+    ]
+    assert 1 == sum(updated_rows)